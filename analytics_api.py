@@ -0,0 +1,188 @@
+import json
+import sqlite3
+import asyncio
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from rag import DB_PATH, audit_db
+
+# Read side of the audit log for the dashboards. Every list is keyset-paginated: a page
+# returns "next" and the following page is requested with ?after=<next>, so deep pages
+# cost the same as the first one. Times are UTC "YYYY-MM-DD HH:MM:SS" strings.
+router = APIRouter(prefix="/api/analytics", tags=["analytics"])
+
+MAX_PAGE_SIZE = 1000
+
+
+def connect():
+    # read-only, WAL lets this run alongside the audit writer
+    conn = sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def query_page(sql, params, limit, cursor_of):
+    """Runs sql (which must end in ORDER BY ... LIMIT ?) for limit + 1 rows to learn whether there is a next page."""
+    conn = connect()
+    try:
+        rows = [dict(row) for row in conn.execute(sql, [*params, limit + 1])]
+    except sqlite3.OperationalError as e:
+        raise HTTPException(status_code=503, detail=f"audit database unavailable: {e}")
+    finally:
+        conn.close()
+    page = rows[:limit]
+    return {"items": page, "next": cursor_of(page[-1]) if len(rows) > limit else None}
+
+
+def time_filters(column, since, until):
+    clauses, params = [], []
+    if since:
+        clauses.append(f"{column} >= ?")
+        params.append(since)
+    if until:
+        clauses.append(f"{column} < ?")
+        params.append(until)
+    return clauses, params
+
+
+def where(clauses):
+    return ("WHERE " + " AND ".join(clauses)) if clauses else ""
+
+
+def split_cursor(after, parts):
+    # only the first part (a user name) may contain "|": periods and data types never do
+    values = after.rsplit("|", parts - 1)
+    if len(values) != parts:
+        raise HTTPException(status_code=400, detail=f"invalid cursor {after!r}")
+    return values
+
+
+@router.get("/events")
+def list_events(
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    data_type: Optional[str] = None,
+    user: Optional[str] = None,
+    after: Optional[int] = Query(None, description="id of the last event of the previous page"),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+):
+    """Individual flag events, newest first."""
+    clauses, params = time_filters("flagged_at", since, until)
+    if data_type:
+        clauses.append("data_type = ?")
+        params.append(data_type)
+    if user:
+        clauses.append("user = ?")
+        params.append(user)
+    if after is not None:
+        clauses.append("id < ?")
+        params.append(after)
+    sql = f"SELECT id, data_type, user, flagged_at FROM flag_events {where(clauses)} ORDER BY id DESC LIMIT ?"
+    return query_page(sql, params, limit, lambda row: row["id"])
+
+
+@router.get("/hourly")
+def list_hourly(
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    data_type: Optional[str] = None,
+    bucket: str = Query("hour", pattern="^(hour|day)$"),
+    after: Optional[str] = Query(None, description="'<period>|<data_type>' of the last row of the previous page"),
+    limit: int = Query(500, ge=1, le=MAX_PAGE_SIZE),
+):
+    """Flag counts per period and data type, oldest first, read from the hourly rollup."""
+    period = "hour" if bucket == "hour" else "substr(hour, 1, 10)"
+    clauses, params = time_filters("hour", since, until)
+    if data_type:
+        clauses.append("data_type = ?")
+        params.append(data_type)
+    having, having_params = "", []
+    if after is not None:
+        after_period, after_type = split_cursor(after, 2)
+        # in WHERE, so the primary key (hour, data_type) skips the earlier pages instead of grouping them
+        if bucket == "hour":
+            clauses.append("(hour, data_type) > (?, ?)")
+            params.extend([after_period, after_type])
+        else:
+            clauses.append("hour >= ?")
+            params.append(after_period)
+            having = "HAVING (period, data_type) > (?, ?)"
+            having_params = [after_period, after_type]
+    sql = f"""
+        SELECT {period} AS period, data_type, SUM(count) AS count
+        FROM flag_rollup_hourly {where(clauses)}
+        GROUP BY period, data_type {having}
+        ORDER BY period, data_type LIMIT ?
+    """
+    params.extend(having_params)
+    return query_page(sql, params, limit, lambda row: f"{row['period']}|{row['data_type']}")
+
+
+@router.get("/data-types")
+def list_data_types(since: Optional[str] = None, until: Optional[str] = None):
+    """Totals per data type: running totals from flagged_data, or summed from the hourly rollup for a time range."""
+    conn = connect()
+    try:
+        if since or until:
+            clauses, params = time_filters("hour", since, until)
+            rows = conn.execute(f"""
+                SELECT data_type, SUM(count) AS count, MAX(hour) AS last_hour
+                FROM flag_rollup_hourly {where(clauses)}
+                GROUP BY data_type ORDER BY count DESC
+            """, params)
+        else:
+            rows = conn.execute("""
+                SELECT data_type, count, last_flagged
+                FROM flagged_data WHERE name IS NULL ORDER BY count DESC
+            """)
+        return {"items": [dict(row) for row in rows]}
+    except sqlite3.OperationalError as e:
+        raise HTTPException(status_code=503, detail=f"audit database unavailable: {e}")
+    finally:
+        conn.close()
+
+
+@router.get("/users")
+def list_users(
+    user: Optional[str] = None,
+    after: Optional[str] = Query(None, description="'<user>|<data_type>' of the last row of the previous page"),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+):
+    """Flag counts per user and data type from the per-user rollup."""
+    clauses, params = [], []
+    if user:
+        clauses.append("user = ?")
+        params.append(user)
+    if after is not None:
+        after_user, after_type = split_cursor(after, 2)
+        clauses.append("(user, data_type) > (?, ?)")
+        params.extend([after_user, after_type])
+    sql = f"""
+        SELECT user, data_type, count, last_flagged
+        FROM flag_rollup_user {where(clauses)}
+        ORDER BY user, data_type LIMIT ?
+    """
+    return query_page(sql, params, limit, lambda row: f"{row['user']}|{row['data_type']}")
+
+
+@router.get("/stream")
+async def stream_increments():
+    """Server-sent events: one "increment" event per audit flush with the new counts, instead of polling."""
+    logger = await audit_db.aget()
+    subscription = logger.subscribe()
+
+    async def events():
+        _, pending = subscription
+        try:
+            while True:
+                try:
+                    increment = await asyncio.wait_for(pending.get(), 15)
+                except asyncio.TimeoutError:
+                    # comment line keeps proxies from closing an idle stream
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: increment\ndata: {json.dumps(increment)}\n\n"
+        finally:
+            logger.unsubscribe(subscription)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
@@ -4,6 +4,7 @@ import axios from "axios";
 import MetricCard from './MetricCard';
 import EmployeeRankTable from './EmployeeRankTable';
 import CriticalDataTable from './CriticalDataTable';
+import FlagTrends from './FlagTrends';
 
 interface FlaggedDataRow {
   id: number;
@@ -229,6 +230,9 @@ const Dashboard = () => {
           ))}
         </div>
 
+        {/* Flag Trends */}
+        <FlagTrends />
+
         {/* Critical Data Types Section */}
         <div className="bg-white rounded-xl shadow-sm border border-gray-200 p-6">
           <div className="flex items-center justify-between mb-6">
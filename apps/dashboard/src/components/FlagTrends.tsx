@@ -0,0 +1,99 @@
+import { useState } from 'react';
+import { BarChart3, Calendar } from 'lucide-react';
+import { useFlagTrends } from '../hooks/useAnalytics';
+
+const RANGES = [
+  { days: 7, label: 'Last 7 Days' },
+  { days: 30, label: 'Last 30 Days' },
+  { days: 90, label: 'Last 90 Days' },
+  { days: 365, label: 'Last 12 Months' },
+];
+
+const TYPE_COLORS = ['bg-red-500', 'bg-amber-500', 'bg-purple-500', 'bg-blue-500', 'bg-green-500'];
+
+const FlagTrends = () => {
+  const [days, setDays] = useState(30);
+  const { trend, loading, error } = useFlagTrends(days);
+
+  // The busiest data types get their own colour, the rest are stacked as "Other"
+  const typeTotals = new Map<string, number>();
+  trend.forEach(day => {
+    Object.entries(day.byType).forEach(([type, count]) => typeTotals.set(type, (typeTotals.get(type) || 0) + count));
+  });
+  const topTypes = Array.from(typeTotals.entries())
+    .sort((a, b) => b[1] - a[1])
+    .slice(0, TYPE_COLORS.length - 1)
+    .map(([type]) => type);
+  const colorOf = (type: string) => TYPE_COLORS[topTypes.includes(type) ? topTypes.indexOf(type) : TYPE_COLORS.length - 1];
+  const maxTotal = Math.max(1, ...trend.map(day => day.total));
+  const total = trend.reduce((sum, day) => sum + day.total, 0);
+
+  return (
+    <div className="bg-white rounded-xl shadow-sm border border-gray-200 p-6">
+      <div className="flex items-center justify-between mb-6">
+        <div className="flex items-center space-x-3">
+          <BarChart3 className="h-8 w-8 text-blue-500" />
+          <div>
+            <h2 className="text-xl font-semibold text-gray-900">Flag Trends</h2>
+            <p className="text-gray-600 text-sm">Flags per day and data type, updated live</p>
+          </div>
+        </div>
+        <div className="flex items-center space-x-2">
+          <Calendar className="h-4 w-4 text-gray-500" />
+          <select
+            value={days}
+            onChange={(e) => setDays(Number(e.target.value))}
+            className="px-3 py-2 border border-gray-300 rounded-lg text-sm focus:ring-2 focus:ring-blue-500 focus:border-blue-500"
+          >
+            {RANGES.map(range => (
+              <option key={range.days} value={range.days}>{range.label}</option>
+            ))}
+          </select>
+        </div>
+      </div>
+
+      {error ? (
+        <div className="text-center py-8 text-red-600 text-sm">{error}</div>
+      ) : loading ? (
+        <div className="h-48 bg-gray-100 rounded-lg animate-pulse"></div>
+      ) : (
+        <>
+          <div className="flex items-end h-48 space-x-px">
+            {trend.map(day => (
+              <div
+                key={day.date}
+                className="flex-1 flex flex-col-reverse h-full"
+                title={`${day.date}: ${day.total} flag${day.total === 1 ? '' : 's'}`}
+              >
+                {Object.entries(day.byType).map(([type, count]) => (
+                  <div key={type} className={colorOf(type)} style={{ height: `${(count / maxTotal) * 100}%` }}></div>
+                ))}
+              </div>
+            ))}
+          </div>
+          <div className="flex justify-between text-xs text-gray-500 mt-2">
+            <span>{trend[0]?.date}</span>
+            <span>{total.toLocaleString()} flags</span>
+            <span>{trend[trend.length - 1]?.date}</span>
+          </div>
+          <div className="flex flex-wrap gap-4 mt-4">
+            {topTypes.map(type => (
+              <div key={type} className="flex items-center space-x-2 text-sm text-gray-700">
+                <span className={`h-3 w-3 rounded-sm ${colorOf(type)}`}></span>
+                <span>{type}</span>
+              </div>
+            ))}
+            {typeTotals.size > topTypes.length && (
+              <div className="flex items-center space-x-2 text-sm text-gray-700">
+                <span className={`h-3 w-3 rounded-sm ${TYPE_COLORS[TYPE_COLORS.length - 1]}`}></span>
+                <span>Other</span>
+              </div>
+            )}
+          </div>
+        </>
+      )}
+    </div>
+  );
+};
+
+export default FlagTrends;
@@ -0,0 +1,86 @@
+import { useState, useEffect } from 'react';
+import { analyticsAPI } from '../services/api';
+import type { FlagIncrement, PeriodCount } from '../services/api';
+
+export interface TrendDay {
+  date: string;
+  total: number;
+  byType: Record<string, number>;
+}
+
+const DAY_MS = 24 * 60 * 60 * 1000;
+
+// The audit tables store UTC times as "YYYY-MM-DD HH:MM:SS"
+const toAuditTime = (date: Date) => date.toISOString().slice(0, 19).replace('T', ' ');
+
+type DayCounts = Record<string, Record<string, number>>;
+
+const addCount = (counts: DayCounts, day: string, dataType: string, count: number) => {
+  const types = counts[day] || (counts[day] = {});
+  types[dataType] = (types[dataType] || 0) + count;
+};
+
+// Daily flag counts per data type over the last `days` days, read page by page from the daily
+// rollup and then kept current by the increment stream instead of polling
+export const useFlagTrends = (days: number) => {
+  const [counts, setCounts] = useState<DayCounts>({});
+  const [loading, setLoading] = useState(true);
+  const [error, setError] = useState<string | null>(null);
+
+  useEffect(() => {
+    let cancelled = false;
+    let unsubscribe: (() => void) | null = null;
+    const since = toAuditTime(new Date(Date.now() - (days - 1) * DAY_MS)).slice(0, 10) + ' 00:00:00';
+
+    const fetchTrends = async () => {
+      try {
+        setLoading(true);
+        const loaded: DayCounts = {};
+        let after: string | undefined;
+        do {
+          const page = await analyticsAPI.getTrends({ since, bucket: 'day', after, limit: 1000 });
+          page.items.forEach((row: PeriodCount) => addCount(loaded, row.period, row.data_type, row.count));
+          after = page.next === null ? undefined : String(page.next);
+        } while (after !== undefined && !cancelled);
+        if (cancelled) return;
+        setCounts(loaded);
+        setError(null);
+        // Subscribed once the pages are in, so no increment is counted twice; a flush in between
+        // shows up on the next range change or reload
+        unsubscribe = analyticsAPI.subscribe((increment: FlagIncrement) => {
+          setCounts(previous => {
+            const next: DayCounts = { ...previous };
+            increment.hourly.forEach(({ hour, data_type, count }) => {
+              const day = hour.slice(0, 10);
+              next[day] = { ...next[day] };
+              addCount(next, day, data_type, count);
+            });
+            return next;
+          });
+        });
+      } catch (err) {
+        if (cancelled) return;
+        setError('Failed to fetch flag trends');
+        console.error('Error fetching trends:', err);
+      } finally {
+        if (!cancelled) setLoading(false);
+      }
+    };
+
+    fetchTrends();
+    return () => {
+      cancelled = true;
+      if (unsubscribe) unsubscribe();
+    };
+  }, [days]);
+
+  // Fill in days without flags so the chart has one bar per day
+  const trend: TrendDay[] = [];
+  for (let i = days - 1; i >= 0; i--) {
+    const date = toAuditTime(new Date(Date.now() - i * DAY_MS)).slice(0, 10);
+    const byType = counts[date] || {};
+    trend.push({ date, byType, total: Object.values(byType).reduce((sum, n) => sum + n, 0) });
+  }
+
+  return { trend, loading, error };
+};
@@ -97,4 +97,80 @@ export class DatabaseAPI {
   }
 }
 
-export const dbAPI = new DatabaseAPI();
\ No newline at end of file
+export const dbAPI = new DatabaseAPI();
+
+// Audit analytics served by the privacy API (backend_api.py, /api/analytics). Lists are
+// keyset-paginated: pass the returned `next` as `after` to get the following page.
+const ANALYTICS_BASE = import.meta.env.VITE_PRIVACY_API_BASE || 'http://localhost:8000';
+
+export interface Page<T> {
+  items: T[];
+  next: string | number | null;
+}
+
+export interface FlagEvent {
+  id: number;
+  data_type: string;
+  user: string | null;
+  flagged_at: string;
+}
+
+export interface PeriodCount {
+  period: string;
+  data_type: string;
+  count: number;
+}
+
+export interface UserCount {
+  user: string;
+  data_type: string;
+  count: number;
+  last_flagged: string;
+}
+
+export interface FlagIncrement {
+  last_event_id: number;
+  events: number;
+  data_types: Record<string, number>;
+  hourly: { hour: string; data_type: string; count: number }[];
+  users: { user: string; data_type: string; count: number }[];
+}
+
+export class AnalyticsAPI {
+  constructor(private baseUrl: string = ANALYTICS_BASE) {}
+
+  private async get<T>(path: string, params: Record<string, string | number | undefined>): Promise<T> {
+    const query = new URLSearchParams();
+    Object.entries(params).forEach(([key, value]) => {
+      if (value !== undefined && value !== null) query.set(key, String(value));
+    });
+    const response = await fetch(`${this.baseUrl}/api/analytics${path}?${query}`);
+    if (!response.ok) {
+      throw new Error(`HTTP error! status: ${response.status}`);
+    }
+    return response.json();
+  }
+
+  getEvents(params: { since?: string; until?: string; data_type?: string; user?: string; after?: number; limit?: number } = {}) {
+    return this.get<Page<FlagEvent>>('/events', params);
+  }
+
+  getTrends(params: { since?: string; until?: string; data_type?: string; bucket?: 'hour' | 'day'; after?: string; limit?: number } = {}) {
+    return this.get<Page<PeriodCount>>('/hourly', params);
+  }
+
+  getUsers(params: { user?: string; after?: string; limit?: number } = {}) {
+    return this.get<Page<UserCount>>('/users', params);
+  }
+
+  // Calls onIncrement after every audit flush; returns a function that closes the stream
+  subscribe(onIncrement: (increment: FlagIncrement) => void): () => void {
+    const source = new EventSource(`${this.baseUrl}/api/analytics/stream`);
+    source.addEventListener('increment', (event) => {
+      onIncrement(JSON.parse((event as MessageEvent).data));
+    });
+    return () => source.close();
+  }
+}
+
+export const analyticsAPI = new AnalyticsAPI();
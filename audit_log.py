@@ -0,0 +1,229 @@
+import re
+import queue
+import asyncio
+import atexit
+import sqlite3
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+from metrics import Counter as MetricCounter, stage_seconds
+
+audit_records_dropped = MetricCounter(
+    "confidex_audit_records_dropped_total",
+    "Flagged-term records dropped because the audit queue was full"
+)
+
+
+def prepare_audit_db(db_path):
+    """Creates or migrates flagged_data for batched upserts and switches the database to WAL.
+
+    Rows written by the API have no name and exactly one row per data_type (enforced by a partial
+    unique index); rows with a name belong to the dashboard and are left alone.
+    """
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS flagged_data (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        data_type TEXT NOT NULL,
+        count INTEGER DEFAULT 1,
+        last_flagged TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        name TEXT
+    )
+    """)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(flagged_data)")}
+    with conn:
+        if "name" not in columns:
+            conn.execute("ALTER TABLE flagged_data ADD COLUMN name TEXT")
+        # Older versions could insert the same data_type twice under concurrency, fold those rows together
+        conn.execute("""
+            UPDATE flagged_data SET
+                count = (SELECT SUM(d.count) FROM flagged_data d WHERE d.name IS NULL AND d.data_type = flagged_data.data_type),
+                last_flagged = (SELECT MAX(d.last_flagged) FROM flagged_data d WHERE d.name IS NULL AND d.data_type = flagged_data.data_type)
+            WHERE name IS NULL AND id IN (SELECT MIN(id) FROM flagged_data WHERE name IS NULL GROUP BY data_type HAVING COUNT(*) > 1)
+        """)
+        conn.execute("""
+            DELETE FROM flagged_data
+            WHERE name IS NULL AND id NOT IN (SELECT MIN(id) FROM flagged_data WHERE name IS NULL GROUP BY data_type)
+        """)
+        conn.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS flagged_data_api_type
+            ON flagged_data (data_type) WHERE name IS NULL
+        """)
+        create_event_tables(conn)
+    conn.close()
+
+
+def create_event_tables(conn):
+    """flag_events is append-only, one row per flagged term. The rollups are updated in the same
+    transaction as the events they summarize, so reading them never needs a scan of flag_events.
+    The per data_type rollup is the existing flagged_data table."""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS flag_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        data_type TEXT NOT NULL,
+        user TEXT,
+        flagged_at TEXT NOT NULL
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS flag_events_time ON flag_events (flagged_at, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS flag_events_type ON flag_events (data_type, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS flag_events_user ON flag_events (user, id)")
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS flag_rollup_hourly (
+        hour TEXT NOT NULL,
+        data_type TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (hour, data_type)
+    ) WITHOUT ROWID
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS flag_rollup_user (
+        user TEXT NOT NULL,
+        data_type TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        last_flagged TEXT NOT NULL,
+        PRIMARY KEY (user, data_type)
+    ) WITHOUT ROWID
+    """)
+
+
+UPSERT_SQL = """
+    INSERT INTO flagged_data (data_type, count, last_flagged) VALUES (?, ?, ?)
+    ON CONFLICT (data_type) WHERE name IS NULL
+    DO UPDATE SET count = count + excluded.count, last_flagged = excluded.last_flagged
+"""
+INSERT_EVENT_SQL = "INSERT INTO flag_events (data_type, user, flagged_at) VALUES (?, ?, ?)"
+UPSERT_HOURLY_SQL = """
+    INSERT INTO flag_rollup_hourly (hour, data_type, count) VALUES (?, ?, ?)
+    ON CONFLICT (hour, data_type) DO UPDATE SET count = count + excluded.count
+"""
+UPSERT_USER_SQL = """
+    INSERT INTO flag_rollup_user (user, data_type, count, last_flagged) VALUES (?, ?, ?, ?)
+    ON CONFLICT (user, data_type)
+    DO UPDATE SET count = count + excluded.count, last_flagged = MAX(last_flagged, excluded.last_flagged)
+"""
+
+
+def hour_of(timestamp):
+    # "2025-08-30 13:45:14" -> "2025-08-30 13:00:00"
+    return timestamp[:13] + ":00:00"
+
+
+class AuditLogger:
+    """Write-behind logger for flagged_data.
+
+    record() only puts the term on a bounded queue. A background thread sums the increments
+    and writes them in one transaction per flush_interval_s (or as soon as max_batch records
+    have arrived), so scans never wait on SQLite. close() flushes whatever is still queued.
+
+    Each flush appends the individual events to flag_events, updates the rollups and is then
+    passed to every subscriber (the analytics SSE feed).
+    """
+
+    def __init__(self, db_path, max_queue=10000, max_batch=1000, flush_interval_s=1.0):
+        self.db_path = db_path
+        self.max_batch = max_batch
+        self.flush_interval_s = flush_interval_s
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._closed = threading.Event()
+        self._subscribers = set()
+        self._thread = threading.Thread(target=self._run, name="audit-log", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def record(self, data_type, user=None):
+        try:
+            self._queue.put_nowait((data_type, user, datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")))
+        except queue.Full:
+            # the writer is far behind, losing a count is better than stalling the scan
+            audit_records_dropped.inc()
+
+    def _collect(self):
+        try:
+            items = [self._queue.get(timeout=self.flush_interval_s)]
+        except queue.Empty:
+            return []
+        while len(items) < self.max_batch:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def _write(self, conn, items):
+        counts = Counter()
+        hourly = Counter()
+        per_user = Counter()
+        last_seen = {}
+        for data_type, user, flagged_at in items:
+            counts[data_type] += 1
+            hourly[hour_of(flagged_at), data_type] += 1
+            last_seen[data_type] = flagged_at
+            if user is not None:
+                per_user[user, data_type] += 1
+                last_seen[user, data_type] = flagged_at
+        with stage_seconds.time(stage="audit_flush"):
+            with conn:
+                conn.executemany(INSERT_EVENT_SQL, items)
+                conn.executemany(UPSERT_SQL, [(t, n, last_seen[t]) for t, n in counts.items()])
+                conn.executemany(UPSERT_HOURLY_SQL, [(hour, t, n) for (hour, t), n in hourly.items()])
+                conn.executemany(UPSERT_USER_SQL, [(u, t, n, last_seen[u, t]) for (u, t), n in per_user.items()])
+                last_id = conn.execute("SELECT MAX(id) FROM flag_events").fetchone()[0]
+        return {
+            "last_event_id": last_id,
+            "events": len(items),
+            "data_types": dict(counts),
+            "hourly": [{"hour": hour, "data_type": t, "count": n} for (hour, t), n in hourly.items()],
+            "users": [{"user": u, "data_type": t, "count": n} for (u, t), n in per_user.items()],
+        }
+
+    # Subscribers get every flush as a dict, delivered on their own event loop
+    def subscribe(self, max_pending=100):
+        subscription = (asyncio.get_running_loop(), asyncio.Queue(maxsize=max_pending))
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self._subscribers.discard(subscription)
+
+    def _publish(self, increment):
+        for loop, pending in list(self._subscribers):
+            try:
+                loop.call_soon_threadsafe(self._deliver, pending, increment)
+            except RuntimeError:
+                # the subscriber's loop is closed
+                self._subscribers.discard((loop, pending))
+
+    @staticmethod
+    def _deliver(pending, increment):
+        if not pending.full():
+            pending.put_nowait(increment)
+
+    def _run(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        while not (self._closed.is_set() and self._queue.empty()):
+            items = self._collect()
+            if not items:
+                continue
+            try:
+                increment = self._write(conn, items)
+            except sqlite3.Error as e:
+                print(f"Audit log flush of {len(items)} records failed:", e)
+                continue
+            self._publish(increment)
+        conn.close()
+
+    def close(self, timeout=10.0):
+        """Writes everything already queued, then stops the writer thread."""
+        self._closed.set()
+        self._thread.join(timeout)
+
+
+def term_pattern(terms):
+    """One case-insensitive pattern matching any of the terms as a whole word, longest first,
+    so "API_KEY" is counted once as API_KEY and not also as KEY."""
+    alternatives = "|".join(re.escape(t) for t in sorted(terms, key=len, reverse=True))
+    return re.compile(rf"(?<![A-Za-z0-9_])(?:{alternatives})(?![A-Za-z0-9_])", re.IGNORECASE)
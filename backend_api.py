@@ -1,11 +1,47 @@
-from fastapi import FastAPI
+import os
+import json
+import time
+import asyncio
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 from pydantic import BaseModel
-from transformers import AutoTokenizer, AutoModelForTokenClassification, pipeline
-from rag import ask_document_question
+from typing import Optional
+from rag import aask_document_question, astream_document_question, close_audit_log, PDF_PATH
+from circuit_breaker import CircuitOpen
+from clause_table import load_clause_table
+from ner_batcher import NERBatcher, Overloaded
+from replica_pool import ReplicaPool, resolve_config
+from ner_engine import load_ner_engine
+from long_document import split_windows, merge_window_results
+from incremental_scan import SegmentCache, incremental_spans, apply_edits
+import rule_engine
+from analytics_api import router as analytics_router
+from spans import Span
+import components
+import metrics
 from collections import defaultdict
 
-app = FastAPI()
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+API_VERSION = "2.0.0"
+
+# Responses only ever hold str/float/int/list/dict (spans are decoded to plain Python types),
+# so they are encoded directly, with orjson when it is installed
+def dumps(obj):
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content):
+        return dumps(content)
+
+app = FastAPI(version=API_VERSION, default_response_class=FastJSONResponse)
+app.include_router(analytics_router)
 
 # Allow CORS for all origins (for development)
 app.add_middleware(
@@ -16,103 +52,281 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Load NER model and pipeline
+# NER model and inference engine, loaded by the startup thread (or the first request).
+# NER_ENGINE picks the runtime: torch, onnx-fp32 or onnx-int8 (see export_onnx.py).
 model_name = "modelv1"
-tokenizer = AutoTokenizer.from_pretrained(model_name)
-model = AutoModelForTokenClassification.from_pretrained(model_name)
-ner_pipeline = pipeline("ner", model=model, tokenizer=tokenizer, aggregation_strategy="simple")
+NER_ENGINE = os.getenv("NER_ENGINE", "torch")
+NER_ONNX_DIR = os.getenv("NER_ONNX_DIR", "modelv1-onnx")
+# NER_POOL=latency|throughput runs the model in core-pinned replica processes (see replica_pool.py)
+NER_POOL = os.getenv("NER_POOL", "off")
+NER_POOL_REPLICAS = int(os.getenv("NER_POOL_REPLICAS", "0")) or None
+NER_POOL_THREADS = int(os.getenv("NER_POOL_THREADS", "0")) or None
+NER_POOL_TIMEOUT_S = float(os.getenv("NER_POOL_TIMEOUT_S", "30"))
+pool_config = None if NER_POOL == "off" else resolve_config(NER_POOL, NER_POOL_REPLICAS, NER_POOL_THREADS)
+
+WARMUP_PROMPTS = [
+    "Client NRIC is S1234567A.",
+    "Please send the invoice INV-2024-000123 to john.doe@example.com and call 9123-4567.",
+    " ".join(["The Q2 2024 financial report shows a budget of S$120,000 for Project LionX."] * 12),
+]
+
+def load_ner():
+    if pool_config:
+        # each replica warms itself up before reporting ready
+        return ReplicaPool(
+            NER_ENGINE, model_name, NER_ONNX_DIR, warmup_texts=WARMUP_PROMPTS,
+            request_timeout_s=NER_POOL_TIMEOUT_S, **pool_config
+        )
+    return load_ner_engine(NER_ENGINE, model_name, NER_ONNX_DIR)
+
+def warm_up_ner(engine):
+    # the first forward passes allocate buffers for each batch shape, do that before real traffic
+    engine.spans(WARMUP_PROMPTS[:1])
+    engine.spans(WARMUP_PROMPTS)
+
+ner = components.register("ner", load_ner, warm_up_ner)
+
+# Micro-batching: concurrent requests are grouped by token length and run as one padded batch
+NER_BATCH_MAX_WAIT_MS = float(os.getenv("NER_BATCH_MAX_WAIT_MS", "5"))
+NER_BATCH_MAX_SIZE = int(os.getenv("NER_BATCH_MAX_SIZE", "16"))
+NER_BATCH_BUCKETS = [int(b) for b in os.getenv("NER_BATCH_BUCKETS", "32,64,128,256,512").split(",")]
+# Back-pressure: with this many texts already waiting, new scans get 503 instead of queueing (0: no limit)
+NER_QUEUE_MAX = int(os.getenv("NER_QUEUE_MAX", "1024"))
+
+def run_ner_batch(texts):
+    return ner.get().spans(texts)
+
+def token_length(text):
+    return len(ner.get().tokenizer(text, add_special_tokens=True)["input_ids"])
+
+ner_batcher = NERBatcher(
+    run_ner_batch,
+    token_length,
+    max_wait_ms=NER_BATCH_MAX_WAIT_MS,
+    max_batch_size=NER_BATCH_MAX_SIZE,
+    length_buckets=NER_BATCH_BUCKETS,
+    # one batch in flight per replica
+    max_concurrent_batches=pool_config["replicas"] if pool_config else 1,
+    max_pending=NER_QUEUE_MAX,
+)
+
+metrics.Gauge("confidex_ner_queue_depth", "Texts waiting for an NER batch", ner_batcher.depth)
+ner_rejected = metrics.Counter("confidex_ner_rejected_total", "Scans rejected with 503 because the NER queue was full")
+metrics.Gauge(
+    "confidex_ner_replicas_alive",
+    "NER replica processes running",
+    lambda: ner.get().alive() if pool_config and ner.ready else None
+)
+metrics.Gauge(
+    "confidex_component_rss_bytes",
+    "Approximate resident memory added by loading each component",
+    lambda: {name: component.rss_bytes for name, component in components.registry.items()},
+    ["component"]
+)
+
+# Long inputs are scanned as overlapping token windows instead of being truncated
+LONG_TEXT_MAX_TOKENS = int(os.getenv("LONG_TEXT_MAX_TOKENS", "512"))
+LONG_TEXT_STRIDE = int(os.getenv("LONG_TEXT_STRIDE", "128"))
+
+async def detect_entities(text):
+    tokenizer = (await ner.aget()).tokenizer
+    max_tokens = min(LONG_TEXT_MAX_TOKENS, tokenizer.model_max_length)
+    windows = split_windows(tokenizer, text, max_tokens=max_tokens, stride=LONG_TEXT_STRIDE)
+    if len(windows) == 1:
+        return await ner_batcher.submit(text, length=windows[0][2])
+    # All windows go through the batcher together so they share forward passes
+    results = await asyncio.gather(*(
+        ner_batcher.submit(text[start:end], length=length) for start, end, length in windows
+    ))
+    return merge_window_results(windows, results)
+
+# NER first so /scan can take traffic as early as possible, RAG keeps warming up behind it
+STARTUP_COMPONENTS = ["ner", "clause_table", "audit_db", "explanation_cache", "vector_store", "rag_chain"]
+
+@app.on_event("startup")
+def start_components():
+    components.warm_up_in_background(STARTUP_COMPONENTS)
+
+@app.on_event("shutdown")
+def stop_components():
+    # write out audit counts that are still queued
+    close_audit_log()
+    if pool_config and ner.ready:
+        ner.get().close()
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    ner_rejected.inc()
+    return JSONResponse(status_code=503, content={"detail": f"NER is overloaded: {exc}"}, headers={"Retry-After": "1"})
+
+@app.get("/api/status")
+def api_status():
+    """Readiness: 200 once the NER path can serve /scan, 503 before that. Per-component details in the body."""
+    status = components.status()
+    if not ner.ready:
+        overall = "starting"
+    elif any(component["state"] == "failed" for component in status.values()):
+        overall = "degraded"
+    elif all(component["state"] == "ready" and component["warm"] for component in status.values()):
+        overall = "ready"
+    else:
+        overall = "warming"
+    return FastJSONResponse(
+        {"status": overall, "version": API_VERSION, "components": status},
+        status_code=200 if ner.ready else 503
+    )
+
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus text format: per-stage latency histograms, entity and cache counters, queue depth, memory."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 class ScanRequest(BaseModel):
     text: str
+    # who sent the prompt, recorded with the flagged terms for the per-user analytics
+    user: Optional[str] = None
 
-def to_python_type(obj):
-    import numpy as np
-    if isinstance(obj, np.generic):
-        return obj.item()
-    if isinstance(obj, dict):
-        return {k: to_python_type(v) for k, v in obj.items()}
-    if isinstance(obj, list):
-        return [to_python_type(v) for v in obj]
-    return obj
-
-def merge_entities(entities):
-    if not entities:
-        return []
-    merged = []
-    prev = entities[0].copy()
-    for ent in entities[1:]:
-        # Only merge if same type and directly consecutive
-        if ent['entity_group'] == prev['entity_group'] and ent['start'] == prev['end']:
-            prev['word'] += ent['word']
-            prev['end'] = ent['end']
-            prev['score'] = max(prev['score'], ent['score'])
-        else:
-            merged.append(prev)
-            prev = ent.copy()
-    merged.append(prev)
-    return merged
+AMOUNT_LABELS = {'AMOUNT_MONEY', 'BUDGET', 'FINANCIAL', 'PRICING_TERM', 'COMMISSION_RATE'}
 
-def merge_amount_entities(entities, text):
+def merge_amount_entities(spans):
     merged = []
     i = 0
-    while i < len(entities):
-        ent = entities[i]
-        if ent['entity_group'] in ['AMOUNT_MONEY', 'BUDGET', 'FINANCIAL', 'PRICING_TERM', 'COMMISSION_RATE']:
+    while i < len(spans):
+        span = spans[i]
+        if span.label in AMOUNT_LABELS:
             # Merge consecutive tokens/fragments of the same type
-            start = ent['start']
-            end = ent['end']
+            end = span.end
             j = i + 1
-            while j < len(entities) and entities[j]['entity_group'] == ent['entity_group'] and entities[j]['start'] == end:
-                end = entities[j]['end']
+            while j < len(spans) and spans[j].label == span.label and spans[j].start == end:
+                end = spans[j].end
                 j += 1
-            merged.append({
-                **ent,
-                'word': text[start:end],
-                'start': start,
-                'end': end
-            })
+            if j > i + 1:
+                span = Span(span.label, span.start, end, span.score)
+            merged.append(span)
             i = j
         else:
-            merged.append(ent)
+            merged.append(span)
             i += 1
     return merged
 
-@app.post("/scan")
-def scan(request: ScanRequest):
-    try:
-        # Lower threshold to 0.4 for demo
-        raw_entities = ner_pipeline(request.text)
-        print("Raw NER output:", raw_entities)
+def explanation_question(entity_group, words):
+    """The question and the span of the values in it, which the explanation cache masks."""
+    prefix = f"Why is {entity_group} like '"
+    words_str = ', '.join(words)
+    return f"{prefix}{words_str}' sensitive?", [(len(prefix), len(prefix) + len(words_str))]
+
+# The verdict never waits on the LLM for longer than SCAN_DEADLINE_S (counted from the start of the
+# scan): explanations still missing then, or failed, come from the clause table built offline by
+# clause_table.py. A cached explanation is always used, however little of the budget is left.
+SCAN_DEADLINE_S = float(os.getenv("SCAN_DEADLINE_S", "5"))
+CLAUSE_TABLE_PATH = os.getenv("CLAUSE_TABLE_PATH", "clause_table.json")
+MIN_EXPLAIN_WAIT_S = 0.05
+
+clause_table = components.register("clause_table", lambda: load_clause_table(CLAUSE_TABLE_PATH, PDF_PATH))
+explanation_fallbacks = metrics.Counter(
+    "confidex_explanation_fallback_total",
+    "Explanations answered from the clause table instead of the LLM",
+    ["reason"]
+)
+# explanations that missed their deadline keep running to fill the cache for the next prompt
+background_explanations = set()
+
+def fallback_reason(error):
+    if isinstance(error, CircuitOpen):
+        return "circuit_open"
+    if isinstance(error, asyncio.TimeoutError):
+        return "timeout"
+    return "error"
+
+def finish_in_background(task):
+    background_explanations.add(task)
+
+    def done(task):
+        background_explanations.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print("Background explanation failed:", repr(task.exception()))
+
+    task.add_done_callback(done)
+
+async def explain_groups(grouped, user=None, deadline=None):
+    if not grouped:
+        return []
+    # All groups are explained concurrently, so the wait is the slowest group rather than the sum
+    tasks = []
+    for entity_group, words in grouped.items():
+        question, spans = explanation_question(entity_group, words)
+        tasks.append(asyncio.ensure_future(aask_document_question(question, user=user, spans=spans)))
+    timeout = None if deadline is None else max(deadline - time.perf_counter(), MIN_EXPLAIN_WAIT_S)
+    done, pending = await asyncio.wait(tasks, timeout=timeout)
+    for task in pending:
+        finish_in_background(task)
+
+    flagged = []
+    for (entity_group, words), task in zip(grouped.items(), tasks):
+        if task in done and task.exception() is None:
+            explanation, source = task.result(), "llm"
+        else:
+            reason = "deadline" if task in pending else fallback_reason(task.exception())
+            if task in done:
+                print(f"Explanation of {entity_group} failed, using the clause table:", repr(task.exception()))
+            explanation_fallbacks.inc(reason=reason)
+            explanation, source = (await clause_table.aget()).explanation(entity_group), "policy_table"
+        flagged.append({
+            "entity_group": entity_group,
+            "words": words,
+            "explanation": explanation,
+            "explanation_source": source
+        })
+    return flagged
+
+# Structured identifiers (NRIC/FIN, cards, keys, tokens, invoice/PO ids, phones, emails) are also
+# matched by the validated rule engine, whose matches replace overlapping model spans
+RULE_ENGINE = os.getenv("RULE_ENGINE", "1") == "1"
+
+async def detect_spans(text):
+    raw_spans = await detect_entities(text)
+    if RULE_ENGINE:
+        with metrics.stage("rule_engine"):
+            raw_spans = rule_engine.merge_rule_matches(raw_spans, rule_engine.scan_spans(text))
+    return raw_spans
+
+async def find_sensitive_groups(text):
+    return group_spans(text, await detect_spans(text))
+
+def group_spans(text, raw_spans):
+    with metrics.stage("merge_amounts"):
         # Only keep entities with score >= 0.15
-        entities = [ent for ent in raw_entities if ent['score'] >= 0.15]
-        print("Entities used for merging:", entities)
+        spans = [span for span in raw_spans if span.score >= 0.15]
         # Improved merging for financial/amount/percentage entities
-        entities = merge_amount_entities(entities, request.text)
-        print("Merged entities:", entities)
-
-        # Group entities by type
-        grouped = defaultdict(list)
-        for ent in entities:
-            original_word = request.text[ent['start']:ent['end']]
-            grouped[ent['entity_group']].append(original_word)
-
-        flagged = []
-        for entity_group, words in grouped.items():
-            words_str = ', '.join(words)
-            q = f"Why is {entity_group} like '{words_str}' sensitive?"
-            explanation = ask_document_question(q)
-            print(f"Q: {q}\nA: {explanation}")
-            flagged.append({
-                "entity_group": entity_group,
-                "words": words,
-                "explanation": explanation
-            })
+        spans = merge_amount_entities(spans)
+
+    # Group entities by type
+    grouped = defaultdict(list)
+    for span in spans:
+        grouped[span.label].append(text[span.start:span.end])
+    for label, words in grouped.items():
+        metrics.entities_total.inc(len(words), label=label)
+    return grouped
+
+async def scan_text(text, explain=True, endpoint="/scan", user=None):
+    start = time.perf_counter()
+    try:
+        grouped = await find_sensitive_groups(text)
+
+        if explain:
+            flagged = await explain_groups(grouped, user, deadline=start + SCAN_DEADLINE_S)
+        else:
+            flagged = [{"entity_group": group, "words": words} for group, words in grouped.items()]
 
         verdict = "BLOCK" if flagged else "ALLOW"
-        return to_python_type({
+        metrics.scan_seconds.observe(time.perf_counter() - start, endpoint=endpoint)
+        return {
             "verdict": verdict,
             "flagged": flagged
-        })
+        }
+    except Overloaded:
+        # answered with 503 by overloaded_handler, so clients can back off and retry
+        raise
     except Exception as e:
         print("Error in /scan:", e)
         return {
@@ -121,6 +335,239 @@ def scan(request: ScanRequest):
             "error": str(e)
         }
 
+@app.post("/scan")
+async def scan(request: ScanRequest):
+    return await scan_text(request.text, user=request.user)
+
+def sse_event(event, data):
+    return b"event: " + event.encode() + b"\ndata: " + dumps(data) + b"\n\n"
+
+@app.post("/scan/stream")
+async def scan_stream(request: ScanRequest):
+    """Server-sent events: the verdict as soon as NER is done, then each group's explanation token by token."""
+    async def events():
+        start = time.perf_counter()
+        try:
+            grouped = await find_sensitive_groups(request.text)
+        except Exception as e:
+            print("Error in /scan/stream:", e)
+            yield sse_event("error", {"verdict": "ERROR", "error": str(e)})
+            return
+
+        yield sse_event("verdict", {
+            "verdict": "BLOCK" if grouped else "ALLOW",
+            "flagged": [{"entity_group": group, "words": words} for group, words in grouped.items()]
+        })
+
+        # Explanations for all groups are generated concurrently and their tokens interleaved
+        queue = asyncio.Queue()
+
+        async def explain(entity_group, words):
+            chunks = []
+            try:
+                question, spans = explanation_question(entity_group, words)
+                async for chunk in astream_document_question(question, user=request.user, spans=spans):
+                    chunks.append(chunk)
+                    await queue.put(sse_event("token", {"entity_group": entity_group, "token": chunk}))
+            except Exception as e:
+                print("Error in /scan/stream explanation:", repr(e))
+                # tokens already sent are superseded by the clause table explanation
+                explanation_fallbacks.inc(reason=fallback_reason(e))
+                await queue.put(sse_event("explanation", {
+                    "entity_group": entity_group,
+                    "explanation": (await clause_table.aget()).explanation(entity_group),
+                    "explanation_source": "policy_table"
+                }))
+                return
+            await queue.put(sse_event("explanation", {
+                "entity_group": entity_group, "explanation": "".join(chunks), "explanation_source": "llm"
+            }))
+
+        tasks = [asyncio.ensure_future(explain(entity_group, words)) for entity_group, words in grouped.items()]
+        finished = asyncio.ensure_future(asyncio.gather(*tasks))
+        finished.add_done_callback(lambda _: queue.put_nowait(None))
+        try:
+            while True:
+                event = await queue.get()
+                if event is None:
+                    break
+                yield event
+        finally:
+            for task in tasks:
+                task.cancel()
+        metrics.scan_seconds.observe(time.perf_counter() - start, endpoint="/scan/stream")
+        yield sse_event("done", {})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+# Bulk scanning: at most this many batch items are in flight at once, which also
+# throttles how fast an NDJSON upload is read
+SCAN_BATCH_CONCURRENCY = int(os.getenv("SCAN_BATCH_CONCURRENCY", "64"))
+
+def parse_ndjson_line(line):
+    # A bad line only fails its own item, the rest of the upload is still scanned
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return {"error": f"invalid NDJSON line: {e}"}
+
+async def iter_batch_items(request: Request):
+    """Yields (id, text) pairs from a JSON list / {"items": [...]} body or an NDJSON stream."""
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonl" in content_type:
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield parse_ndjson_line(line)
+        if buffer.strip():
+            yield parse_ndjson_line(buffer)
+    else:
+        body = await request.json()
+        items = body["items"] if isinstance(body, dict) else body
+        for item in items:
+            yield item
+
+class UploadStreamingResponse(StreamingResponse):
+    # StreamingResponse normally listens for client disconnects by reading from the
+    # request channel, which would steal chunks of an upload still being read.
+    # Disconnects are still noticed when writing the next line fails.
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+
+@app.post("/scan/batch")
+async def scan_batch(request: Request, explain: bool = True):
+    results = asyncio.Queue()
+    limit = asyncio.Semaphore(SCAN_BATCH_CONCURRENCY)
+    done = object()
+
+    async def scan_item(item):
+        try:
+            result = await scan_text(item["text"], explain=explain, endpoint="/scan/batch", user=item.get("user"))
+        except Overloaded as e:
+            ner_rejected.inc()
+            result = {"verdict": "ERROR", "flagged": [], "error": f"NER is overloaded: {e}"}
+        finally:
+            limit.release()
+        await results.put({"id": item.get("id"), **result})
+
+    async def feed():
+        submitted = 0
+        try:
+            async for item in iter_batch_items(request):
+                await limit.acquire()
+                if not isinstance(item, dict) or "text" not in item:
+                    limit.release()
+                    item = item if isinstance(item, dict) else {}
+                    error = item.get("error", "item must have a 'text' field")
+                    await results.put({"id": item.get("id"), "verdict": "ERROR", "flagged": [], "error": error})
+                else:
+                    asyncio.ensure_future(scan_item(item))
+                submitted += 1
+        except Exception as e:
+            await results.put({"id": None, "verdict": "ERROR", "flagged": [], "error": f"invalid batch body: {e}"})
+            submitted += 1
+        await results.put((done, submitted))
+
+    async def stream():
+        feeder = asyncio.ensure_future(feed())
+        received, total = 0, None
+        try:
+            while total is None or received < total:
+                result = await results.get()
+                if isinstance(result, tuple) and result[0] is done:
+                    total = result[1]
+                    continue
+                received += 1
+                yield dumps(result) + b"\n"
+        finally:
+            feeder.cancel()
+
+    return UploadStreamingResponse(stream(), media_type="application/x-ndjson")
+
+# Scan-as-you-type: NER results are cached per sentence, shared by all connections
+INCREMENTAL_CACHE_SIZE = int(os.getenv("INCREMENTAL_CACHE_SIZE", "4096"))
+segment_cache = SegmentCache(INCREMENTAL_CACHE_SIZE)
+segments_total = metrics.Counter(
+    "confidex_incremental_segments_total",
+    "Sentences seen by /ws/scan, by whether they were served from the cache or scanned",
+    ["result"]
+)
+
+@app.websocket("/ws/scan")
+async def scan_websocket(websocket: WebSocket):
+    """Client messages: {"seq", "text"} to replace the draft or {"seq", "edits": [{"start", "end", "text"}]},
+    plus optional "explain" and "user". Each reply is the /scan result for the latest draft with its "seq";
+    edits that arrive while a scan is running are folded into the next scan instead of queueing up."""
+    await websocket.accept()
+    state = {"text": "", "seq": None, "explain": False, "user": None, "error": None}
+    changed = asyncio.Event()
+
+    async def receive():
+        while True:
+            raw = await websocket.receive_text()
+            try:
+                message = json.loads(raw)
+                state["seq"] = message.get("seq")
+                if "text" in message:
+                    state["text"] = message["text"]
+                if "edits" in message:
+                    state["text"] = apply_edits(state["text"], message["edits"])
+            except (ValueError, KeyError, TypeError) as e:
+                state["error"] = f"invalid message: {e}"
+                changed.set()
+                continue
+            state["explain"] = message.get("explain", state["explain"])
+            state["user"] = message.get("user", state["user"])
+            changed.set()
+
+    receiver = asyncio.ensure_future(receive())
+    try:
+        while True:
+            waiter = asyncio.ensure_future(changed.wait())
+            await asyncio.wait({waiter, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if receiver.done():
+                # the client disconnected
+                waiter.cancel()
+                break
+            changed.clear()
+            text, seq = state["text"], state["seq"]
+            if state["error"] is not None:
+                reply = {"seq": seq, "verdict": "ERROR", "flagged": [], "error": state["error"]}
+                state["error"] = None
+            else:
+                reply = await scan_draft(text, state["explain"], state["user"])
+                reply["seq"] = seq
+            await websocket.send_text(dumps(reply).decode("utf-8"))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+
+async def scan_draft(text, explain, user):
+    start = time.perf_counter()
+    try:
+        spans, segments, scanned = await incremental_spans(text, detect_spans, segment_cache)
+        segments_total.inc(segments - scanned, result="cached")
+        segments_total.inc(scanned, result="scanned")
+        grouped = group_spans(text, spans)
+        if explain:
+            flagged = await explain_groups(grouped, user, deadline=start + SCAN_DEADLINE_S)
+        else:
+            flagged = [{"entity_group": group, "words": words} for group, words in grouped.items()]
+    except Exception as e:
+        print("Error in /ws/scan:", e)
+        return {"verdict": "ERROR", "flagged": [], "error": str(e)}
+    metrics.scan_seconds.observe(time.perf_counter() - start, endpoint="/ws/scan")
+    return {
+        "verdict": "BLOCK" if flagged else "ALLOW",
+        "flagged": flagged,
+        "segments": segments,
+        "rescanned": scanned
+    }
+
 @app.post("/api/privacy-check")
-def privacy_check(request: ScanRequest):
-    return scan(request)
\ No newline at end of file
+async def privacy_check(request: ScanRequest):
+    return await scan(request)
\ No newline at end of file
@@ -0,0 +1,94 @@
+import time
+import threading
+from contextlib import contextmanager
+from metrics import Gauge, Counter
+
+# A dependency that keeps timing out gets no new work for a while: after failure_threshold
+# consecutive failures the breaker opens and calls fail immediately with CircuitOpen. After
+# reset_timeout_s one trial call is let through (half-open); its success closes the breaker,
+# its failure opens it again for another reset_timeout_s.
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+breakers = []
+
+
+class CircuitOpen(RuntimeError):
+    """Raised instead of calling a dependency whose breaker is open."""
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=5, reset_timeout_s=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+        breakers.append(self)
+
+    def allow(self):
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout_s:
+                    return False
+                self.state = HALF_OPEN
+            # half-open: a single trial call at a time
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def check(self):
+        if not self.allow():
+            circuit_rejections.inc(breaker=self.name)
+            raise CircuitOpen(f"{self.name} is unavailable after {self.failures} consecutive failures, retrying later")
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    circuit_opened.inc(breaker=self.name)
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def release(self):
+        # the call ended without telling whether the dependency works (e.g. it was cancelled)
+        with self._lock:
+            self._probing = False
+
+    @contextmanager
+    def call(self):
+        """with breaker.call(): ... raises CircuitOpen when open, otherwise records how the block ended."""
+        self.check()
+        try:
+            yield
+        except Exception:
+            self.record_failure()
+            raise
+        except BaseException:
+            self.release()
+            raise
+        self.record_success()
+
+
+circuit_state = Gauge(
+    "confidex_circuit_state",
+    "Circuit breaker state (0 closed, 1 half-open, 2 open)",
+    lambda: {breaker.name: STATE_VALUES[breaker.state] for breaker in breakers},
+    ["breaker"]
+)
+circuit_opened = Counter("confidex_circuit_opened_total", "Times a circuit breaker opened", ["breaker"])
+circuit_rejections = Counter("confidex_circuit_rejections_total", "Calls refused by an open circuit breaker", ["breaker"])
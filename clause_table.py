@@ -0,0 +1,126 @@
+import re
+import json
+import argparse
+from datetime import datetime, timezone
+from pypdf import PdfReader
+from policy_index import sha256_file
+
+# Precomputed explanation per entity label, taken from the policy clauses. /scan answers with these
+# when the LLM explanation misses the request's deadline or the LLM is unavailable, so a slow LLM
+# costs explanation quality instead of the verdict. Rebuild whenever the policy PDF changes:
+#
+#   python clause_table.py                      # extract the clause text from policy4.pdf
+#   python clause_table.py --llm                # or have the RAG chain phrase each explanation
+CLAUSE_TABLE_PATH = "clause_table.json"
+DEFAULT_CLAUSE = "4.1"
+
+CLAUSE = re.compile(r"Clause (\d+(?:\.\d+)+|\d+\.\d+):\s*")
+# trailing section heading glued to the last clause of a section, e.g. " 3.2 Financial Data"
+SECTION_HEADING = re.compile(r"\s+\d+(?:\.\d+)?\.?\s+[A-Z][A-Za-z&()/ ]*$")
+# labels whose clause heading is worded differently from the label
+HEADING_ALIASES = {
+    "PHONE": "MOBILE NUMBER",
+    "EMAIL": "EMAIL ADDRESS",
+    "AMOUNT_MONEY": "AMOUNT OF MONEY",
+    "KEY": "ENCRYPTION KEY",
+    "SOURCE_CODE": "SOURCE CODE WITH CREDENTIALS",
+    "FINANCIAL": "FINANCIAL REPORT",
+}
+
+
+def policy_text(pdf_path):
+    return re.sub(r"\s+", " ", " ".join(page.extract_text() or "" for page in PdfReader(pdf_path).pages))
+
+
+def parse_clauses(text):
+    """{clause number: (heading, text)}; heading is the upper case title before "Employees must", or ""."""
+    matches = list(CLAUSE.finditer(text))
+    clauses = {}
+    for match, following in zip(matches, matches[1:] + [None]):
+        body = text[match.end():following.start() if following else len(text)]
+        body = SECTION_HEADING.sub("", body.split("●")[0].strip()).strip()
+        heading, sep, rest = body.partition(" Employees must")
+        if sep:
+            clauses[match.group(1)] = (heading.strip(), "Employees must" + rest)
+        else:
+            clauses[match.group(1)] = ("", body)
+    return clauses
+
+
+def match_clause(label, clauses):
+    wanted = HEADING_ALIASES.get(label, label).replace("_", " ").upper()
+    for number, (heading, _) in clauses.items():
+        if heading.replace("_", " ").upper() == wanted:
+            return number
+    for number, (heading, _) in clauses.items():
+        if heading and heading.replace("_", " ").upper().startswith(wanted):
+            return number
+    return None
+
+
+def build_clause_table(pdf_path, labels, ask=None):
+    """ask(label, clause number, clause text) -> explanation replaces the extracted clause text when given."""
+    clauses = parse_clauses(policy_text(pdf_path))
+    default_heading, default_text = clauses[DEFAULT_CLAUSE]
+    entries = {}
+    for label in labels:
+        number = match_clause(label, clauses) or DEFAULT_CLAUSE
+        heading, text = clauses[number]
+        explanation = f"Clause {number}: {text}"
+        if ask is not None:
+            explanation = ask(label, number, text)
+        entries[label] = {"clause": number, "heading": heading, "explanation": explanation}
+    return {
+        "policy": pdf_path,
+        "policy_sha256": sha256_file(pdf_path),
+        "generated_at": datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+        "default": {"clause": DEFAULT_CLAUSE, "explanation": f"Clause {DEFAULT_CLAUSE}: {default_text}"},
+        "labels": entries,
+    }
+
+
+class ClauseTable:
+    def __init__(self, table):
+        self.labels = table.get("labels", {})
+        self.default = table.get("default", {}).get(
+            "explanation", "This data is classified as sensitive by the data protection policy and must not be shared."
+        )
+
+    def explanation(self, label):
+        entry = self.labels.get(label)
+        return entry["explanation"] if entry else self.default
+
+
+def load_clause_table(path=CLAUSE_TABLE_PATH, pdf_path=None):
+    try:
+        with open(path) as f:
+            table = json.load(f)
+    except FileNotFoundError:
+        print(f"{path} not found, slow explanations fall back to a generic message. Run: python clause_table.py")
+        return ClauseTable({})
+    if pdf_path is not None and table.get("policy_sha256") != sha256_file(pdf_path):
+        print(f"{path} was built from a different version of {pdf_path}, rebuild it with: python clause_table.py")
+    return ClauseTable(table)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute the fallback explanation of every sensitive label")
+    parser.add_argument("--output", default=CLAUSE_TABLE_PATH)
+    parser.add_argument("--llm", action="store_true", help="phrase the explanations with the RAG chain (needs Ollama)")
+    args = parser.parse_args()
+
+    import rag
+    ask = None
+    if args.llm:
+        chain = rag.rag_chain.get()
+
+        def ask(label, number, text):
+            # straight to the chain: an offline build is not a flagged prompt and should not be audited
+            return chain.invoke(f"Why is {label} sensitive? The relevant policy clause is {number}.")
+
+    table = build_clause_table(rag.PDF_PATH, rag.sensitive_terms, ask)
+    with open(args.output, "w") as f:
+        json.dump(table, f, indent=2, ensure_ascii=False)
+    for label, entry in table["labels"].items():
+        print(f"{label:<18} clause {entry['clause']:<7} {entry['heading'] or '(general)'}")
+    print(f"Wrote {len(table['labels'])} labels to {args.output}")
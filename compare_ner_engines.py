@@ -0,0 +1,78 @@
+import time
+import argparse
+import numpy as np
+from datasets import load_from_disk
+from seqeval.metrics import f1_score
+from ner_engine import load_ner_engine
+
+# Parity and latency check of the ONNX engines against the torch model:
+#   python compare_ner_engines.py --engines onnx-fp32 onnx-int8
+
+
+def join_tokens(tokens):
+    """Joins dataset tokens with spaces, returning the text and each token's character span."""
+    spans = []
+    pos = 0
+    for token in tokens:
+        spans.append((pos, pos + len(token)))
+        pos += len(token) + 1
+    return " ".join(tokens), spans
+
+
+def entities_to_tags(entities, token_spans):
+    # Word-level BIO tags, so predictions are comparable with the dataset's ner_tags
+    tags = ["O"] * len(token_spans)
+    for ent in entities:
+        inside = [i for i, (start, end) in enumerate(token_spans) if start < ent["end"] and end > ent["start"]]
+        for j, i in enumerate(inside):
+            tags[i] = ("B-" if j == 0 else "I-") + ent["entity_group"]
+    return tags
+
+
+def run_engine(engine, texts, batch_size):
+    predictions = []
+    batch_seconds = []
+    # Warm up once so the first batch doesn't count allocation costs
+    engine(texts[:batch_size])
+    for i in range(0, len(texts), batch_size):
+        batch = texts[i:i + batch_size]
+        start = time.perf_counter()
+        predictions.extend(engine(batch))
+        batch_seconds.append(time.perf_counter() - start)
+    return predictions, np.array(batch_seconds)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare ONNX NER engines with the torch model")
+    parser.add_argument("--model", default="modelv1")
+    parser.add_argument("--onnx-dir", default="modelv1-onnx")
+    parser.add_argument("--engines", nargs="+", default=["onnx-fp32", "onnx-int8"])
+    parser.add_argument("--datasets", nargs="+", default=["independent_testset", "robust_testset"])
+    parser.add_argument("--batch-size", type=int, default=16)
+    args = parser.parse_args()
+
+    engines = {name: load_ner_engine(name, args.model, args.onnx_dir) for name in ["torch"] + args.engines}
+
+    for dataset_path in args.datasets:
+        dataset = load_from_disk(dataset_path)
+        joined = [join_tokens(ex["tokens"]) for ex in dataset]
+        texts = [text for text, _ in joined]
+        gold = [ex["ner_tags"] for ex in dataset]
+        print(f"\n=== {dataset_path} ({len(texts)} examples, batch size {args.batch_size}) ===")
+        print(f"{'engine':<10} {'F1 vs gold':>10} {'F1 drift':>9} {'F1 vs torch':>11} {'ms/example':>11} {'p95 ms/batch':>13} {'speedup':>8}")
+
+        reference = None
+        reference_f1 = None
+        reference_ms = None
+        for name, engine in engines.items():
+            entities, batch_seconds = run_engine(engine, texts, args.batch_size)
+            tags = [entities_to_tags(ents, spans) for ents, (_, spans) in zip(entities, joined)]
+            f1 = f1_score(gold, tags)
+            ms_per_example = 1000 * batch_seconds.sum() / len(texts)
+            if reference is None:
+                reference, reference_f1, reference_ms = tags, f1, ms_per_example
+            agreement = f1_score(reference, tags) if any(any(t != "O" for t in seq) for seq in reference) else 1.0
+            print(
+                f"{name:<10} {f1:>10.4f} {f1 - reference_f1:>+9.4f} {agreement:>11.4f} "
+                f"{ms_per_example:>11.2f} {1000 * np.percentile(batch_seconds, 95):>13.1f} {reference_ms / ms_per_example:>7.2f}x"
+            )
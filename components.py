@@ -0,0 +1,107 @@
+import time
+import asyncio
+import threading
+import traceback
+from metrics import rss_bytes
+
+# Heavy resources (models, vector store, LLM client, databases) are registered here and
+# built on first use or by the background startup thread, never at import time.
+registry = {}
+
+
+class Component:
+    def __init__(self, name, loader, warmup=None):
+        self.name = name
+        self.loader = loader
+        self.warmup = warmup
+        self.state = "pending"  # pending -> loading -> ready | failed
+        self.error = None
+        self.load_seconds = None
+        self.warmup_seconds = None
+        self.warm = False
+        self.rss_bytes = None
+        self._value = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self.state == "ready"
+
+    def get(self):
+        """Returns the component, loading it first if needed. A failed load is retried on the next call."""
+        if self.state == "ready":
+            return self._value
+        with self._lock:
+            if self.state != "ready":
+                self.state = "loading"
+                start = time.perf_counter()
+                rss_before = rss_bytes()
+                try:
+                    self._value = self.loader()
+                except Exception as e:
+                    self.state = "failed"
+                    self.error = str(e)
+                    raise
+                self.load_seconds = time.perf_counter() - start
+                rss_after = rss_bytes()
+                if rss_before is not None and rss_after is not None:
+                    # approximate: other threads may allocate while this one loads
+                    self.rss_bytes = max(rss_after - rss_before, 0)
+                self.error = None
+                self.state = "ready"
+        return self._value
+
+    async def aget(self):
+        # Loading can take minutes, never do it on the event loop
+        if self.state == "ready":
+            return self._value
+        return await asyncio.to_thread(self.get)
+
+    def warm_up(self):
+        value = self.get()
+        if self.warm:
+            return
+        if self.warmup is not None:
+            start = time.perf_counter()
+            try:
+                self.warmup(value)
+            except Exception as e:
+                # a failed warmup only costs latency on the first real request
+                print(f"Warmup of {self.name} failed:", e)
+            self.warmup_seconds = time.perf_counter() - start
+        self.warm = True
+
+    def status(self):
+        return {
+            "state": self.state,
+            "warm": self.warm,
+            "load_seconds": self.load_seconds,
+            "warmup_seconds": self.warmup_seconds,
+            "rss_bytes": self.rss_bytes,
+            "error": self.error,
+        }
+
+
+def register(name, loader, warmup=None):
+    component = Component(name, loader, warmup)
+    registry[name] = component
+    return component
+
+
+def status():
+    return {name: component.status() for name, component in registry.items()}
+
+
+def warm_up_in_background(names):
+    """Loads and warms the named components one after another in a daemon thread."""
+    def run():
+        for name in names:
+            try:
+                registry[name].warm_up()
+            except Exception:
+                print(f"Loading {name} failed:")
+                traceback.print_exc()
+
+    thread = threading.Thread(target=run, name="component-warmup", daemon=True)
+    thread.start()
+    return thread
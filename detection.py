@@ -11,26 +11,11 @@ def detect_sensitive_spans(text):
     results = ner_pipeline(text)
     return results
 
-import re
+import rule_engine
 
 def regex_pii(text):
-    patterns = {
-        "EMAIL": r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b",
-        "PHONE": r"\b\d{3}[-.\s]??\d{3}[-.\s]??\d{4}\b",
-        "CREDIT_CARD": r"\b(?:\d[ -]*?){13,16}\b",
-        # Add more as needed
-    }
-    matches = []
-    for label, pattern in patterns.items():
-        for match in re.finditer(pattern, text):
-            matches.append({
-                "entity_group": label,
-                "score": 1.0,
-                "word": match.group(),
-                "start": match.start(),
-                "end": match.end()
-            })
-    return matches
+    # Single compiled pass with checksum/Luhn validation, see rule_engine.py
+    return rule_engine.scan(text)
 
 def get_all_sensitive_spans(text):
     model_spans = detect_sensitive_spans(text)
@@ -0,0 +1,251 @@
+import os
+import re
+import json
+import hashlib
+import argparse
+import threading
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# Embedding backends for policy retrieval, all LangChain Embeddings so they plug into the vector
+# stores unchanged:
+#   ollama   LLM_MODEL served by Ollama (llama3.1, 4096 dims): a round trip to the LLM server per query
+#   hashing  hashed TF-IDF over words and word pairs (2048 dims): no model, ~tens of microseconds per query
+#   onnx     a small sentence encoder run in-process with onnxruntime (all-MiniLM-L6-v2: 384 dims,
+#            ~a millisecond per query on CPU), exported with: python export_onnx.py --task sentence
+#
+# The backend's name is stored with every index, so switching backends rebuilds the index
+# instead of mixing vectors. python evaluate_embeddings.py compares their retrieval quality.
+#
+# The ollama and onnx backends hold an HTTP client with keep-alive sockets / an onnxruntime
+# session with its thread pool, neither of which survives a fork: they are built on first use in
+# the process that embeds (LazyEmbeddings), so the pre-fork parent can load a saved index without them.
+
+BACKENDS = ("ollama", "hashing", "onnx")
+HASHING_DIMENSIONS = 2048
+WORD = re.compile(r"[a-z0-9]+")
+
+
+class LazyEmbeddings(Embeddings):
+    """Builds the backend with factory() on first use, separately in every process."""
+
+    def __init__(self, factory, name):
+        self.factory = factory
+        self.name = name
+        # one instance per pid: a forked child never touches (or destroys) its parent's
+        self._instances = {}
+        self._lock = threading.Lock()
+
+    @property
+    def embedding(self):
+        pid = os.getpid()
+        instance = self._instances.get(pid)
+        if instance is None:
+            with self._lock:
+                instance = self._instances.get(pid)
+                if instance is None:
+                    instance = self._instances[pid] = self.factory()
+        return instance
+
+    def release(self):
+        """Drops this process's backend, e.g. in the pre-fork parent once the index is built."""
+        self._instances.pop(os.getpid(), None)
+
+    def embed_documents(self, texts):
+        return self.embedding.embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.embedding.embed_query(text)
+
+
+def embedding_name(embedding):
+    """Identifies the vectors an embedding produces, e.g. "ollama:llama3.1" or "hashing:2048:tf"."""
+    if hasattr(embedding, "name"):
+        return embedding.name
+    return f"ollama:{embedding.model}"
+
+
+class HashingEmbeddings(Embeddings):
+    """Signed feature hashing of words and word pairs, weighted by sublinear TF and (optionally) IDF.
+
+    Policy questions and clauses share their key words ("NRIC", "passport", "salary"), which is
+    what retrieval needs here; unlike an LLM embedding it does not know synonyms.
+    """
+
+    def __init__(self, dimensions=HASHING_DIMENSIONS, idf=None):
+        self.dimensions = dimensions
+        self.idf = None if idf is None else np.asarray(idf, dtype=np.float32)
+        self._buckets = {}
+        digest = "tf" if self.idf is None else hashlib.sha256(self.idf.tobytes()).hexdigest()[:12]
+        self.name = f"hashing:{dimensions}:{digest}"
+
+    def bucket(self, feature):
+        # blake2b rather than hash(): the vectors must not change between processes
+        cached = self._buckets.get(feature)
+        if cached is None:
+            value = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+            cached = (value % self.dimensions, 1.0 if value >> 63 else -1.0)
+            if len(self._buckets) < 1 << 20:
+                self._buckets[feature] = cached
+        return cached
+
+    def features(self, text):
+        # ACCOUNT_NUMBER and "account number" are the same words
+        words = WORD.findall(text.lower().replace("_", " "))
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def counts(self, text):
+        """{bucket: signed, sublinear term frequency} of text."""
+        counts = {}
+        for feature in self.features(text):
+            bucket, sign = self.bucket(feature)
+            counts[bucket] = counts.get(bucket, 0.0) + sign
+        return {bucket: np.sign(count) * (1.0 + np.log(abs(count))) for bucket, count in counts.items() if count}
+
+    def embed(self, text):
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        counts = self.counts(text)
+        if counts:
+            buckets = np.fromiter(counts, dtype=np.int64, count=len(counts))
+            vector[buckets] = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+            if self.idf is not None:
+                vector[buckets] *= self.idf[buckets]
+            norm = np.linalg.norm(vector)
+            if norm:
+                vector /= norm
+        return vector
+
+    def embed_documents(self, texts):
+        return [self.embed(text).tolist() for text in texts]
+
+    def embed_query(self, text):
+        return self.embed(text).tolist()
+
+    def fit(self, texts):
+        """A copy weighted by the smoothed IDF of every bucket over texts (the policy chunks)."""
+        df = np.zeros(self.dimensions, dtype=np.float64)
+        for text in texts:
+            df[list(self.counts(text))] += 1
+        idf = np.log((1 + len(texts)) / (1 + df)) + 1
+        return HashingEmbeddings(self.dimensions, idf)
+
+    @classmethod
+    def from_idf_file(cls, path):
+        idf = np.load(path)
+        return cls(len(idf), idf)
+
+
+class OnnxSentenceEmbeddings(Embeddings):
+    """Mean-pooled, L2-normalized token states of a sentence encoder exported to ONNX.
+
+    Documents are encoded in batches of similar length so padding stays small.
+    """
+
+    def __init__(self, model_dir, quantized=False, batch_size=32, max_length=256, num_threads=None):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+        from ner_engine import ONNX_FP32_FILE, ONNX_INT8_FILE
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        path = os.path.join(model_dir, ONNX_INT8_FILE if quantized else ONNX_FP32_FILE)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"{path} not found, run: python export_onnx.py --task sentence --output {model_dir}")
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {node.name for node in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.name = onnx_name(model_dir, quantized)
+
+    def encode(self, texts):
+        encoding = self.tokenizer(texts, padding=True, truncation=True, max_length=self.max_length, return_tensors="np")
+        inputs = {name: encoding[name].astype(np.int64) for name in ("input_ids", "attention_mask", "token_type_ids")
+                  if name in self.input_names and name in encoding}
+        states = self.session.run(None, inputs)[0]
+        mask = encoding["attention_mask"][..., None].astype(np.float32)
+        pooled = (states * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        return pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+
+    def embed_documents(self, texts):
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            for i, vector in zip(batch, self.encode([texts[i] for i in batch])):
+                vectors[i] = vector.tolist()
+        return vectors
+
+    def embed_query(self, text):
+        return self.encode([text])[0].tolist()
+
+
+def onnx_name(model_dir, quantized=False):
+    return f"onnx:{os.path.basename(os.path.normpath(model_dir))}{':int8' if quantized else ''}"
+
+
+def idf_corpus(idf_path):
+    """The corpus version recorded next to an IDF file by save_idf_file, or None."""
+    try:
+        with open(idf_path + ".json") as f:
+            return json.load(f).get("corpus")
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def save_idf_file(embedding, idf_path, corpus=None):
+    """Saves the IDF and, next to it, the version of the corpus it was fitted on."""
+    from policy_index import replace_file, write_json
+
+    def write(path):
+        with open(path, "wb") as f:
+            np.save(f, embedding.idf)
+    # renamed into place: workers starting together may fit and save at the same time
+    replace_file(idf_path, write)
+    write_json(idf_path + ".json", {"corpus": corpus, "name": embedding.name})
+
+
+def load_embeddings(backend, ollama_model="llama3.1", ollama_base_url=None, client_kwargs=None,
+                    model_dir="minilm-onnx", quantized=False, idf_path=None, fit_texts=None, corpus=None):
+    """The embedding backend by name.
+
+    hashing uses the IDF saved at idf_path. With fit_texts (a callable returning the corpus), the
+    IDF is fitted on it and saved there when there is no file yet or the file was fitted on
+    another corpus version (e.g. the policy PDF's hash); without, plain TF weighting is used when
+    there is no file.
+    """
+    if backend == "ollama":
+        def ollama():
+            from langchain_ollama import OllamaEmbeddings
+            kwargs = {"base_url": ollama_base_url} if ollama_base_url else {}
+            return OllamaEmbeddings(model=ollama_model, client_kwargs=client_kwargs or {}, **kwargs)
+        return LazyEmbeddings(ollama, f"ollama:{ollama_model}")
+    if backend == "hashing":
+        stale = fit_texts is not None and corpus is not None and idf_corpus(idf_path or "") != corpus
+        if idf_path and os.path.exists(idf_path) and not stale:
+            return HashingEmbeddings.from_idf_file(idf_path)
+        embedding = HashingEmbeddings()
+        if fit_texts is not None:
+            embedding = embedding.fit(fit_texts())
+            if idf_path:
+                save_idf_file(embedding, idf_path, corpus)
+        return embedding
+    if backend == "onnx":
+        return LazyEmbeddings(lambda: OnnxSentenceEmbeddings(model_dir, quantized=quantized), onnx_name(model_dir, quantized))
+    raise ValueError(f"Unknown embedding backend {backend!r}, expected one of {', '.join(BACKENDS)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fit the IDF weights of the hashing embedding backend")
+    parser.add_argument("pdfs", nargs="+", help="the policy documents the store or index will hold")
+    parser.add_argument("--output", default="embedding_idf.npy")
+    parser.add_argument("--dimensions", type=int, default=HASHING_DIMENSIONS)
+    args = parser.parse_args()
+
+    from policy_index import sha256_file
+    from policy_ingest import extract_pages, clause_chunks
+    texts = [text for pdf in args.pdfs for text, _ in clause_chunks(extract_pages(pdf))]
+    embedding = HashingEmbeddings(args.dimensions).fit(texts)
+    save_idf_file(embedding, args.output, ",".join(sorted(sha256_file(pdf) for pdf in args.pdfs)))
+    print(f"Fitted on {len(texts)} chunks of {len(args.pdfs)} document(s): {embedding.name} -> {args.output}")
@@ -1,7 +1,6 @@
 from transformers import AutoTokenizer, AutoModelForTokenClassification, pipeline
 from rag import ask_document_question  # Import the function from rag.py
-from seqeval.metrics import classification_report, f1_score, accuracy_score, precision_score, recall_score
-import numpy as np
+from ner_metrics import metrics_for
 
 # Use the base Isotonic/distilbert_finetuned_ai4privacy_v2 model
 model_name = "finetuned-sg-privacy-model"
@@ -20,31 +19,8 @@ def handle_ai_output(raw_output):
     # Print the explanation
     print(f"RAG answer: {response}")
 
-def align_predictions(predictions, label_ids):
-    preds = np.argmax(predictions, axis=2)
-    batch_size, seq_len = preds.shape
-    out_label_list = []
-    preds_list = []
-    for i in range(batch_size):
-        example_labels = []
-        example_preds = []
-        for j in range(seq_len):
-            if label_ids[i, j] != -100:
-                example_labels.append(id2label[label_ids[i][j]])
-                example_preds.append(id2label[preds[i][j]])
-        out_label_list.append(example_labels)
-        preds_list.append(example_preds)
-    return preds_list, out_label_list
-
-def compute_metrics(p):
-    preds_list, out_label_list = align_predictions(p.predictions, p.label_ids)
-    return {
-        "precision": precision_score(out_label_list, preds_list),
-        "recall": recall_score(out_label_list, preds_list),
-        "f1": f1_score(out_label_list, preds_list),
-        "accuracy": accuracy_score(out_label_list, preds_list),
-        "report": classification_report(out_label_list, preds_list, output_dict=True)
-    }
+# Same metrics as finetune_sg_ner.py, for Trainer.evaluate on this model
+compute_metrics = metrics_for(model.config.id2label)
 
 if __name__ == "__main__":
     my_test_cases = [
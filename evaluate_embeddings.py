@@ -0,0 +1,176 @@
+import json
+import time
+import argparse
+import numpy as np
+from clause_table import CLAUSE_TABLE_PATH
+from embeddings import load_embeddings, embedding_name
+from policy_ingest import extract_pages, clause_chunks
+from prompt_corpus import ENTITY_SENTENCES
+
+# Offline retrieval quality and latency of the embedding backends on the policy PDF:
+#
+#   python evaluate_embeddings.py                                   # ollama, hashing, hashing-tf
+#   python evaluate_embeddings.py --backends ollama hashing onnx onnx-int8 --output embeddings_eval.json
+#
+# Every label in clause_table.json gets policy questions (the /scan explanation question with a
+# generated value, and plainer phrasings of its clause heading); a question is answered when the
+# chunk of the label's clause is among the top k. Backends are also compared with the first one
+# (llama3.1 by default): agreement@k is the share of its top k chunks they retrieve as well.
+# --questions held-out uses HELD_OUT_QUESTIONS instead, which do not repeat the headings.
+# A backend that cannot be loaded (Ollama down, no exported encoder) is skipped.
+
+KS = (1, 3, 5)
+# How employees actually ask, written without looking at the clause headings or the label aliases
+# of clause_table.py, so a retriever tuned on those cannot score on them for free
+HELD_OUT_QUESTIONS = [
+    ("Can I share my IC number with a chatbot?", "3.1.1"),
+    ("Is it ok to put a foreign worker's identification number in a prompt?", "3.1.2"),
+    ("Can I give an AI assistant my travel document number to fill in a visa form?", "3.1.3"),
+    ("Should I leave out my handphone number when asking ChatGPT to draft a letter?", "3.1.4"),
+    ("Can I paste a customer's e-mail into an AI tool?", "3.1.5"),
+    ("Can I tell the chatbot where I live?", "3.1.6"),
+    ("Is a US social security number allowed in prompts?", "3.1.7"),
+    ("Can I mention a colleague's full name to an AI tool?", "3.1.8"),
+    ("Can I paste my bank details into the assistant?", "3.2.1"),
+    ("Is it safe to type a Visa card number into ChatGPT?", "3.2.2"),
+    ("Can I ask an AI to summarise a client's past payments and spending?", "3.2.3"),
+    ("Can I tell the AI how much I earn and what bonus I got?", "3.2.4"),
+    ("Can I share the sales team's commission percentage?", "3.2.5"),
+    ("Can I mention how many dollars were transferred in a payment?", "3.2.6"),
+    ("Is it fine to share how much is left in my bank account?", "3.2.7"),
+    ("Can I paste next year's department spending plan?", "3.2.8"),
+    ("Can I include the reference number of a supplier's bill?", "3.2.9"),
+    ("Can I give the chatbot a purchase order reference?", "3.2.10"),
+    ("Can I upload our quarterly earnings statements to an AI tool?", "3.2.11"),
+    ("Can I share the discounts and rates we quote a client?", "3.2.12"),
+    ("Is it fine to include our payment provider's secret key in a prompt?", "3.3.1"),
+    ("Can I paste the bearer token from my browser session?", "3.3.2"),
+    ("Can I tell the AI my login password?", "3.3.3"),
+    ("Is it ok to share the key that decrypts our backups?", "3.3.4"),
+    ("Can I paste a script with hard-coded database credentials into ChatGPT?", "3.3.5"),
+    ("Can I mention the internal codename of our new initiative?", "3.4.1"),
+    ("Can I describe features we have not released yet?", "3.4.2"),
+    ("Can I ask an AI to review our merger and acquisition strategy?", "3.4.3"),
+    ("Can I upload a supplier agreement to be summarised?", "3.4.4"),
+    ("Does masking the digits make it ok to share them?", "4.2"),
+    ("What should I do if I accidentally pasted customer data into an AI tool?", "4.4"),
+    ("Are my chats with AI tools being watched?", "6.1"),
+    ("Who is the data protection officer?", "7.1"),
+    ("Can I be fired for breaking this policy again and again?", "8.2"),
+]
+
+
+def policy_questions(table):
+    """[(question, clause)] for every label of the clause table."""
+    values = {label: generate for label, generate, _ in ENTITY_SENTENCES}
+    questions = []
+    for label, entry in table["labels"].items():
+        heading = (entry["heading"] or label).replace("_", " ").lower()
+        # same form as backend_api.explanation_question
+        value = values[label]() if label in values else heading
+        questions += [
+            (f"Why is {label} like '{value}' sensitive?", entry["clause"]),
+            (f"Can I paste my {heading} into an external AI tool?", entry["clause"]),
+            (f"What does the policy say about sharing {heading}?", entry["clause"]),
+        ]
+    return questions
+
+
+def load_backend(spec, args, chunks):
+    if spec == "ollama":
+        return load_embeddings("ollama", ollama_model=args.ollama_model, ollama_base_url=args.ollama_url)
+    if spec == "hashing":
+        return load_embeddings("hashing", fit_texts=lambda: chunks)
+    if spec == "hashing-tf":
+        return load_embeddings("hashing")
+    if spec in ("onnx", "onnx-int8"):
+        return load_embeddings("onnx", model_dir=args.onnx_dir, quantized=spec == "onnx-int8")
+    raise SystemExit(f"Unknown backend {spec}")
+
+
+def percentile(values, q):
+    return sorted(values)[min(int(len(values) * q), len(values) - 1)]
+
+
+def evaluate(embedding, chunks, chunk_clauses, questions, repeats):
+    start = time.perf_counter()
+    matrix = np.asarray(embedding.embed_documents(chunks), dtype=np.float32)
+    encode_s = time.perf_counter() - start
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+    latencies = []
+    query_vectors = []
+    for question, _ in questions:
+        vector = embedding.embed_query(question)
+        for _ in range(repeats):
+            start = time.perf_counter()
+            embedding.embed_query(question)
+            latencies.append(time.perf_counter() - start)
+        query_vectors.append(vector)
+    queries = np.asarray(query_vectors, dtype=np.float32)
+    queries /= np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+    ranking = np.argsort(-(queries @ matrix.T), axis=1)
+
+    relevant = [chunk_clauses == clause for _, clause in questions]
+    hits = np.array([rel[order] for rel, order in zip(relevant, ranking)])
+    first_hit = np.where(hits.any(axis=1), hits.argmax(axis=1) + 1, np.inf)
+    return {
+        "name": embedding_name(embedding),
+        "dimensions": matrix.shape[1],
+        "index_mb": round(matrix.nbytes / 1e6, 2),
+        "encode_chunks_s": round(encode_s, 3),
+        "query_p50_ms": round(percentile(latencies, 0.5) * 1e3, 3),
+        "query_p99_ms": round(percentile(latencies, 0.99) * 1e3, 3),
+        **{f"recall@{k}": round(float((first_hit <= k).mean()), 3) for k in KS},
+        "mrr": round(float((1 / first_hit).mean()), 3),
+    }, ranking
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall@k and query latency of the embedding backends")
+    parser.add_argument("--pdf", default="policy4.pdf")
+    parser.add_argument("--table", default=CLAUSE_TABLE_PATH)
+    parser.add_argument("--backends", nargs="+", default=["ollama", "hashing", "hashing-tf"],
+                        help="ollama, hashing, hashing-tf (no IDF), onnx, onnx-int8; the first is the agreement reference")
+    parser.add_argument("--ollama-model", default="llama3.1")
+    parser.add_argument("--ollama-url", default=None)
+    parser.add_argument("--onnx-dir", default="minilm-onnx")
+    parser.add_argument("--questions", choices=["clause-table", "held-out"], default="clause-table")
+    parser.add_argument("--repeats", type=int, default=5, help="timed embed_query calls per question")
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args()
+
+    with open(args.table) as f:
+        table = json.load(f)
+    chunk_pairs = list(clause_chunks(extract_pages(args.pdf)))
+    chunks = [text for text, _ in chunk_pairs]
+    chunk_clauses = np.array([metadata.get("clause", "") for _, metadata in chunk_pairs])
+    questions = policy_questions(table) if args.questions == "clause-table" else HELD_OUT_QUESTIONS
+    questions = [(q, clause) for q, clause in questions if (chunk_clauses == clause).any()]
+    print(f"{len(chunks)} chunks, {len(questions)} {args.questions} questions")
+
+    results = []
+    reference = None
+    for spec in args.backends:
+        try:
+            embedding = load_backend(spec, args, chunks)
+            result, ranking = evaluate(embedding, chunks, chunk_clauses, questions, args.repeats)
+        except Exception as e:
+            print(f"{spec:<11} skipped: {e}")
+            continue
+        result["backend"] = spec
+        if reference is None:
+            reference = ranking
+        for k in KS:
+            agreement = [len(set(a[:k]) & set(b[:k])) / k for a, b in zip(reference, ranking)]
+            result[f"agreement@{k}"] = round(float(np.mean(agreement)), 3)
+        results.append(result)
+        print(f"{spec:<11} {result['name']:<28} dims {result['dimensions']:>5}  "
+              + "  ".join(f"R@{k} {result[f'recall@{k}']:.3f}" for k in KS)
+              + f"  MRR {result['mrr']:.3f}  agree@3 {result['agreement@3']:.3f}  "
+              f"query p50 {result['query_p50_ms']:.3f} ms p99 {result['query_p99_ms']:.3f} ms  "
+              f"chunks {result['encode_chunks_s']:.2f}s")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"pdf": args.pdf, "question_set": args.questions, "questions": len(questions), "results": results}, f, indent=2)
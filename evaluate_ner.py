@@ -0,0 +1,176 @@
+import os
+import json
+import time
+import argparse
+import numpy as np
+from datasets import DatasetDict, load_from_disk
+from seqeval.metrics import classification_report, f1_score, precision_score, recall_score, accuracy_score
+from ner_engine import ENGINES, load_ner_engine
+
+# Batched word-level evaluation of any model directory or checkpoint on any load_from_disk dataset
+# with "tokens" and "ner_tags" columns:
+#
+#   python evaluate_ner.py --models modelv1 finetuned-sg-privacy-model/checkpoint-865 \
+#       --datasets independent_testset super_robust_testset sg_pdpa_ner_dataset_full:test
+#
+# A saved DatasetDict is evaluated split by split, or only the split named after a colon.
+#
+# Each word is labelled with the prediction for its first sub-token, like training labels it.
+# Examples are sorted by length before batching, so a batch is padded to similar lengths only.
+
+
+def encode_examples(batch, tokenizer, max_length):
+    encoding = tokenizer(batch["tokens"], is_split_into_words=True, truncation=True, max_length=max_length)
+    first_tokens = []
+    for i in range(len(batch["tokens"])):
+        # position of each word's first sub-token; words cut off by truncation are not in here
+        positions = []
+        previous = None
+        for position, word_idx in enumerate(encoding.word_ids(batch_index=i)):
+            if word_idx is not None and word_idx != previous:
+                positions.append(position)
+            previous = word_idx
+        first_tokens.append(positions)
+    return {
+        "input_ids": encoding["input_ids"],
+        "first_tokens": first_tokens,
+        "length": [len(ids) for ids in encoding["input_ids"]],
+    }
+
+
+def tokenize(dataset, tokenizer, max_length, num_proc):
+    return dataset.map(
+        encode_examples,
+        batched=True,
+        num_proc=num_proc,
+        fn_kwargs={"tokenizer": tokenizer, "max_length": max_length},
+        remove_columns=[c for c in dataset.column_names if c != "ner_tags"],
+        desc="Tokenizing"
+    )
+
+
+def pad_batch(rows, pad_id):
+    width = max(len(ids) for ids in rows)
+    input_ids = np.full((len(rows), width), pad_id, dtype=np.int64)
+    attention_mask = np.zeros((len(rows), width), dtype=np.int64)
+    for i, ids in enumerate(rows):
+        input_ids[i, :len(ids)] = ids
+        attention_mask[i, :len(ids)] = 1
+    return input_ids, attention_mask
+
+
+def predict(engine, encoded, batch_size):
+    """Word-level predicted tags for every example (in dataset order) and the seconds spent in forward passes."""
+    id2label = engine.id2label
+    pad_id = engine.tokenizer.pad_token_id or 0
+    order = np.argsort(encoded["length"], kind="stable")
+    input_ids = encoded["input_ids"]
+    first_tokens = encoded["first_tokens"]
+    word_counts = [len(tags) for tags in encoded["ner_tags"]]
+    predictions = [None] * len(order)
+    seconds = 0.0
+    for i in range(0, len(order), batch_size):
+        indexes = order[i:i + batch_size]
+        batch_ids, attention_mask = pad_batch([input_ids[j] for j in indexes], pad_id)
+        start = time.perf_counter()
+        label_ids = engine.forward(batch_ids, attention_mask).argmax(axis=-1)
+        seconds += time.perf_counter() - start
+        for row, j in enumerate(indexes):
+            tags = [id2label[int(label_id)] for label_id in label_ids[row, first_tokens[j]]]
+            # truncated words count as "O", so gold and predicted sequences line up
+            predictions[j] = tags + ["O"] * (word_counts[j] - len(tags))
+    return predictions, seconds
+
+
+def evaluate(engine, dataset, batch_size, max_length, num_proc):
+    start = time.perf_counter()
+    encoded = tokenize(dataset, engine.tokenizer, max_length, num_proc)
+    columns = encoded.to_dict()
+    tokenize_seconds = time.perf_counter() - start
+    # one warmup pass so the first batch doesn't count allocation costs
+    engine.forward(*pad_batch(columns["input_ids"][:1], engine.tokenizer.pad_token_id or 0))
+    predictions, seconds = predict(engine, columns, batch_size)
+    gold = columns["ner_tags"]
+    return {
+        "examples": len(gold),
+        "precision": precision_score(gold, predictions),
+        "recall": recall_score(gold, predictions),
+        "f1": f1_score(gold, predictions),
+        "accuracy": accuracy_score(gold, predictions),
+        "examples_per_s": len(gold) / seconds,
+        "tokens_per_s": sum(columns["length"]) / seconds,
+        "inference_seconds": seconds,
+        "tokenize_seconds": tokenize_seconds,
+        "report": classification_report(gold, predictions, digits=4, output_dict=True, zero_division=0),
+        "report_text": classification_report(gold, predictions, digits=4, zero_division=0),
+    }
+
+
+def load_datasets(paths):
+    """{name: Dataset} for "path" or "path:split" arguments; a DatasetDict without a split gives all its splits."""
+    datasets = {}
+    for path in paths:
+        split = None
+        if ":" in path and not os.path.exists(path):
+            path, split = path.rsplit(":", 1)
+        dataset = load_from_disk(path)
+        if isinstance(dataset, DatasetDict):
+            if split is not None:
+                if split not in dataset:
+                    raise SystemExit(f"{path} has no split {split!r}, it has: {', '.join(dataset)}")
+                datasets[f"{path}:{split}"] = dataset[split]
+            else:
+                datasets.update((f"{path}:{name}", part) for name, part in dataset.items())
+        elif split is not None:
+            raise SystemExit(f"{path} is a single dataset without splits")
+        else:
+            datasets[path] = dataset
+    return datasets
+
+
+def load_engine(engine_name, model_path):
+    if engine_name == "torch":
+        return load_ner_engine("torch", model_dir=model_path)
+    return load_ner_engine(engine_name, onnx_dir=model_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate NER models or checkpoints on saved datasets")
+    parser.add_argument("--models", nargs="+", default=["modelv1"], help="model directories or checkpoints")
+    parser.add_argument("--datasets", nargs="+", default=["independent_testset"],
+                        help="load_from_disk paths; path:split picks one split of a DatasetDict")
+    parser.add_argument("--engine", choices=ENGINES, default="torch", help="onnx-*: the model paths are ONNX export dirs")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--max-length", type=int, default=512)
+    parser.add_argument("--num-proc", type=int, default=min(8, os.cpu_count() or 1), help="tokenizer processes")
+    parser.add_argument("--report", action="store_true", help="print the per-label seqeval report")
+    parser.add_argument("--output", help="write all results to this JSON file")
+    args = parser.parse_args()
+
+    datasets = load_datasets(args.datasets)
+    results = {}
+    for model_path in args.models:
+        start = time.perf_counter()
+        engine = load_engine(args.engine, model_path)
+        print(f"\nLoaded {model_path} ({args.engine}) in {time.perf_counter() - start:.1f}s")
+        width = max(24, *(len(name) for name in datasets))
+        print(f"{'dataset':<{width}} {'examples':>8} {'precision':>9} {'recall':>7} {'F1':>7} {'accuracy':>8} {'ex/s':>8} {'tokens/s':>9}")
+        for dataset_path, dataset in datasets.items():
+            # starting a tokenizer process only pays off for about a thousand examples or more
+            num_proc = min(args.num_proc, max(1, len(dataset) // 1000))
+            result = evaluate(engine, dataset, args.batch_size, args.max_length, num_proc)
+            results.setdefault(model_path, {})[dataset_path] = result
+            print(
+                f"{dataset_path:<{width}} {result['examples']:>8} {result['precision']:>9.4f} {result['recall']:>7.4f} "
+                f"{result['f1']:>7.4f} {result['accuracy']:>8.4f} {result['examples_per_s']:>8.1f} {result['tokens_per_s']:>9.0f}"
+            )
+            if args.report:
+                print(result["report_text"])
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                model: {name: {k: v for k, v in result.items() if k != "report_text"} for name, result in per_dataset.items()}
+                for model, per_dataset in results.items()
+            }, f, indent=2, default=float)
+        print(f"Results written to {args.output}")
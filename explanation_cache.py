@@ -0,0 +1,177 @@
+import re
+import time
+import asyncio
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from metrics import explanation_cache_total
+
+
+def normalize_question(question: str, spans=None) -> str:
+    """Cache key for a question: the literal values are replaced so that
+    "Why is NRIC like 'S1234567A' sensitive?" and "Why is NRIC like 'T7654321B' sensitive?" share an answer.
+
+    spans are the (start, end) offsets of the values in question, known to callers that built it
+    from entities; without them, quoted text is taken as the values (and a value with a quote in
+    it, such as O'Brien, is only partly masked).
+    """
+    if spans is not None:
+        key = question
+        for start, end in sorted(spans, reverse=True):
+            key = key[:start] + "*" + key[end:]
+    else:
+        key = re.sub(r"'[^']*'", "'*'", question)
+        key = re.sub(r'"[^"]*"', "'*'", key)
+    return re.sub(r"\s+", " ", key).strip().lower()
+
+
+def policy_version(*parts: str) -> str:
+    """Hash of everything the answers depend on (policy document hash, prompt template, model name)."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ExplanationCache:
+    """Two-tier (in-memory LRU + SQLite) cache of policy explanations with single-flight misses.
+
+    Entries are stored with the policy version they were generated under, entries from any
+    other version are never served and are dropped when the cache is opened.
+    """
+
+    def __init__(self, db_path, version, max_entries=512, ttl_s=7 * 24 * 3600):
+        self.version = version
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._memory = OrderedDict()
+        self._inflight = {}
+        # the LRU and the SQLite connection have separate locks, so a disk read in a worker
+        # thread never holds up a memory hit on the event loop
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS explanation_cache (
+                key TEXT PRIMARY KEY,
+                version TEXT NOT NULL,
+                explanation TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("DELETE FROM explanation_cache WHERE version != ? OR created_at < ?", (version, time.time() - ttl_s))
+        self._conn.commit()
+
+    def set_version(self, version):
+        """Switches to a new policy version, dropping every entry of the old one."""
+        with self._db_lock:
+            self.version = version
+            self._conn.execute("DELETE FROM explanation_cache WHERE version != ?", (version,))
+            self._conn.commit()
+        with self._lock:
+            self._memory.clear()
+
+    def get(self, key):
+        explanation = self._get_memory(key)
+        return explanation if explanation is not None else self._get_disk(key)
+
+    def put(self, key, explanation):
+        now = time.time()
+        self._remember(key, explanation, now)
+        self._write_disk(key, explanation, now)
+
+    # The async variants answer memory hits right away and run the SQLite part in a worker thread,
+    # so a disk read or the commit of a write never blocks the event loop
+    async def aget(self, key):
+        explanation = self._get_memory(key)
+        return explanation if explanation is not None else await asyncio.to_thread(self._get_disk, key)
+
+    async def aput(self, key, explanation):
+        now = time.time()
+        self._remember(key, explanation, now)
+        await asyncio.to_thread(self._write_disk, key, explanation, now)
+
+    def _get_memory(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            explanation, created_at = entry
+            if now - created_at >= self.ttl_s:
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+        explanation_cache_total.inc(result="hit_memory")
+        return explanation
+
+    def _get_disk(self, key):
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT explanation, created_at FROM explanation_cache WHERE key = ? AND version = ?",
+                (key, self.version)
+            ).fetchone()
+        if row is None or time.time() - row[1] >= self.ttl_s:
+            explanation_cache_total.inc(result="miss")
+            return None
+        self._remember(key, row[0], row[1])
+        explanation_cache_total.inc(result="hit_disk")
+        return row[0]
+
+    def _write_disk(self, key, explanation, created_at):
+        with self._db_lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO explanation_cache (key, version, explanation, created_at) VALUES (?, ?, ?, ?)",
+                (key, self.version, explanation, created_at)
+            )
+            self._conn.commit()
+
+    def _remember(self, key, explanation, created_at):
+        with self._lock:
+            self._memory[key] = (explanation, created_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    # Single-flight: the first miss for a key claims it, later misses wait for its result
+    def inflight(self, key):
+        return self._inflight.get(key)
+
+    def claim(self, key):
+        future = asyncio.get_running_loop().create_future()
+        # nobody may be waiting on a failed miss, don't warn about it
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = future
+        return future
+
+    async def resolve(self, key, explanation):
+        # waiters get the explanation before it is written to disk
+        now = time.time()
+        self._remember(key, explanation, now)
+        future = self._inflight.pop(key, None)
+        if future is not None and not future.done():
+            future.set_result(explanation)
+        await asyncio.to_thread(self._write_disk, key, explanation, now)
+
+    def fail(self, key, error):
+        future = self._inflight.pop(key, None)
+        if future is not None and not future.done():
+            future.set_exception(error)
+
+    async def aget_or_compute(self, key, compute):
+        """Returns the cached explanation for key, or awaits compute() once for all concurrent callers."""
+        explanation = await self.aget(key)
+        if explanation is not None:
+            return explanation
+        pending = self.inflight(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        self.claim(key)
+        try:
+            explanation = await compute()
+        except BaseException as e:
+            self.fail(key, e if isinstance(e, Exception) else RuntimeError("explanation was cancelled"))
+            raise
+        await self.resolve(key, explanation)
+        return explanation
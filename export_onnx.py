@@ -0,0 +1,77 @@
+import os
+import argparse
+import torch
+from transformers import AutoTokenizer, AutoModel, AutoModelForTokenClassification
+from ner_engine import ONNX_FP32_FILE, ONNX_INT8_FILE
+
+# Export a token-classification model (modelv1 or a finetuned-sg-privacy-model checkpoint) to ONNX,
+# optionally with dynamic int8 quantization, for the onnx-fp32 / onnx-int8 NER engines.
+# --task sentence exports a sentence encoder instead, for the onnx embedding backend (embeddings.py):
+#
+#   python export_onnx.py --task sentence       # all-MiniLM-L6-v2 -> minilm-onnx
+SENTENCE_ENCODER = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+def export(model_dir, output_dir, opset=14, task="ner"):
+    tokenizer = AutoTokenizer.from_pretrained(model_dir)
+    if task == "sentence":
+        # token states only, the embedding backend does the mean pooling
+        model = AutoModel.from_pretrained(model_dir)
+        output_name = "last_hidden_state"
+    else:
+        model = AutoModelForTokenClassification.from_pretrained(model_dir)
+        output_name = "logits"
+    model.eval()
+    os.makedirs(output_dir, exist_ok=True)
+
+    sample = tokenizer(["Client NRIC is S1234567A.", "Invoice INV-2024-000123"], padding=True, return_tensors="pt")
+    path = os.path.join(output_dir, ONNX_FP32_FILE)
+    with torch.inference_mode():
+        torch.onnx.export(
+            model,
+            (sample["input_ids"], sample["attention_mask"]),
+            path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=[output_name],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                output_name: {0: "batch", 1: "sequence"},
+            },
+            opset_version=opset,
+        )
+    # The ONNX engine reads labels and tokenizer from the same directory
+    tokenizer.save_pretrained(output_dir)
+    model.config.save_pretrained(output_dir)
+    print(f"Exported {model_dir} -> {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
+    return path
+
+
+def quantize(output_dir):
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    source = os.path.join(output_dir, ONNX_FP32_FILE)
+    target = os.path.join(output_dir, ONNX_INT8_FILE)
+    quantize_dynamic(source, target, weight_type=QuantType.QInt8)
+    print(f"Quantized {source} -> {target} ({os.path.getsize(target) / 1e6:.1f} MB)")
+    return target
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export an NER model or a sentence encoder to ONNX")
+    parser.add_argument("--task", choices=["ner", "sentence"], default="ner")
+    parser.add_argument("--model", default=None, help="model directory or checkpoint, e.g. finetuned-sg-privacy-model/checkpoint-865 "
+                                                      f"(default: modelv1, or {SENTENCE_ENCODER} for --task sentence)")
+    parser.add_argument("--output", default=None, help="output directory (default: <model>-onnx)")
+    parser.add_argument("--opset", type=int, default=14)
+    parser.add_argument("--no-int8", action="store_true", help="skip dynamic int8 quantization")
+    args = parser.parse_args()
+
+    if args.task == "sentence":
+        model = args.model or SENTENCE_ENCODER
+        output_dir = args.output or "minilm-onnx"
+    else:
+        model = args.model or "modelv1"
+        output_dir = args.output or model.rstrip("/").replace("/", "-") + "-onnx"
+    export(model, output_dir, args.opset, args.task)
+    if not args.no_int8:
+        quantize(output_dir)
@@ -0,0 +1,159 @@
+import re
+import random
+import asyncio
+import hashlib
+import argparse
+import numpy as np
+from datetime import datetime, timezone
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+import orjson
+
+# Deterministic stand-in for the Ollama server, so backend_api can be benchmarked without a GPU or
+# llama3.1. It answers the endpoints OllamaEmbeddings and OllamaLLM call (/api/embed, /api/embeddings,
+# /api/generate, plus /api/tags and /api/version), with configurable latency:
+#
+#   python fake_ollama.py --port 11435 --first-token-ms 150 --token-ms 20
+#   OLLAMA_BASE_URL=http://localhost:11435 POLICY_INDEX_DIR=/tmp/bench_policy_index uvicorn backend_api:app
+#
+# Embeddings are hashed bag-of-words vectors: the same text always gets the same vector and texts
+# sharing words are close, so retrieval still returns related policy chunks. Use a separate
+# POLICY_INDEX_DIR, an index built with the real model does not match these vectors.
+# Answers are a canned explanation picked by a hash of the prompt, streamed token by token.
+
+ANSWERS = [
+    "Sharing this is not allowed. Clause {clause} of the data protection policy classifies it as {kind} "
+    "and it may only be disclosed to authorised staff through approved channels.",
+    "This should not be shared. Under clause {clause}, {kind} must be protected from unauthorised access, "
+    "collection and use, and sending it to an external AI service counts as disclosure.",
+    "Clause {clause} treats this as {kind}. Remove or mask the value before sending the message, or ask the "
+    "data protection officer for an exception.",
+]
+KINDS = ["personal data", "confidential business information", "an access credential", "financial information"]
+WORD = re.compile(r"[a-z0-9]+")
+
+
+class FakeOllama:
+    def __init__(self, dimensions=4096, embed_ms=20.0, embed_per_text_ms=2.0, first_token_ms=150.0,
+                 token_ms=20.0, answer_tokens=None, jitter=0.1, parallel=4, seed=0):
+        self.dimensions = dimensions
+        self.embed_ms = embed_ms
+        self.embed_per_text_ms = embed_per_text_ms
+        self.first_token_ms = first_token_ms
+        self.token_ms = token_ms
+        self.answer_tokens = answer_tokens
+        self.jitter = jitter
+        self.parallel = parallel
+        self.random = random.Random(seed)
+        self._slots = None
+
+    def slots(self):
+        # like OLLAMA_NUM_PARALLEL: generations beyond this wait for a slot
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.parallel)
+        return self._slots
+
+    async def sleep_ms(self, ms):
+        if ms > 0:
+            await asyncio.sleep(ms / 1000.0 * (1 + self.random.uniform(-self.jitter, self.jitter)))
+
+    def embed(self, text):
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for word in WORD.findall(text.lower()):
+            digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vector[value % self.dimensions] += 1.0 if value >> 63 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def answer(self, prompt):
+        digest = hashlib.blake2b(prompt.encode("utf-8"), digest_size=8).digest()
+        pick = int.from_bytes(digest, "little")
+        text = ANSWERS[pick % len(ANSWERS)].format(
+            clause=f"{pick % 9 + 1}.{pick // 9 % 6 + 1}", kind=KINDS[pick // 54 % len(KINDS)]
+        )
+        tokens = re.findall(r"\S+\s*", text)
+        if self.answer_tokens:
+            tokens = (tokens * (self.answer_tokens // len(tokens) + 1))[:self.answer_tokens]
+        return tokens
+
+
+def now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def create_app(fake):
+    app = FastAPI(title="Fake Ollama")
+
+    @app.get("/api/version")
+    def version():
+        return {"version": "0.0.0-fake"}
+
+    @app.get("/api/tags")
+    def tags():
+        return {"models": [{"name": "llama3.1:latest", "model": "llama3.1:latest", "size": 0, "digest": "fake"}]}
+
+    @app.post("/api/embed")
+    async def embed(request: Request):
+        body = await request.json()
+        inputs = body.get("input", "")
+        inputs = [inputs] if isinstance(inputs, str) else inputs
+        await fake.sleep_ms(fake.embed_ms + fake.embed_per_text_ms * len(inputs))
+        return JSONResponse({"model": body.get("model"), "embeddings": [fake.embed(text) for text in inputs]})
+
+    @app.post("/api/embeddings")
+    async def embeddings(request: Request):
+        # older clients, one prompt per call
+        body = await request.json()
+        await fake.sleep_ms(fake.embed_ms + fake.embed_per_text_ms)
+        return JSONResponse({"embedding": fake.embed(body.get("prompt", ""))})
+
+    @app.post("/api/generate")
+    async def generate(request: Request):
+        body = await request.json()
+        model = body.get("model")
+        tokens = fake.answer(body.get("prompt", ""))
+        done = {
+            "model": model, "created_at": now(), "response": "", "done": True, "done_reason": "stop",
+            "prompt_eval_count": len(body.get("prompt", "").split()), "eval_count": len(tokens)
+        }
+
+        if not body.get("stream", True):
+            async with fake.slots():
+                await fake.sleep_ms(fake.first_token_ms + fake.token_ms * len(tokens))
+            return JSONResponse({**done, "response": "".join(tokens)})
+
+        async def stream():
+            async with fake.slots():
+                await fake.sleep_ms(fake.first_token_ms)
+                for i, token in enumerate(tokens):
+                    if i:
+                        await fake.sleep_ms(fake.token_ms)
+                    yield orjson.dumps({"model": model, "created_at": now(), "response": token, "done": False}) + b"\n"
+            yield orjson.dumps(done) + b"\n"
+
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+    parser = argparse.ArgumentParser(description="Deterministic local stand-in for the Ollama API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--dimensions", type=int, default=4096, help="embedding size (llama3.1: 4096)")
+    parser.add_argument("--embed-ms", type=float, default=20.0, help="latency of one embed call")
+    parser.add_argument("--embed-per-text-ms", type=float, default=2.0, help="added per text in the call")
+    parser.add_argument("--first-token-ms", type=float, default=150.0, help="time to the first generated token")
+    parser.add_argument("--token-ms", type=float, default=20.0, help="time between generated tokens")
+    parser.add_argument("--answer-tokens", type=int, default=None, help="fixed answer length (default: the canned answer)")
+    parser.add_argument("--jitter", type=float, default=0.1, help="relative random variation of every delay")
+    parser.add_argument("--parallel", type=int, default=4, help="generations served at the same time")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    fake = FakeOllama(
+        args.dimensions, args.embed_ms, args.embed_per_text_ms, args.first_token_ms, args.token_ms,
+        args.answer_tokens, args.jitter, args.parallel, args.seed
+    )
+    uvicorn.run(create_app(fake), host=args.host, port=args.port, log_level="warning")
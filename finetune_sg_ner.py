@@ -1,9 +1,9 @@
+import os
 import transformers
 print("Transformers version:", transformers.__version__)
 from datasets import load_from_disk
 from transformers import AutoTokenizer, AutoModelForTokenClassification, TrainingArguments, Trainer, DataCollatorForTokenClassification, AutoConfig
-import numpy as np
-from seqeval.metrics import classification_report, f1_score, accuracy_score, precision_score, recall_score
+from ner_metrics import metrics_for
 
 # Load your focused dataset for PERSON, EMAIL, PHONE
 dataset = load_from_disk("sg_pdpa_ner_dataset_full")  # adjust path as needed
@@ -69,12 +69,16 @@ def tokenize_and_align_labels(batch):
 
 tokenized_datasets = dataset.map(tokenize_and_align_labels, batched=True)
 
+# EVAL_EACH_EPOCH=1 also scores the validation split after every epoch, otherwise only once after training
+EVAL_EACH_EPOCH = os.getenv("EVAL_EACH_EPOCH", "0") == "1"
+
 args = TrainingArguments(
     "finetuned-sg-privacy-model",
     learning_rate=2e-5,
     per_device_train_batch_size=8,
     per_device_eval_batch_size=8,
     num_train_epochs=5,
+    evaluation_strategy="epoch" if EVAL_EACH_EPOCH else "no",
     weight_decay=0.01,
     save_total_limit=2,
     logging_steps=10,
@@ -83,31 +87,8 @@ args = TrainingArguments(
 
 data_collator = DataCollatorForTokenClassification(tokenizer)
 
-def align_predictions(predictions, label_ids):
-    preds = np.argmax(predictions, axis=2)
-    batch_size, seq_len = preds.shape
-    out_label_list = []
-    preds_list = []
-    for i in range(batch_size):
-        example_labels = []
-        example_preds = []
-        for j in range(seq_len):
-            if label_ids[i, j] != -100:
-                example_labels.append(id2label[label_ids[i][j]])
-                example_preds.append(id2label[preds[i][j]])
-        out_label_list.append(example_labels)
-        preds_list.append(example_preds)
-    return preds_list, out_label_list
-
-def compute_metrics(p):
-    preds_list, out_label_list = align_predictions(p.predictions, p.label_ids)
-    return {
-        "precision": precision_score(out_label_list, preds_list),
-        "recall": recall_score(out_label_list, preds_list),
-        "f1": f1_score(out_label_list, preds_list),
-        "accuracy": accuracy_score(out_label_list, preds_list),
-        "report": classification_report(out_label_list, preds_list, output_dict=True)
-    }
+# Vectorized seqeval-equivalent metrics, cheap enough for EVAL_EACH_EPOCH
+compute_metrics = metrics_for(id2label)
 
 trainer = Trainer(
     model,
@@ -1,5 +1,9 @@
 import React, { useState, useRef, useEffect } from 'react';
 import { Send, Mic, MicOff, Shield, ChevronLeft, ChevronRight } from 'lucide-react';
+import { PrivacyAPI, ScanVerdict, LiveScan, LiveScanResult } from './api/privacy';
+
+// Same-origin so requests go through the Vite /scan proxy
+const scanAPI = new PrivacyAPI('');
 
 interface Message {
   id: string;
@@ -16,6 +20,10 @@ function App() {
   const [sidebarOpen, setSidebarOpen] = useState(false);
   const [isLoading, setIsLoading] = useState(false);
   const [privacyLoading, setPrivacyLoading] = useState(false);
+  const [liveVerdict, setLiveVerdict] = useState<LiveScanResult | null>(null);
+  const liveScanRef = useRef<LiveScan | null>(null);
+  const inputRef = useRef(input);
+  inputRef.current = input;
   const messagesEndRef = useRef<HTMLDivElement>(null);
   const privacyMessagesEndRef = useRef<HTMLDivElement>(null);
 
@@ -31,6 +39,24 @@ function App() {
     scrollToBottom(privacyMessagesEndRef);
   }, [privacyMessages]);
 
+  // While monitoring, the draft is checked as it is typed (only changed sentences are re-scanned)
+  useEffect(() => {
+    if (!isRecording) return;
+    const liveScan = new LiveScan(setLiveVerdict);
+    liveScanRef.current = liveScan;
+    // the draft typed before monitoring was switched on
+    liveScan.update(inputRef.current).catch(() => setLiveVerdict(null));
+    return () => {
+      liveScan.close();
+      liveScanRef.current = null;
+      setLiveVerdict(null);
+    };
+  }, [isRecording]);
+
+  useEffect(() => {
+    liveScanRef.current?.update(input).catch(() => setLiveVerdict(null));
+  }, [input]);
+
   const runmodel = async (inputText: string) => {
     try {
       const response = await fetch('/scan', {
@@ -69,35 +95,58 @@ function App() {
     if (isRecording) {
       setPrivacyMessages(prev => [...prev, userMessage]);
       setPrivacyLoading(true);
+      const assistantId = (Date.now() + 1).toString();
+      let verdict: ScanVerdict | null = null;
+      const explanations: Record<string, string> = {};
+
+      // Compose a rich message for the Privacy Agent sidebar
+      const renderVerdict = () => {
+        if (!verdict || verdict.flagged.length === 0) {
+          return `<div><span style="font-weight:bold;">Verdict:</span> <span style="color:green;font-weight:bold;">ALLOW</span></div><div>No sensitive entities detected.</div>`;
+        }
+        let explanationContent = `<div><span style="font-weight:bold;">Verdict:</span> <span style="color:${verdict.verdict === 'BLOCK' ? 'red' : 'green'};font-weight:bold;">${verdict.verdict}</span></div>`;
+        verdict.flagged.forEach(f => {
+          const wordsStr = f.words.join(', ');
+          explanationContent += `<div style="margin-top:8px;"><span style="font-weight:bold;">${f.entity_group}:</span> <mark style="background: #fde68a; color: #92400e; padding: 2px 4px; border-radius: 4px;">${wordsStr}</mark><br/><span>${explanations[f.entity_group] ?? '...'}</span></div>`;
+        });
+        return explanationContent;
+      };
+      const updateAssistantMessage = () => {
+        setPrivacyMessages(prev => prev.map(m => (m.id === assistantId ? { ...m, content: renderVerdict() } : m)));
+      };
+
       try {
-        const response = await fetch('/scan', {
-          method: 'POST',
-          headers: { 'Content-Type': 'application/json' },
-          body: JSON.stringify({ text: input }),
+        await scanAPI.scanStream(input, {
+          // The verdict arrives at NER latency; explanations fill in afterwards
+          onVerdict: (result) => {
+            verdict = result;
+            const assistantMessage: Message = {
+              id: assistantId,
+              content: renderVerdict(),
+              sender: 'assistant',
+              timestamp: new Date(),
+            };
+            setPrivacyMessages(prev => [...prev, assistantMessage]);
+            setPrivacyLoading(false);
+            // If verdict is ALLOW, also send to main chat
+            if (result.verdict === 'ALLOW') {
+              setMessages(prev => [...prev, userMessage]);
+            }
+          },
+          onToken: (entityGroup, token) => {
+            explanations[entityGroup] = (explanations[entityGroup] ?? '') + token;
+            updateAssistantMessage();
+          },
+          onExplanation: (entityGroup, explanation) => {
+            explanations[entityGroup] = explanation;
+            updateAssistantMessage();
+          },
+          onError: (error, entityGroup) => {
+            if (!entityGroup) throw new Error(error);
+            explanations[entityGroup] = 'Explanation unavailable.';
+            updateAssistantMessage();
+          },
         });
-        const data = await response.json();
-        // Compose a rich message for the Privacy Agent sidebar
-        let explanationContent = '';
-        if (data.flagged && data.flagged.length > 0) {
-          explanationContent += `<div><span style="font-weight:bold;">Verdict:</span> <span style="color:${data.verdict === 'BLOCK' ? 'red' : 'green'};font-weight:bold;">${data.verdict}</span></div>`;
-          data.flagged.forEach(f => {
-            const wordsStr = Array.isArray(f.words) ? f.words.join(', ') : (f.word || '');
-            explanationContent += `<div style="margin-top:8px;"><span style="font-weight:bold;">${f.entity_group}:</span> <mark style="background: #fde68a; color: #92400e; padding: 2px 4px; border-radius: 4px;">${wordsStr}</mark><br/><span>${f.explanation}</span></div>`;
-          });
-        } else {
-          explanationContent = `<div><span style="font-weight:bold;">Verdict:</span> <span style="color:green;font-weight:bold;">ALLOW</span></div><div>No sensitive entities detected.</div>`;
-        }
-        const assistantMessage: Message = {
-          id: (Date.now() + 1).toString(),
-          content: explanationContent,
-          sender: 'assistant',
-          timestamp: new Date(),
-        };
-        setPrivacyMessages(prev => [...prev, assistantMessage]);
-        // If verdict is ALLOW, also send to main chat
-        if (data.verdict === 'ALLOW') {
-          setMessages(prev => [...prev, userMessage]);
-        }
       } catch (error) {
         const errorMessage: Message = {
           id: (Date.now() + 1).toString(),
@@ -215,6 +264,13 @@ function App() {
 
         {/* Input Form */}
         <div className="border-t border-gray-700 p-4">
+          {isRecording && liveVerdict && input.trim() && liveVerdict.verdict !== 'ERROR' && (
+            <div className={`mb-2 text-sm ${liveVerdict.verdict === 'BLOCK' ? 'text-red-400' : 'text-green-400'}`}>
+              {liveVerdict.verdict === 'BLOCK'
+                ? `Contains ${liveVerdict.flagged.map(f => f.entity_group).join(', ')}`
+                : 'No sensitive data detected'}
+            </div>
+          )}
           <form onSubmit={handleSubmit} className="flex gap-3">
             <input
               type="text"
@@ -10,6 +10,37 @@ export interface PrivacyCheckRequest {
     confidence?: number;
   }
   
+  export interface FlaggedGroup {
+    entity_group: string;
+    words: string[];
+  }
+
+  export interface ScanVerdict {
+    verdict: 'BLOCK' | 'ALLOW';
+    flagged: FlaggedGroup[];
+  }
+
+  export interface ScanStreamHandlers {
+    onVerdict?: (verdict: ScanVerdict) => void;
+    onToken?: (entityGroup: string, token: string) => void;
+    onExplanation?: (entityGroup: string, explanation: string) => void;
+    onError?: (error: string, entityGroup?: string) => void;
+  }
+
+  export interface ComponentStatus {
+    state: 'pending' | 'loading' | 'ready' | 'failed';
+    warm: boolean;
+    load_seconds: number | null;
+    warmup_seconds: number | null;
+    error: string | null;
+  }
+
+  export interface PrivacyStatus {
+    status: 'starting' | 'warming' | 'ready' | 'degraded';
+    version: string;
+    components?: Record<string, ComponentStatus>;
+  }
+
   export class PrivacyAPI {
     private baseUrl: string;
   
@@ -38,7 +69,54 @@ export interface PrivacyCheckRequest {
       }
     }
   
-    async getPrivacyStatus(): Promise<{ status: string; version: string }> {
+    // Reads the /scan/stream server-sent events: the verdict arrives first, then each
+    // entity group's explanation token by token.
+    async scanStream(text: string, handlers: ScanStreamHandlers): Promise<void> {
+      const response = await fetch(`${this.baseUrl}/scan/stream`, {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ text }),
+      });
+
+      if (!response.ok || !response.body) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+      }
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+
+      const dispatch = (rawEvent: string) => {
+        let event = 'message';
+        let data = '';
+        for (const line of rawEvent.split('\n')) {
+          if (line.startsWith('event:')) event = line.slice(6).trim();
+          else if (line.startsWith('data:')) data += line.slice(5).trim();
+        }
+        if (!data) return;
+        const payload = JSON.parse(data);
+        if (event === 'verdict') handlers.onVerdict?.(payload);
+        else if (event === 'token') handlers.onToken?.(payload.entity_group, payload.token);
+        else if (event === 'explanation') handlers.onExplanation?.(payload.entity_group, payload.explanation);
+        else if (event === 'error') handlers.onError?.(payload.error, payload.entity_group);
+      };
+
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let boundary = buffer.indexOf('\n\n');
+        while (boundary >= 0) {
+          dispatch(buffer.slice(0, boundary));
+          buffer = buffer.slice(boundary + 2);
+          boundary = buffer.indexOf('\n\n');
+        }
+      }
+    }
+  
+    async getPrivacyStatus(): Promise<PrivacyStatus> {
       try {
         const response = await fetch(`${this.baseUrl}/api/status`);
         return await response.json();
@@ -49,4 +127,92 @@ export interface PrivacyCheckRequest {
     }
   }
   
+  export interface LiveScanResult {
+    seq: number;
+    verdict: 'BLOCK' | 'ALLOW' | 'ERROR';
+    flagged: FlaggedGroup[];
+    segments?: number;
+    rescanned?: number;
+    error?: string;
+  }
+
+  // Scan-as-you-type over the /ws/scan WebSocket: each update only sends the changed range
+  // of the draft, and the server only re-runs NER on the sentences that changed. Edit offsets
+  // are in code points, as the server slices Python strings, not in UTF-16 units.
+  export class LiveScan {
+    private socket: WebSocket;
+    private opened: Promise<void>;
+    private sent = '';
+    private seq = 0;
+    // seq of the last message that sent the whole draft; an error for it is not retried
+    private fullSeq = -1;
+
+    constructor(onResult: (result: LiveScanResult) => void, baseUrl: string = '') {
+      const origin = baseUrl || window.location.origin;
+      this.socket = new WebSocket(`${origin.replace(/^http/, 'ws')}/ws/scan`);
+      this.opened = new Promise((resolve, reject) => {
+        this.socket.onopen = () => resolve();
+        this.socket.onerror = () => reject(new Error('Live scan connection failed'));
+      });
+      this.socket.onmessage = (event) => {
+        const result: LiveScanResult = JSON.parse(event.data);
+        if (result.verdict === 'ERROR' && result.seq !== this.fullSeq) {
+          // the server's copy of the draft may no longer match ours: send it whole
+          this.resync().catch(() => onResult(result));
+          return;
+        }
+        // a reply for an older draft is superseded by the one for the latest draft
+        if (result.seq === this.seq) onResult(result);
+      };
+    }
+
+    async update(text: string): Promise<void> {
+      if (text === this.sent) return;
+      // One replacement covering everything between the unchanged prefix and suffix
+      const previous = this.sent;
+      let start = 0;
+      while (start < text.length && start < previous.length && text[start] === previous[start]) start++;
+      // never cut a surrogate pair (a character outside the BMP, e.g. an emoji) in half
+      if (start > 0 && isHighSurrogate(text.charCodeAt(start - 1))) start--;
+      let suffix = 0;
+      while (
+        suffix < text.length - start &&
+        suffix < previous.length - start &&
+        text[text.length - 1 - suffix] === previous[previous.length - 1 - suffix]
+      ) suffix++;
+      if (suffix > 0 && isLowSurrogate(text.charCodeAt(text.length - suffix))) suffix--;
+      const codePointStart = Array.from(previous.slice(0, start)).length;
+      const edit = {
+        start: codePointStart,
+        end: codePointStart + Array.from(previous.slice(start, previous.length - suffix)).length,
+        text: text.slice(start, text.length - suffix),
+      };
+      this.sent = text;
+      this.seq += 1;
+      const seq = this.seq;
+      await this.opened;
+      this.socket.send(JSON.stringify({ seq, edits: [edit] }));
+    }
+
+    private async resync(): Promise<void> {
+      this.seq += 1;
+      this.fullSeq = this.seq;
+      const seq = this.seq;
+      await this.opened;
+      this.socket.send(JSON.stringify({ seq, text: this.sent }));
+    }
+
+    close() {
+      this.socket.close();
+    }
+  }
+
+  function isHighSurrogate(code: number): boolean {
+    return code >= 0xd800 && code <= 0xdbff;
+  }
+
+  function isLowSurrogate(code: number): boolean {
+    return code >= 0xdc00 && code <= 0xdfff;
+  }
+
   export const privacyAPI = new PrivacyAPI();
\ No newline at end of file
@@ -0,0 +1,326 @@
+import re
+import math
+import argparse
+import threading
+from collections import Counter
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+from pydantic import PrivateAttr
+from clause_table import HEADING_ALIASES
+from policy_ingest import SENTENCE_END
+from policy_store import PolicyVectorStore
+import metrics
+
+# Retrieval and context shaping for the RAG chain. Questions name the data type ("Why is NRIC like
+# 'S1234567A' sensitive?") and the clause that answers them carries the same word in its heading,
+# so BM25 over the chunks (clause numbers and label keywords included) is blended with the vector
+# scores. The retrieved chunks are then cut down to the sentences that share the question's terms,
+# under a token budget: the other retrieved clauses are about other data types, and llama3.1
+# spends time on every prompt token.
+#
+#   python hybrid_retrieval.py          # recall and context size of vector / lexical / hybrid retrieval
+#
+# The clause table questions name each label and its heading, the same wording the label aliases
+# add to the query, so recall is also reported without the aliases and on HELD_OUT_QUESTIONS,
+# hand-written phrasings that use neither.
+
+TOKEN = re.compile(r"\d+(?:\.\d+)+|[a-z0-9]+")
+QUOTED = re.compile(r"'[^']*'|\"[^\"]*\"")
+# sentences scoring below this share of their chunk's best sentence are dropped even when the budget allows them
+MIN_SENTENCE_SCORE = 0.5
+CONTEXT_TOKEN_BUCKETS = (32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+
+def tokenize(text):
+    """Lower case words, with clause numbers such as 3.1.1 kept whole and API_KEY read as "api key"."""
+    return TOKEN.findall(text.lower().replace("_", " "))
+
+
+def estimate_tokens(text):
+    # llama3.1's tokenizer averages about 4 characters of English per token; Ollama reports the
+    # exact prompt size after the call (confidex_prompt_tokens)
+    return math.ceil(len(text) / 4)
+
+
+def query_terms(question, expand_aliases=True):
+    """Terms of a question without its quoted example values, plus the clause wording of the labels it names."""
+    text = QUOTED.sub(" ", question)
+    terms = tokenize(text)
+    if not expand_aliases:
+        return terms
+    for label, heading in HEADING_ALIASES.items():
+        if re.search(rf"\b{label}\b", text, re.IGNORECASE):
+            terms += tokenize(heading)
+    return terms
+
+
+class BM25:
+    def __init__(self, documents, k1=1.2, b=0.75):
+        self.k1 = k1
+        postings = {}
+        lengths = np.zeros(len(documents), dtype=np.float32)
+        for i, doc in enumerate(documents):
+            terms = tokenize(doc.page_content)
+            # a piece of a long clause does not repeat its heading
+            if doc.metadata.get("clause"):
+                terms.append(doc.metadata["clause"])
+            lengths[i] = len(terms)
+            for term, count in Counter(terms).items():
+                postings.setdefault(term, ([], []))
+                postings[term][0].append(i)
+                postings[term][1].append(count)
+        count = len(documents)
+        self.size = count
+        self.postings = {
+            term: (np.array(ids, dtype=np.int64), np.array(counts, dtype=np.float32))
+            for term, (ids, counts) in postings.items()
+        }
+        self.idf = {term: math.log(1 + (count - len(ids) + 0.5) / (len(ids) + 0.5)) for term, (ids, _) in postings.items()}
+        self.norm = k1 * (1 - b + b * lengths / max(float(lengths.mean()) if count else 1.0, 1.0))
+
+    def scores(self, terms):
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term in set(terms):
+            posting = self.postings.get(term)
+            if posting is not None:
+                ids, counts = posting
+                scores[ids] += self.idf[term] * counts * (self.k1 + 1) / (counts + self.norm[ids])
+        return scores
+
+
+def corpus_documents(vector_store, filter=None):
+    """Every chunk of the vector store (a PolicyVectorStore: those matching filter) as Documents."""
+    if isinstance(vector_store, PolicyVectorStore):
+        store = vector_store.store
+        allowed = store.allowed_ids(filter)
+        ids = sorted(store.chunks) if allowed is None else sorted(allowed.tolist())
+        return [
+            Document(page_content=store.chunks[i]["text"], metadata={k: v for k, v in store.chunks[i].items() if k != "text"})
+            for i in ids
+        ]
+    return [vector_store.docstore.search(doc_id) for doc_id in vector_store.index_to_docstore_id.values()]
+
+
+def corpus_version(vector_store):
+    """Changes whenever chunks are added to or removed from the vector store."""
+    if isinstance(vector_store, PolicyVectorStore):
+        return vector_store.store.version()
+    return len(vector_store.index_to_docstore_id)
+
+
+def document_key(doc):
+    return doc.metadata.get("document"), doc.page_content
+
+
+class LexicalCorpus:
+    """BM25 over the chunks of a vector store as they were at one version of it."""
+
+    def __init__(self, vector_store, filter=None):
+        # read first: chunks added while the documents are read show up as a new version next time
+        self.version = corpus_version(vector_store)
+        self.documents = corpus_documents(vector_store, filter)
+        self.positions = {document_key(doc): i for i, doc in enumerate(self.documents)}
+        self.bm25 = BM25(self.documents)
+
+
+class HybridRetriever(BaseRetriever):
+    """Top k chunks by lexical_weight * BM25 + (1 - lexical_weight) * vector relevance.
+
+    Both scores are scaled to [0, 1] over the union of the candidates best by either; a weight of
+    0 is plain vector retrieval. The BM25 corpus is rebuilt when documents are added to or removed
+    from the vector store, so removed clauses are never returned. expand_aliases adds the clause
+    wording of the labels a question names (see query_terms).
+    """
+
+    vector_store: VectorStore
+    corpus: LexicalCorpus
+    k: int = 3
+    candidates: int = 20
+    lexical_weight: float = 0.6
+    filter: dict = None
+    expand_aliases: bool = True
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    @classmethod
+    def from_vector_store(cls, vector_store, **kwargs):
+        return cls(vector_store=vector_store, corpus=LexicalCorpus(vector_store, kwargs.get("filter")), **kwargs)
+
+    def current_corpus(self):
+        corpus = self.corpus
+        if corpus.version != corpus_version(self.vector_store):
+            with self._lock:
+                # another query may have rebuilt it while this one waited
+                if self.corpus.version != corpus_version(self.vector_store):
+                    self.corpus = LexicalCorpus(self.vector_store, self.filter)
+                corpus = self.corpus
+        return corpus
+
+    @property
+    def bm25(self):
+        return self.current_corpus().bm25
+
+    def scored(self, query):
+        """[(hybrid score, Document)] of the candidates, best first."""
+        # one corpus for the whole query, even if it is replaced meanwhile
+        corpus = self.current_corpus()
+        search_kwargs = {"filter": self.filter} if self.filter else {}
+        vector_hits = []
+        if self.lexical_weight < 1:
+            vector_hits = self.vector_store.similarity_search_with_score(query, k=self.candidates, **search_kwargs)
+        lexical = corpus.bm25.scores(query_terms(query, self.expand_aliases)) if self.lexical_weight > 0 else np.zeros(len(corpus.documents))
+        top_lexical = float(lexical.max()) if len(lexical) else 0.0
+
+        candidates = {}
+        if vector_hits:
+            relevance = np.array([score for _, score in vector_hits], dtype=np.float32)
+            # hits come best first whether the store returns distances (FAISS) or similarities (PolicyStore)
+            if relevance[0] < relevance[-1]:
+                relevance = -relevance
+            low, span = float(relevance.min()), float(np.ptp(relevance)) or 1.0
+            for (doc, _), score in zip(vector_hits, relevance):
+                candidates[document_key(doc)] = [doc, (float(score) - low) / span, 0.0]
+        if top_lexical > 0:
+            for i in np.argsort(-lexical)[:self.candidates]:
+                if lexical[i] <= 0:
+                    break
+                doc = corpus.documents[i]
+                candidates.setdefault(document_key(doc), [doc, 0.0, 0.0])[2] = lexical[i] / top_lexical
+            # a vector hit also has a lexical score even when it is not among the lexical candidates
+            for key, entry in candidates.items():
+                if key in corpus.positions:
+                    entry[2] = lexical[corpus.positions[key]] / top_lexical
+        ranked = [
+            (self.lexical_weight * lexical_score + (1 - self.lexical_weight) * vector_score, doc)
+            for doc, vector_score, lexical_score in candidates.values()
+        ]
+        ranked.sort(key=lambda item: -item[0])
+        return ranked
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        return [doc for _, doc in self.scored(query)[:self.k]]
+
+
+context_tokens = metrics.Histogram(
+    "confidex_context_tokens",
+    "Estimated tokens of retrieved policy context, before (retrieved) and after (compressed) compression",
+    ["stage"],
+    buckets=CONTEXT_TOKEN_BUCKETS
+)
+prompt_tokens = metrics.Histogram(
+    "confidex_prompt_tokens", "Prompt tokens of each LLM call as counted by Ollama", buckets=CONTEXT_TOKEN_BUCKETS
+)
+
+
+class ContextCompressor:
+    """Keeps the sentences of the retrieved chunks that share the most (IDF-weighted) terms with the
+    question, within token_budget estimated tokens, in their original order and labelled with their clause.
+
+    The IDF is the retriever's current BM25 corpus; a token_budget of 0 passes the chunks through whole.
+    """
+
+    def __init__(self, retriever, token_budget):
+        self.retriever = retriever
+        self.token_budget = token_budget
+
+    def sentences(self, docs):
+        """(doc rank, position, text) of every sentence of the chunks."""
+        pieces = []
+        for rank, doc in enumerate(docs):
+            starts = [0] + [match.end() for match in SENTENCE_END.finditer(doc.page_content)]
+            for position, (start, end) in enumerate(zip(starts, starts[1:] + [len(doc.page_content)])):
+                text = doc.page_content[start:end].strip().strip("●").strip()
+                if text:
+                    pieces.append((rank, position, text))
+        return pieces
+
+    def compress(self, docs, question):
+        if not self.token_budget:
+            return "\n\n".join(doc.page_content for doc in docs)
+        terms = set(query_terms(question, self.retriever.expand_aliases))
+        idf = self.retriever.bm25.idf
+        pieces = self.sentences(docs)
+        scored = []
+        best = {}
+        for rank, position, text in pieces:
+            score = sum(idf.get(term, 0.0) for term in terms & set(tokenize(text)))
+            scored.append((-score, rank, position, text))
+            best[rank] = max(best.get(rank, 0.0), score)
+        scored.sort()
+        kept, used = [], 0
+        for negative_score, rank, position, text in scored:
+            # retrieval chose the chunks, so each keeps its best sentences, not only the overall best chunk
+            if kept and (negative_score == 0 or -negative_score < best[rank] * MIN_SENTENCE_SCORE):
+                continue
+            cost = estimate_tokens(text)
+            if used + cost > self.token_budget and kept:
+                continue
+            kept.append((rank, position, text))
+            used += cost
+        groups = {}
+        for rank, position, text in sorted(kept):
+            groups.setdefault(rank, []).append(text)
+        parts = []
+        for rank, texts in groups.items():
+            text = " ".join(texts)
+            clause = docs[rank].metadata.get("clause")
+            # the answer has to cite the clause even when its heading sentence was dropped
+            if clause and clause not in text:
+                text = f"Clause {clause}: {text}"
+            parts.append(text)
+        return "\n\n".join(parts)
+
+    def __call__(self, inputs):
+        """Runnable step: {"docs", "question"} -> the context string, recording its size before and after."""
+        docs, question = inputs["docs"], inputs["question"]
+        context_tokens.observe(estimate_tokens("\n\n".join(doc.page_content for doc in docs)), stage="retrieved")
+        context = self.compress(docs, question)
+        context_tokens.observe(estimate_tokens(context), stage="compressed")
+        return context
+
+
+if __name__ == "__main__":
+    import json
+    from clause_table import CLAUSE_TABLE_PATH
+    from embeddings import HashingEmbeddings
+    from evaluate_embeddings import policy_questions, HELD_OUT_QUESTIONS
+    from policy_ingest import extract_pages, clause_chunks
+    from langchain_community.vectorstores import FAISS
+
+    parser = argparse.ArgumentParser(description="Recall@k and context tokens of vector, lexical and hybrid retrieval")
+    parser.add_argument("--pdf", default="policy4.pdf")
+    parser.add_argument("--table", default=CLAUSE_TABLE_PATH)
+    parser.add_argument("-k", type=int, default=3)
+    parser.add_argument("--budgets", type=int, nargs="+", default=[0, 96, 160, 256])
+    args = parser.parse_args()
+
+    with open(args.table) as f:
+        table = json.load(f)
+    documents = [Document(page_content=text, metadata=metadata) for text, metadata in clause_chunks(extract_pages(args.pdf))]
+    # the hashing backend stands in for llama3.1, which needs Ollama
+    embedding = HashingEmbeddings().fit([doc.page_content for doc in documents])
+    store = FAISS.from_documents(documents, embedding)
+    clauses = {doc.metadata.get("clause") for doc in documents}
+    question_sets = {
+        "clause table": [(q, clause) for q, clause in policy_questions(table) if clause in clauses],
+        "held-out": [(q, clause) for q, clause in HELD_OUT_QUESTIONS if clause in clauses],
+    }
+    print(f"{len(documents)} chunks, k={args.k}")
+
+    for set_name, questions in question_sets.items():
+        print(f"\n{set_name} questions: {len(questions)}")
+        for name, weight, aliases in (("vector", 0.0, False), ("lexical", 1.0, True), ("hybrid", 0.6, True),
+                                      ("lexical-noalias", 1.0, False), ("hybrid-noalias", 0.6, False)):
+            retriever = HybridRetriever.from_vector_store(store, k=args.k, lexical_weight=weight, expand_aliases=aliases)
+            results = [(retriever.invoke(q), q, clause) for q, clause in questions]
+            recall = np.mean([any(d.metadata.get("clause") == clause for d in docs) for docs, _, clause in results])
+            line = f"{name:<16} recall@{args.k} {recall:.3f}"
+            for budget in args.budgets:
+                compressor = ContextCompressor(retriever, budget)
+                contexts = [(compressor.compress(docs, q), clause) for docs, q, clause in results]
+                tokens = np.mean([estimate_tokens(context) for context, _ in contexts])
+                # the answer's clause and its text survive compression
+                kept = np.mean([f"Clause {clause}" in context for context, clause in contexts])
+                line += f"  | budget {budget or 'off'}: {tokens:.0f} tokens, clause kept {kept:.3f}"
+            print(line)
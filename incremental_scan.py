@@ -0,0 +1,92 @@
+import re
+import asyncio
+import hashlib
+from collections import OrderedDict
+
+# Scan-as-you-type: the text is split into sentences and NER results are cached per sentence
+# content, so after an edit only the sentences that changed go through the model again.
+# Entities are found within a sentence; one that spans a sentence break is not detected here.
+
+# A sentence ends at ./!/? followed by whitespace and an upper case letter, digit or quote, or at a line break
+SENTENCE_BREAK = re.compile(r"(?<=[.!?])(?P<close>[\"')\]]*)\s+(?=[A-Z0-9\"'(\[])|\n\s*")
+
+
+def split_segments(text):
+    """Returns (start, end) of each sentence with surrounding whitespace trimmed."""
+    segments = []
+    start = 0
+    for match in SENTENCE_BREAK.finditer(text):
+        # closing quotes and brackets stay with the sentence they close
+        add_segment(segments, text, start, match.end("close") if match.group("close") is not None else match.start())
+        start = match.end()
+    add_segment(segments, text, start, len(text))
+    return segments
+
+
+def add_segment(segments, text, start, end):
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    if start < end:
+        segments.append((start, end))
+
+
+def segment_key(segment):
+    return hashlib.blake2b(segment.encode("utf-8"), digest_size=16).digest()
+
+
+def apply_edits(text, edits):
+    """Applies [{"start", "end", "text"}] replacements in order, each in the coordinates left by the previous one."""
+    for edit in edits:
+        start, end, replacement = edit["start"], edit["end"], edit.get("text", "")
+        if not (isinstance(start, int) and isinstance(end, int) and 0 <= start <= end <= len(text)):
+            raise ValueError(f"edit range {start}-{end} is outside the document (length {len(text)})")
+        text = text[:start] + replacement + text[end:]
+    return text
+
+
+class SegmentCache:
+    """LRU of per-sentence spans keyed by a hash of the sentence text; offsets are relative to the sentence."""
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        spans = self._entries.get(key)
+        if spans is not None:
+            self._entries.move_to_end(key)
+        return spans
+
+    def put(self, key, spans):
+        self._entries[key] = spans
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+async def incremental_spans(text, detect, cache):
+    """Spans for the whole text, running detect(sentence) only for sentences not in the cache.
+
+    Returns (spans, number of sentences, number of sentences that were scanned).
+    """
+    segments = split_segments(text)
+    keys = [segment_key(text[start:end]) for start, end in segments]
+    found = {}
+    missing = {}
+    for (start, end), key in zip(segments, keys):
+        spans = cache.get(key)
+        if spans is not None:
+            found[key] = spans
+        elif key not in missing:
+            missing[key] = text[start:end]
+    results = await asyncio.gather(*(detect(segment) for segment in missing.values()))
+    for key, spans in zip(missing, results):
+        cache.put(key, spans)
+        found[key] = spans
+
+    merged = []
+    for (start, _), key in zip(segments, keys):
+        merged.extend(span.shifted(start) for span in found[key])
+    return merged, len(segments), len(missing)
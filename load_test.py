@@ -0,0 +1,290 @@
+import os
+import re
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import subprocess
+from collections import defaultdict
+import httpx
+from prompt_corpus import load_corpus, make_corpus
+
+# Load driver for backend_api: replays a prompt corpus at a fixed request rate (--qps, open loop,
+# latency counted from the scheduled send time so a slow server can't hide its queueing) or with a
+# fixed number of clients (--concurrency, closed loop). Reports client-side p50/p95/p99 and
+# throughput, plus per-stage p50/p95/p99 from the server's /metrics histograms, and saves
+# everything as a JSON baseline:
+#
+#   python load_test.py --corpus prompts.jsonl --qps 20 --duration 60 --output baselines/main.json
+#   python load_test.py --corpus prompts.jsonl --qps 20 --duration 60 --compare baselines/main.json
+#
+# --compare exits with status 1 when a latency grew, or throughput fell, by more than --max-regression.
+
+SAMPLE = re.compile(r'^(\w+)\{(.*)\} (\S+)$')
+LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def parse_histograms(text, names=("confidex_stage_seconds", "confidex_scan_seconds")):
+    """{(metric, series label value): {"buckets": {le: count}, "sum", "count"}} from Prometheus text."""
+    histograms = defaultdict(lambda: {"buckets": {}, "sum": 0.0, "count": 0})
+    for line in text.splitlines():
+        match = SAMPLE.match(line)
+        if not match:
+            continue
+        name, labels, value = match.groups()
+        labels = dict(LABEL.findall(labels))
+        for metric in names:
+            if not name.startswith(metric):
+                continue
+            series = next((v for k, v in labels.items() if k != "le"), "")
+            entry = histograms[metric, series]
+            if name == metric + "_bucket":
+                entry["buckets"][float(labels["le"])] = float(value)
+            elif name == metric + "_sum":
+                entry["sum"] = float(value)
+            elif name == metric + "_count":
+                entry["count"] = float(value)
+    return histograms
+
+
+def histogram_delta(after, before):
+    delta = {}
+    for key, entry in after.items():
+        old = before.get(key, {"buckets": {}, "sum": 0.0, "count": 0})
+        count = entry["count"] - old["count"]
+        if count > 0:
+            delta[key] = {
+                "buckets": {le: n - old["buckets"].get(le, 0) for le, n in entry["buckets"].items()},
+                "sum": entry["sum"] - old["sum"],
+                "count": count,
+            }
+    return delta
+
+
+def histogram_quantile(q, buckets):
+    """Same estimate as Prometheus' histogram_quantile: linear within the bucket holding the rank."""
+    bounds = sorted(buckets)
+    total = buckets[bounds[-1]]
+    if total <= 0:
+        return None
+    rank = q * total
+    lower, below = 0.0, 0.0
+    for bound in bounds:
+        if buckets[bound] >= rank:
+            if bound == float("inf"):
+                # beyond the last finite bucket, the best estimate is its upper bound
+                return lower
+            return lower + (bound - lower) * (rank - below) / max(buckets[bound] - below, 1e-12)
+        lower, below = bound, buckets[bound]
+    return lower
+
+
+def percentiles(values):
+    if not values:
+        return {}
+    values = sorted(values)
+    result = {f"p{round(q * 100)}": values[min(len(values) - 1, int(q * len(values)))] for q in QUANTILES}
+    result["mean"] = sum(values) / len(values)
+    result["max"] = values[-1]
+    return result
+
+
+async def scrape(client, url):
+    try:
+        response = await client.get(url + "/metrics")
+        return parse_histograms(response.text)
+    except httpx.HTTPError as e:
+        print("Cannot read /metrics, stage latencies are not reported:", e)
+        return {}
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = []
+        self.statuses = defaultdict(int)
+        self.verdicts = defaultdict(int)
+
+    async def send(self, client, url, endpoint, item, scheduled):
+        try:
+            response = await client.post(url + endpoint, json={"text": item["text"], "user": "load-test"})
+            status = response.status_code
+            if status == 200:
+                self.verdicts[response.json().get("verdict", "?")] += 1
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        self.statuses[str(status)] += 1
+        if status == 200:
+            self.latencies.append(time.perf_counter() - scheduled)
+
+
+async def run_open_loop(client, url, endpoint, items, qps, duration, recorder):
+    loop_start = time.perf_counter()
+    tasks = []
+    i = 0
+    while True:
+        scheduled = loop_start + i / qps
+        if scheduled - loop_start >= duration:
+            break
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.ensure_future(recorder.send(client, url, endpoint, items[i % len(items)], scheduled)))
+        i += 1
+    await asyncio.gather(*tasks)
+    return time.perf_counter() - loop_start, i
+
+
+async def run_closed_loop(client, url, endpoint, items, concurrency, duration, recorder):
+    loop_start = time.perf_counter()
+    sent = 0
+
+    async def worker():
+        nonlocal sent
+        while time.perf_counter() - loop_start < duration:
+            item = items[sent % len(items)]
+            sent += 1
+            await recorder.send(client, url, endpoint, item, time.perf_counter())
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - loop_start, sent
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def load_test(args, items):
+    limits = httpx.Limits(max_connections=max(args.concurrency or 0, 256), max_keepalive_connections=256)
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        if args.warmup:
+            # fills the explanation cache and model buffers the way earlier traffic would have
+            warmup = Recorder()
+            await asyncio.gather(*(
+                warmup.send(client, args.url, args.endpoint, item, time.perf_counter()) for item in items[:args.warmup]
+            ))
+        before = await scrape(client, args.url)
+        recorder = Recorder()
+        if args.qps:
+            elapsed, sent = await run_open_loop(client, args.url, args.endpoint, items, args.qps, args.duration, recorder)
+        else:
+            elapsed, sent = await run_closed_loop(
+                client, args.url, args.endpoint, items, args.concurrency, args.duration, recorder
+            )
+        after = await scrape(client, args.url)
+
+    stages = {}
+    server = {}
+    for (metric, series), entry in histogram_delta(after, before).items():
+        summary = {f"p{round(q * 100)}": histogram_quantile(q, entry["buckets"]) for q in QUANTILES}
+        summary["mean"] = entry["sum"] / entry["count"]
+        summary["count"] = int(entry["count"])
+        (stages if metric == "confidex_stage_seconds" else server)[series] = summary
+
+    ok = len(recorder.latencies)
+    return {
+        "commit": git_commit(),
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": {
+            "url": args.url, "endpoint": args.endpoint, "qps": args.qps, "concurrency": args.concurrency,
+            "duration_s": args.duration, "corpus": args.corpus or f"generated:{args.count}", "warmup": args.warmup,
+        },
+        "requests": sent,
+        "ok": ok,
+        "statuses": dict(recorder.statuses),
+        "verdicts": dict(recorder.verdicts),
+        "elapsed_s": elapsed,
+        "throughput_rps": ok / elapsed if elapsed else 0.0,
+        "latency_s": percentiles(recorder.latencies),
+        "server_latency_s": server,
+        "stages_s": stages,
+    }
+
+
+def print_result(result):
+    latency = result["latency_s"]
+    print(f"\n{result['requests']} requests in {result['elapsed_s']:.1f}s, {result['ok']} ok, "
+          f"{result['throughput_rps']:.1f} req/s, statuses {result['statuses']}, verdicts {result['verdicts']}")
+    if latency:
+        print(f"client latency ms: p50 {latency['p50'] * 1000:.1f}  p95 {latency['p95'] * 1000:.1f}  "
+              f"p99 {latency['p99'] * 1000:.1f}  max {latency['max'] * 1000:.1f}")
+    if result["stages_s"]:
+        print(f"\n{'stage':<16} {'count':>7} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        for stage, s in sorted(result["stages_s"].items()):
+            print(f"{stage:<16} {s['count']:>7} {s['mean'] * 1000:>9.1f} "
+                  + " ".join(f"{(s[p] or 0) * 1000:>9.1f}" for p in ("p50", "p95", "p99")))
+
+
+def compare(result, baseline, max_regression):
+    """Prints current vs baseline and returns the regressions beyond max_regression (relative)."""
+    rows = [("throughput req/s", baseline["throughput_rps"], result["throughput_rps"], False)]
+    for p in ("p50", "p95", "p99"):
+        if p in baseline["latency_s"] and p in result["latency_s"]:
+            rows.append((f"latency {p} ms", baseline["latency_s"][p] * 1000, result["latency_s"][p] * 1000, True))
+    for stage, s in sorted(result["stages_s"].items()):
+        old = baseline.get("stages_s", {}).get(stage)
+        if old and old.get("p95") and s.get("p95"):
+            rows.append((f"{stage} p95 ms", old["p95"] * 1000, s["p95"] * 1000, True))
+
+    print(f"\nCompared with {baseline.get('commit') or 'baseline'} ({baseline.get('started_at', '?')}):")
+    differing = [k for k in ("endpoint", "qps", "concurrency", "corpus") if baseline["config"].get(k) != result["config"].get(k)]
+    if differing:
+        print(f"Note: the baseline was run with a different {', '.join(differing)}, the numbers may not be comparable")
+    print(f"{'':<24} {'baseline':>10} {'current':>10} {'change':>8}")
+    regressions = []
+    for name, old, new, lower_is_better in rows:
+        change = (new - old) / old if old else 0.0
+        worse = change > max_regression if lower_is_better else change < -max_regression
+        print(f"{name:<24} {old:>10.1f} {new:>10.1f} {change:>+7.1%}{'  REGRESSION' if worse else ''}")
+        if worse:
+            regressions.append(name)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a prompt corpus against backend_api and record latencies")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--endpoint", default="/scan")
+    parser.add_argument("--corpus", help="JSONL from prompt_corpus.py (default: generate --count prompts)")
+    parser.add_argument("--count", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--qps", type=float, help="open loop: send at this rate regardless of responses")
+    mode.add_argument("--concurrency", type=int, help="closed loop: this many clients, each waits for its answer")
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds of load after warmup")
+    parser.add_argument("--warmup", type=int, default=20, help="requests sent before measuring")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--output", help="write the result JSON here (default: load_test_results/<time>-<commit>.json)")
+    parser.add_argument("--compare", help="baseline JSON to compare with")
+    parser.add_argument("--max-regression", type=float, default=0.10, help="allowed relative change, 0.10 = 10%%")
+    args = parser.parse_args()
+    if not args.qps and not args.concurrency:
+        args.concurrency = 8
+
+    items = load_corpus(args.corpus) if args.corpus else make_corpus(args.count, args.seed)
+    # the same order on every run, but not grouped by length
+    random.Random(args.seed).shuffle(items)
+    result = asyncio.run(load_test(args, items))
+    print_result(result)
+
+    output = args.output or os.path.join(
+        "load_test_results", f"{time.strftime('%Y%m%d-%H%M%S')}-{result['commit'] or 'nocommit'}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"\nSaved to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(result, json.load(f), args.max_regression)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
@@ -0,0 +1,64 @@
+def split_windows(tokenizer, text, max_tokens=512, stride=128):
+    """Splits text into overlapping windows of at most max_tokens tokens.
+
+    Returns a list of (char_start, char_end, token_count) tuples. Windows start and
+    end on word boundaries so re-tokenizing text[char_start:char_end] gives back the
+    same tokens, and consecutive windows share roughly `stride` tokens.
+    """
+    encoding = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True, verbose=False)
+    offsets = encoding["offset_mapping"]
+    word_ids = encoding.word_ids()
+    budget = max_tokens - 2  # room for [CLS] and [SEP]
+    n = len(offsets)
+    if n <= budget:
+        return [(0, len(text), n + 2)]
+
+    def word_start(i):
+        # move back to the first sub-token of the word containing token i
+        while i > 0 and word_ids[i] is not None and word_ids[i - 1] == word_ids[i]:
+            i -= 1
+        return i
+
+    windows = []
+    start = 0
+    while True:
+        end = min(start + budget, n)
+        if end < n:
+            # don't cut a word in half at the right edge either
+            cut = word_start(end)
+            if cut > start:
+                end = cut
+        windows.append((offsets[start][0], offsets[end - 1][1], end - start + 2))
+        if end >= n:
+            return windows
+        next_start = word_start(max(end - stride, start + 1))
+        start = next_start if next_start > start else end
+
+
+def dedupe_spans(spans):
+    """Collapses spans that were found in more than one overlapping window.
+
+    Overlapping spans with the same label are merged into their union (a window edge
+    may have cut the entity short), overlapping spans with different labels keep the
+    higher scoring one.
+    """
+    deduped = []
+    for span in sorted(spans, key=lambda s: (s.start, -s.end)):
+        if deduped and span.start < deduped[-1].end:
+            prev = deduped[-1]
+            if span.label == prev.label:
+                prev.end = max(prev.end, span.end)
+                prev.score = max(prev.score, span.score)
+            elif span.score > prev.score:
+                deduped[-1] = span
+            continue
+        deduped.append(span)
+    return deduped
+
+
+def merge_window_results(windows, results):
+    """Maps per-window spans back to offsets in the full text and removes duplicates."""
+    spans = []
+    for (char_start, _, _), window_spans in zip(windows, results):
+        spans.extend(span.shifted(char_start) for span in window_spans)
+    return dedupe_spans(spans)
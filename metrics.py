@@ -0,0 +1,159 @@
+import os
+import time
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+# Minimal in-process metrics rendered in the Prometheus text format by GET /metrics.
+# Updating a metric is a dict lookup and an addition under a lock, cheap enough for the hot path.
+registry = []
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def format_labels(label_names, values, extra=()):
+    pairs = list(zip(label_names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Metric(ABC):
+    kind = None
+
+    def __init__(self, name, help, label_names=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def label_values(self, labels):
+        return tuple(labels[name] for name in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+    @abstractmethod
+    def samples(self):
+        """The sample lines of this metric in the Prometheus text format."""
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name, help, label_names=()):
+        super().__init__(name, help, label_names)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self.label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}{format_labels(self.label_names, key)} {value}" for key, value in values]
+
+
+class Gauge(Metric):
+    """A value read when /metrics is scraped: fn() returns a number, or a {label values: number} dict."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help, fn, label_names=()):
+        super().__init__(name, help, label_names)
+        self.fn = fn
+
+    def samples(self):
+        value = self.fn()
+        if value is None:
+            return []
+        if not isinstance(value, dict):
+            value = {(): value}
+        return [
+            f"{self.name}{format_labels(self.label_names, key if isinstance(key, tuple) else (key,))} {v}"
+            for key, v in value.items() if v is not None
+        ]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, label_names=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # label values -> [bucket counts..., sum, count]
+
+    def observe(self, value, **labels):
+        key = self.label_values(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            values = [(key, list(state)) for key, state in self._values.items()]
+        lines = []
+        for key, state in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{format_labels(self.label_names, key, [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_bucket{format_labels(self.label_names, key, [('le', '+Inf')])} {state[-1]}")
+            lines.append(f"{self.name}_sum{format_labels(self.label_names, key)} {state[-2]}")
+            lines.append(f"{self.name}_count{format_labels(self.label_names, key)} {state[-1]}")
+        return lines
+
+
+def render():
+    return "\n".join(metric.render() for metric in registry) + "\n"
+
+
+def rss_bytes():
+    """Resident set size of this process, or None where /proc is not available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+# Shared by the NER path, the RAG chain and the audit log
+stage_seconds = Histogram(
+    "confidex_stage_seconds",
+    "Time spent in each scan stage (tokenize, model_forward, aggregation, rule_engine, merge_amounts, "
+    "retrieval, llm_generation, audit_log)",
+    ["stage"]
+)
+scan_seconds = Histogram("confidex_scan_seconds", "End-to-end scan latency per endpoint", ["endpoint"])
+entities_total = Counter("confidex_entities_total", "Entities flagged, by label", ["label"])
+explanation_cache_total = Counter(
+    "confidex_explanation_cache_total",
+    "Explanation cache lookups by result (hit_memory, hit_disk, miss)",
+    ["result"]
+)
+process_rss = Gauge("confidex_process_rss_bytes", "Resident set size of the API process", rss_bytes)
+
+
+def stage(name):
+    return stage_seconds.time(stage=name)
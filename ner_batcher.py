@@ -0,0 +1,129 @@
+import asyncio
+import bisect
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Overloaded(RuntimeError):
+    """Raised instead of queueing when NER already has more work waiting than it is allowed to."""
+
+
+class NERBatcher:
+    """Collects concurrent NER requests into padded batches and runs them in one forward pass."""
+
+    def __init__(self, infer_fn, length_fn, max_wait_ms=5.0, max_batch_size=16, length_buckets=(32, 64, 128, 256, 512),
+                 max_concurrent_batches=1, max_pending=0):
+        # infer_fn(list_of_texts) -> list of entity lists, one per text (same order)
+        # length_fn(text) -> token count, used to put similar lengths in the same batch
+        # max_concurrent_batches: batches that may run at once (one per model replica)
+        # max_pending: texts allowed to wait for a batch before submit() raises Overloaded (0: no limit)
+        self.infer_fn = infer_fn
+        self.length_fn = length_fn
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self.length_buckets = sorted(length_buckets)
+        self.max_concurrent_batches = max_concurrent_batches
+        self.max_pending = max_pending
+        self._queue = None
+        self._worker = None
+        self._loop = None
+        self._slots = None
+        self._pending = {}
+        # One thread per concurrent batch, so with a single model batches never compete for cores
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent_batches, thread_name_prefix="ner-batch")
+
+    def depth(self):
+        """Texts waiting for a batch (queued or collected into a bucket but not yet running)."""
+        queued = self._queue.qsize() if self._queue is not None else 0
+        return queued + sum(len(items) for items in self._pending.values())
+
+    def _bucket_for(self, length):
+        return bisect.bisect_left(self.length_buckets, length)
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+            self._pending = {}
+            self._worker = asyncio.ensure_future(self._run())
+
+    async def submit(self, text, length=None):
+        """Queues one text and returns its entities once its batch has run."""
+        self._ensure_worker()
+        if self.max_pending and self.depth() >= self.max_pending:
+            raise Overloaded(f"{self.depth()} texts are already waiting for NER")
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        bucket = self._bucket_for(self.length_fn(text) if length is None else length)
+        self._queue.put_nowait((bucket, loop.time(), text, future))
+        return await future
+
+    def _add(self, item):
+        bucket, enqueued, text, future = item
+        self._pending.setdefault(bucket, []).append((enqueued, text, future))
+
+    def _drain(self):
+        while True:
+            try:
+                self._add(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                return
+
+    def _full_bucket(self):
+        for bucket, items in self._pending.items():
+            if len(items) >= self.max_batch_size:
+                return bucket
+        return None
+
+    def _oldest_bucket(self):
+        return min(self._pending, key=lambda b: self._pending[b][0][0])
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Wait for a free replica first, requests keep arriving meanwhile and make fuller batches
+            await self._slots.acquire()
+            if not self._pending:
+                self._add(await self._queue.get())
+            # Requests that arrived while the previous batch was running
+            self._drain()
+
+            # Wait for more requests until the oldest one has used up its window
+            deadline = self._pending[self._oldest_bucket()][0][0] + self.max_wait
+            while self._full_bucket() is None:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    self._add(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            bucket = self._full_bucket()
+            if bucket is None:
+                bucket = self._oldest_bucket()
+            items = self._pending[bucket]
+            batch, rest = items[:self.max_batch_size], items[self.max_batch_size:]
+            if rest:
+                self._pending[bucket] = rest
+            else:
+                del self._pending[bucket]
+
+            asyncio.ensure_future(self._run_batch(batch))
+
+    async def _run_batch(self, batch):
+        loop = asyncio.get_running_loop()
+        texts = [text for _, text, _ in batch]
+        try:
+            results = await loop.run_in_executor(self._executor, self.infer_fn, texts)
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self._slots.release()
+        for (_, _, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
@@ -0,0 +1,166 @@
+import os
+from abc import ABC, abstractmethod
+import numpy as np
+from transformers import AutoConfig, AutoTokenizer
+from spans import Span
+import metrics
+
+ENGINES = ("torch", "onnx-fp32", "onnx-int8")
+ONNX_FP32_FILE = "model.onnx"
+ONNX_INT8_FILE = "model.int8.onnx"
+
+
+def softmax(logits):
+    shifted = logits - logits.max(axis=-1, keepdims=True)
+    exp = np.exp(shifted)
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+def split_tag(label):
+    # Same rules as the HF token-classification pipeline: non-BIO labels (like "O") count as "I"
+    if label.startswith("B-") or label.startswith("I-"):
+        return label[0], label[2:]
+    return "I", label
+
+
+class NEREngine(ABC):
+    """Tokenizes a batch of texts with padding, runs one forward pass and decodes entities.
+
+    Decoding follows the HF pipeline's aggregation_strategy="simple", so every engine returns
+    the same dicts as ner_pipeline: entity_group, score, word, start, end.
+    """
+
+    def __init__(self, tokenizer, id2label, max_length=512):
+        self.tokenizer = tokenizer
+        self.id2label = {int(k): v for k, v in id2label.items()}
+        self.max_length = max_length
+
+    @abstractmethod
+    def forward(self, input_ids, attention_mask):
+        """Logits of shape (batch, tokens, labels) as a numpy array."""
+
+    def encode(self, texts):
+        return self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=self.max_length,
+            return_offsets_mapping=True,
+            return_special_tokens_mask=True,
+            return_tensors="np"
+        )
+
+    def __call__(self, texts):
+        encoding = self.encode(texts)
+        logits = self.forward(encoding["input_ids"], encoding["attention_mask"])
+        return self.decode(texts, encoding, logits)
+
+    def spans(self, texts):
+        """Like __call__, but returns Span objects and skips building the "word" strings."""
+        with metrics.stage("tokenize"):
+            encoding = self.encode(texts)
+        with metrics.stage("model_forward"):
+            logits = self.forward(encoding["input_ids"], encoding["attention_mask"])
+        with metrics.stage("aggregation"):
+            label_ids, label_scores = self.label_scores(logits)
+            results = []
+            for i in range(len(texts)):
+                offsets = encoding["offset_mapping"][i]
+                results.append([
+                    Span(tag, int(offsets[idxs[0]][0]), int(offsets[idxs[-1]][1]), float(label_scores[i][idxs].mean()))
+                    for tag, idxs in self.group(self.kept_tokens(encoding, i), label_ids[i])
+                ])
+        return results
+
+    def label_scores(self, logits):
+        scores = softmax(logits.astype(np.float32))
+        label_ids = scores.argmax(axis=-1)
+        return label_ids, np.take_along_axis(scores, label_ids[..., None], axis=-1)[..., 0]
+
+    def kept_tokens(self, encoding, i):
+        return np.flatnonzero(encoding["special_tokens_mask"][i] == 0)
+
+    def decode(self, texts, encoding, logits):
+        label_ids, label_scores = self.label_scores(logits)
+        results = []
+        for i in range(len(texts)):
+            tokens = self.tokenizer.convert_ids_to_tokens(encoding["input_ids"][i])
+            offsets = encoding["offset_mapping"][i]
+            results.append([
+                self.group_tokens(idxs, tag, tokens, offsets, label_scores[i])
+                for tag, idxs in self.group(self.kept_tokens(encoding, i), label_ids[i])
+            ])
+        return results
+
+    def group(self, keep, label_ids):
+        """Yields (tag, token indices) for each entity, skipping "O" runs."""
+        current = []
+        current_tag = None
+        for idx in keep:
+            bi, tag = split_tag(self.id2label[int(label_ids[idx])])
+            if current and (tag != current_tag or bi == "B"):
+                if current_tag != "O":
+                    yield current_tag, current
+                current = []
+            current.append(idx)
+            current_tag = tag
+        if current and current_tag != "O":
+            yield current_tag, current
+
+    def group_tokens(self, idxs, tag, tokens, offsets, label_scores):
+        return {
+            "entity_group": tag,
+            "score": float(np.mean(label_scores[idxs])),
+            "word": self.tokenizer.convert_tokens_to_string([tokens[i] for i in idxs]),
+            "start": int(offsets[idxs[0]][0]),
+            "end": int(offsets[idxs[-1]][1]),
+        }
+
+
+class TorchNEREngine(NEREngine):
+    def __init__(self, model_dir):
+        import torch
+        from transformers import AutoModelForTokenClassification
+        self.torch = torch
+        self.model = AutoModelForTokenClassification.from_pretrained(model_dir)
+        self.model.eval()
+        super().__init__(AutoTokenizer.from_pretrained(model_dir), self.model.config.id2label)
+
+    def forward(self, input_ids, attention_mask):
+        with self.torch.inference_mode():
+            outputs = self.model(
+                input_ids=self.torch.from_numpy(input_ids),
+                attention_mask=self.torch.from_numpy(attention_mask)
+            )
+        return outputs.logits.numpy()
+
+
+class OnnxNEREngine(NEREngine):
+    def __init__(self, onnx_dir, quantized=False, num_threads=None):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        path = os.path.join(onnx_dir, ONNX_INT8_FILE if quantized else ONNX_FP32_FILE)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"{path} not found, run: python export_onnx.py --output {onnx_dir}")
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        config = AutoConfig.from_pretrained(onnx_dir)
+        super().__init__(AutoTokenizer.from_pretrained(onnx_dir), config.id2label)
+
+    def forward(self, input_ids, attention_mask):
+        return self.session.run(["logits"], {
+            "input_ids": input_ids.astype(np.int64),
+            "attention_mask": attention_mask.astype(np.int64)
+        })[0]
+
+
+def load_ner_engine(engine, model_dir="modelv1", onnx_dir="modelv1-onnx", num_threads=None):
+    if engine == "torch":
+        return TorchNEREngine(model_dir)
+    if engine == "onnx-fp32":
+        return OnnxNEREngine(onnx_dir, quantized=False, num_threads=num_threads)
+    if engine == "onnx-int8":
+        return OnnxNEREngine(onnx_dir, quantized=True, num_threads=num_threads)
+    raise ValueError(f"Unknown NER engine {engine!r}, expected one of {', '.join(ENGINES)}")
@@ -0,0 +1,166 @@
+import os
+import json
+import fcntl
+import pickle
+import hashlib
+import tempfile
+from contextlib import contextmanager
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+
+INDEX_FILE = "index.faiss"
+DOCSTORE_FILE = "index.pkl"
+MANIFEST_FILE = "manifest.json"
+LOCK_FILE = ".lock"
+
+
+def sha256_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@contextmanager
+def index_lock(index_dir):
+    """Exclusive lock on an index directory, so workers that all find the index stale rebuild it once."""
+    os.makedirs(index_dir, exist_ok=True)
+    with open(os.path.join(index_dir, LOCK_FILE), "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def replace_file(path, write):
+    """Calls write(temporary path) and renames the result over path.
+
+    Readers never see a half-written file, and processes that memory-mapped the old one keep its
+    (unlinked) pages instead of having the file truncated under them.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".")
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def write_pickle(path, value):
+    def write(tmp_path):
+        with open(tmp_path, "wb") as f:
+            pickle.dump(value, f)
+    replace_file(path, write)
+
+
+def write_json(path, value):
+    def write(tmp_path):
+        with open(tmp_path, "w") as f:
+            json.dump(value, f, indent=2)
+    replace_file(path, write)
+
+
+def read_manifest(index_dir):
+    path = os.path.join(index_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def read_index_shared(path):
+    """Reads a faiss index for searching only, with its vectors mapped from the file where faiss can.
+
+    IO_FLAG_MMAP_IFC maps the flat vector codes (flat, HNSW and IVF storage) in place, so the
+    vectors are page cache that every worker shares instead of a private copy per process
+    (IO_FLAG_MMAP alone only maps IVF inverted lists). Older faiss versions lack the flag and
+    read the index into memory. Adding to or removing from a mapped index aborts the process:
+    load an index that will be changed with faiss.read_index.
+    """
+    flag = getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+    if flag is not None:
+        try:
+            return faiss.read_index(path, flag | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:
+            # not every index type can be mapped
+            pass
+    return faiss.read_index(path)
+
+
+def read_faiss_index(index_dir):
+    return read_index_shared(os.path.join(index_dir, INDEX_FILE))
+
+
+def load_vector_store(index_dir, embedding, settings):
+    """Loads the persisted vector store if it was built with exactly these settings, else returns None.
+
+    settings describes everything the vectors depend on (PDF hash, chunking parameters,
+    embedding model); chunk hashes are only checked when rebuilding.
+    """
+    manifest = read_manifest(index_dir)
+    if manifest is None or manifest.get("settings") != settings:
+        return None
+    index = read_faiss_index(index_dir)
+    with open(os.path.join(index_dir, DOCSTORE_FILE), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    return FAISS(
+        embedding_function=embedding,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=index_to_docstore_id
+    )
+
+
+def reusable_vectors(index_dir, settings):
+    """Maps chunk hash -> vector for the existing index, if its vectors are compatible with settings."""
+    manifest = read_manifest(index_dir)
+    if manifest is None or not os.path.exists(os.path.join(index_dir, INDEX_FILE)):
+        return {}
+    if manifest["settings"].get("embedding_model") != settings.get("embedding_model"):
+        return {}
+    index = faiss.read_index(os.path.join(index_dir, INDEX_FILE))
+    return {chunk_hash: index.reconstruct(i) for i, chunk_hash in enumerate(manifest["chunks"])}
+
+
+def build_vector_store(index_dir, documents, embedding, settings, batch_size=64):
+    """Builds the vector store, embedding only chunks whose text is not already in the persisted index."""
+    chunk_hashes = [sha256_text(doc.page_content) for doc in documents]
+    vectors = reusable_vectors(index_dir, settings)
+
+    missing = [i for i, chunk_hash in enumerate(chunk_hashes) if chunk_hash not in vectors]
+    # one embedding call per batch keeps each request to the embedding server small
+    for start in range(0, len(missing), batch_size):
+        batch = missing[start:start + batch_size]
+        embedded = embedding.embed_documents([documents[i].page_content for i in batch])
+        for i, vector in zip(batch, embedded):
+            vectors[chunk_hashes[i]] = np.asarray(vector, dtype=np.float32)
+    print(f"Policy index: reused {len(documents) - len(missing)} chunks, embedded {len(missing)}")
+
+    vector_store = FAISS.from_embeddings(
+        text_embeddings=[(doc.page_content, vectors[h]) for doc, h in zip(documents, chunk_hashes)],
+        embedding=embedding,
+        metadatas=[doc.metadata for doc in documents]
+    )
+    save_vector_store(index_dir, vector_store, settings, chunk_hashes)
+    return vector_store
+
+
+def save_vector_store(index_dir, vector_store, settings, chunk_hashes):
+    # callers hold index_lock(index_dir) when other workers may rebuild the same index
+    os.makedirs(index_dir, exist_ok=True)
+    manifest_path = os.path.join(index_dir, MANIFEST_FILE)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    replace_file(os.path.join(index_dir, INDEX_FILE), lambda path: faiss.write_index(vector_store.index, path))
+    write_pickle(os.path.join(index_dir, DOCSTORE_FILE), (vector_store.docstore, vector_store.index_to_docstore_id))
+    # The manifest is written last, so an interrupted save is never mistaken for a valid index
+    write_json(manifest_path, {"settings": settings, "chunks": chunk_hashes})
@@ -0,0 +1,295 @@
+import os
+import re
+import time
+import json
+import argparse
+from collections import deque
+from multiprocessing import get_context
+from concurrent.futures import ProcessPoolExecutor
+from pypdf import PdfReader
+
+# Streaming ingestion of policy PDFs: pages are extracted by a pool of worker processes (at most
+# a few tasks ahead of the consumer), cleaned page by page, and cut into chunks at clause
+# boundaries ("3.1 Personal Identifiers", "Clause 3.1.1: NRIC", "Clause 7") by a generator that only
+# holds the clause it is in. Chunks are embedded in batches as they come, so memory stays bounded
+# by one batch however long the manual is:
+#
+#   python policy_ingest.py manual.pdf --workers 8 --output chunks.jsonl     # chunk only
+#   python policy_ingest.py manual.pdf --compare                             # time 1 worker vs --workers
+#
+# Each chunk is (text, {"clause", "section", "page_start", "page_end"}), section being the top
+# level heading number ("3" for clause 3.1.1). A clause longer than max_chars is split at
+# sentence ends, consecutive pieces sharing up to overlap characters.
+
+MAX_CHUNK_CHARS = 1000
+CHUNK_OVERLAP = 200
+# shorter sections that do not end a sentence (a bare heading such as "3.2 Financial Data") are put
+# in front of the next chunk
+MIN_CHUNK_CHARS = 80
+EMBED_BATCH_SIZE = 64
+PAGES_PER_TASK = 4
+# starting worker processes costs more than extracting a short document in-process
+MIN_PARALLEL_PAGES = 16
+
+# a heading number at the start of the text or after whitespace / a bullet, followed by a capitalized word
+CLAUSE_HEAD = re.compile(
+    r"(?<![^\s●])(?:Clause\s+(?P<clause>\d{1,3}(?:\.\d{1,3})*)|(?P<number>\d{1,2}(?:\.\d{1,3})+|\d{1,2}(?=\.\s)))"
+    r"[.:]?\s+(?=[A-Z“\"(●])"
+)
+SENTENCE_END = re.compile(r"(?<=[.!?;])\s+")
+# a heading cut by a page break could be misread, so the end of the buffer is only searched once
+# the next page has been appended
+TAIL_GUARD = 32
+
+
+def clean_page(text: str) -> str:
+    text = re.sub(r"\s+", " ", text)
+    text = re.sub(r"[\x00-\x1F\x7F]", "", text)
+    return text.strip()
+
+
+_reader = None
+
+
+def open_reader(pdf_path):
+    global _reader
+    _reader = PdfReader(pdf_path)
+
+
+def extract_page_range(page_indexes):
+    return [(i + 1, clean_page(_reader.pages[i].extract_text() or "")) for i in page_indexes]
+
+
+def extract_pages(pdf_path, workers=None, pages_per_task=PAGES_PER_TASK):
+    """(page number, cleaned text) for every page, in order.
+
+    Pages are extracted in worker processes; only 2 tasks per worker are in flight, so a slow
+    consumer (the embedding model) holds back extraction instead of letting pages pile up.
+    """
+    page_count = len(PdfReader(pdf_path).pages)
+    workers = min(workers or os.cpu_count() or 1, -(-page_count // pages_per_task))
+    if workers <= 1 or page_count < MIN_PARALLEL_PAGES:
+        open_reader(pdf_path)
+        for i in range(page_count):
+            yield from extract_page_range([i])
+        return
+    # spawn: the parent may hold model or faiss threads that a forked child would inherit half-locked
+    with ProcessPoolExecutor(workers, mp_context=get_context("spawn"), initializer=open_reader, initargs=(pdf_path,)) as pool:
+        in_flight = deque()
+        for start in range(0, page_count, pages_per_task):
+            in_flight.append(pool.submit(extract_page_range, range(start, min(start + pages_per_task, page_count))))
+            if len(in_flight) >= 2 * workers:
+                yield from in_flight.popleft().result()
+        while in_flight:
+            yield from in_flight.popleft().result()
+
+
+def sentence_spans(text, max_chars):
+    """(start, end) of the sentences of text; a longer "sentence" than max_chars (a table, a list without
+    full stops) is cut at its last space before max_chars, or at max_chars if it has none."""
+    starts = [0] + [match.end() for match in SENTENCE_END.finditer(text)]
+    sentences = []
+    for start, end in zip(starts, starts[1:] + [len(text)]):
+        while end - start > max_chars:
+            cut = text.rfind(" ", start + 1, start + max_chars)
+            cut = cut + 1 if cut > start else start + max_chars
+            sentences.append((start, cut))
+            start = cut
+        sentences.append((start, end))
+    return sentences
+
+
+def split_spans(text, max_chars, overlap):
+    """(start, end) of pieces of text of at most max_chars, cut at sentence ends where possible.
+
+    Consecutive pieces share their trailing / leading sentences up to overlap characters.
+    """
+    sentences = sentence_spans(text, max_chars)
+    spans = []
+    first = 0
+    for i, (_, end) in enumerate(sentences):
+        if i > first and end - sentences[first][0] > max_chars:
+            spans.append((sentences[first][0], sentences[i - 1][1]))
+            carried = i
+            while carried - 1 > first and sentences[i - 1][1] - sentences[carried - 1][0] <= overlap:
+                carried -= 1
+            first = carried
+    spans.append((sentences[first][0], len(text)))
+    return spans
+
+
+class ClauseChunker:
+    """Cuts a stream of pages into clause chunks; feed() and finish() return the chunks completed so far."""
+
+    def __init__(self, max_chars=MAX_CHUNK_CHARS, overlap=CHUNK_OVERLAP, min_chars=MIN_CHUNK_CHARS):
+        self.max_chars = max_chars
+        self.overlap = overlap
+        self.min_chars = min_chars
+        # the open section: its text from its heading on, its clause number and [(offset, page)]
+        self.buffer = ""
+        self.clause = None
+        self.pages = []
+        # length of the open section's own heading, the search for the next one starts after it
+        self.heading = 0
+        self.started = False
+        # a short section waiting to be put in front of the next chunk: (text, metadata)
+        self.prefix = None
+
+    def feed(self, page, text):
+        if not text:
+            return []
+        if self.buffer:
+            self.buffer += " "
+        self.pages.append((len(self.buffer), page))
+        self.buffer += text
+        if not self.started:
+            # a document starting with a heading has no preamble
+            self.started = True
+            match = CLAUSE_HEAD.match(self.buffer)
+            if match:
+                self.clause = match.group("clause") or match.group("number")
+                self.heading = match.end()
+        return self._cut(TAIL_GUARD)
+
+    def finish(self):
+        chunks = self._cut(0)
+        if self.buffer:
+            chunks += self._close_section(len(self.buffer))
+        if self.prefix is not None:
+            chunks.append(self.prefix)
+            self.prefix = None
+        return chunks
+
+    def page_at(self, offset):
+        page = self.pages[0][1]
+        for start, number in self.pages:
+            if start > offset:
+                break
+            page = number
+        return page
+
+    def _cut(self, guard):
+        chunks = []
+        while True:
+            # the next heading ends the open section
+            match = CLAUSE_HEAD.search(self.buffer, max(self.heading, 1), max(len(self.buffer) - guard, 1))
+            if match is None:
+                break
+            chunks += self._close_section(match.start())
+            self.clause = match.group("clause") or match.group("number")
+            self.heading = match.end() - match.start()
+        complete = len(self.buffer) - guard
+        if complete > 2 * self.max_chars:
+            # a very long clause: emit the pieces that are certainly complete, keep the rest open
+            spans = split_spans(self.buffer[:complete], self.max_chars, self.overlap)
+            for start, end in spans[:-1]:
+                chunks += self._chunks(start, end, split=False)
+            self._advance(spans[-1][0])
+            self.heading = 0
+        return chunks
+
+    def _close_section(self, end):
+        chunks = self._chunks(0, end)
+        self._advance(end)
+        return chunks
+
+    def _advance(self, offset):
+        rest = self.buffer[offset:]
+        offset += len(rest) - len(rest.lstrip())
+        page = self.page_at(offset)
+        self.pages = [(0, page)] + [(start - offset, number) for start, number in self.pages if start > offset]
+        self.buffer = self.buffer[offset:]
+
+    def _chunks(self, start, end, split=True):
+        text = self.buffer[start:end].strip().rstrip("●").strip()
+        if not text:
+            return []
+        metadata = {"page_start": self.page_at(start), "page_end": self.page_at(max(end - 1, start))}
+        if self.clause is not None:
+            metadata["clause"] = self.clause
+            metadata["section"] = self.clause.split(".")[0]
+        if self.prefix is not None:
+            prefix, prefix_metadata = self.prefix
+            text = f"{prefix} {text}"
+            metadata["page_start"] = prefix_metadata["page_start"]
+            self.prefix = None
+        if len(text) < self.min_chars and text[-1] not in ".!?":
+            self.prefix = (text, metadata)
+            return []
+        if not split:
+            return [(text, metadata)]
+        return [(text[s:e].strip(), dict(metadata)) for s, e in split_spans(text, self.max_chars, self.overlap)]
+
+
+def clause_chunks(pages, max_chars=MAX_CHUNK_CHARS, overlap=CHUNK_OVERLAP, min_chars=MIN_CHUNK_CHARS):
+    """Generator of (text, metadata) chunks from (page number, text) pairs, one clause per chunk when it fits."""
+    chunker = ClauseChunker(max_chars, overlap, min_chars)
+    for page, text in pages:
+        yield from chunker.feed(page, text)
+    yield from chunker.finish()
+
+
+def batched(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def embed_batches(chunks, embedding, batch_size=EMBED_BATCH_SIZE):
+    """(texts, metadatas, vectors) per batch of chunks, one embed_documents call each."""
+    for batch in batched(chunks, batch_size):
+        texts = [text for text, _ in batch]
+        yield texts, [metadata for _, metadata in batch], embedding.embed_documents(texts)
+
+
+def ingest_pdf(store, pdf_path, embedding, name=None, workers=None, batch_size=EMBED_BATCH_SIZE, **document_metadata):
+    """Adds (or replaces) one PDF in a PolicyStore, streaming pages -> chunks -> embedding batches into it."""
+    # not at the top: the spawned extraction workers import this module and only need pypdf
+    from policy_index import sha256_file
+    chunks = clause_chunks(extract_pages(pdf_path, workers))
+    name = name or os.path.basename(pdf_path)
+    store.add_document_batches(
+        name, embed_batches(chunks, embedding, batch_size), sha256=sha256_file(pdf_path), **document_metadata
+    )
+    return name
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract and clause-chunk a policy PDF")
+    parser.add_argument("pdf")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--max-chars", type=int, default=MAX_CHUNK_CHARS)
+    parser.add_argument("--overlap", type=int, default=CHUNK_OVERLAP)
+    parser.add_argument("--output", help="write the chunks as JSONL")
+    parser.add_argument("--compare", action="store_true", help="also extract with a single process and compare")
+    args = parser.parse_args()
+
+    runs = [1, args.workers] if args.compare else [args.workers]
+    for workers in runs:
+        start = time.perf_counter()
+        pages = 0
+
+        def counted(stream):
+            global pages
+            for item in stream:
+                pages += 1
+                yield item
+
+        chunks = clause_chunks(counted(extract_pages(args.pdf, workers)), args.max_chars, args.overlap)
+        output = open(args.output, "w") if args.output else None
+        count, chars = 0, 0
+        for text, metadata in chunks:
+            count += 1
+            chars += len(text)
+            if output:
+                output.write(json.dumps({"text": text, **metadata}, ensure_ascii=False) + "\n")
+        if output:
+            output.close()
+        elapsed = time.perf_counter() - start
+        print(f"{workers} worker(s): {pages} pages -> {count} chunks (mean {chars / max(count, 1):.0f} chars) "
+              f"in {elapsed:.2f}s, {pages / elapsed:.1f} pages/s")
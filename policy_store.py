@@ -0,0 +1,558 @@
+import os
+import json
+import time
+import pickle
+import hashlib
+import argparse
+import threading
+from contextlib import ExitStack
+from datetime import datetime, timezone
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+from policy_index import sha256_text, index_lock, replace_file, write_pickle, write_json, read_index_shared
+
+# Vector store for many policy documents (business unit policies, PDPA guidance, internal
+# standards). Chunks carry their document and clause as metadata and searches can be restricted
+# to them; a document is added, replaced or removed without touching the rest of the index:
+#
+#   python policy_store.py add policy4.pdf --meta unit=compliance
+#   python policy_store.py add pdpa_guidelines.pdf --name pdpa --meta unit=legal
+#   python policy_store.py remove pdpa
+#   python policy_store.py search "Why is NRIC sensitive?" --document policy4.pdf --clause 3.1
+#   python policy_store.py bench --chunks 300000 --dimensions 384 --index hnsw
+#
+# Vectors are L2-normalized and compared by inner product (cosine similarity). A small store is
+# searched exactly; once it holds ann_min_chunks chunks it is converted to the configured ANN index:
+#   hnsw   graph index, best latency; removed chunks are masked until they are more than
+#          HNSW_MAX_DELETED of the index, then the index is compacted
+#   ivf    inverted lists, removal is exact, needs nprobe tuning for recall
+#   ivfpq  ivf with product-quantized vectors (pq_m bytes per vector), for corpora that do not fit
+#          in memory as float32
+
+INDEX_FILE = "store.faiss"
+CHUNKS_FILE = "chunks.pkl"
+MANIFEST_FILE = "manifest.json"
+INDEX_TYPES = ("flat", "hnsw", "ivf", "ivfpq")
+
+ANN_MIN_CHUNKS = 20000
+# ivf and ivfpq need this many vectors to train their clusters and codebooks
+MIN_TRAINING_CHUNKS = 256
+HNSW_MAX_DELETED = 0.2
+# filters matching at most this many chunks are answered by an exact scan of just those vectors,
+# ANN searches with a very selective filter can miss results
+EXACT_SEARCH_MAX = 2048
+# clause filters also match sub-clauses: "3.1" selects 3.1, 3.1.1, 3.1.2, ...
+PREFIX_FIELDS = ("clause",)
+# the chunk selection of this many distinct filters is kept until the next update
+SELECTION_CACHE_SIZE = 256
+
+
+def normalize(vectors, dimensions):
+    vectors = np.array(vectors, dtype=np.float32).reshape(-1, dimensions)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def make_index(index_type, dimensions, vectors, hnsw_m=32, pq_m=None):
+    """Empty index of index_type over ids chosen by the store, trained on vectors when it needs training."""
+    if index_type == "flat":
+        return faiss.IndexIDMap2(faiss.IndexFlatIP(dimensions))
+    if index_type == "hnsw":
+        graph = faiss.IndexHNSWFlat(dimensions, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        graph.hnsw.efConstruction = 80
+        return faiss.IndexIDMap2(graph)
+
+    # ~4 sqrt(n) lists, with at least 39 training vectors per list as faiss recommends
+    nlist = int(min(max(4 * np.sqrt(len(vectors)), 16), max(len(vectors) // 39, 1), 65536))
+    quantizer = faiss.IndexFlatIP(dimensions)
+    if index_type == "ivf":
+        index = faiss.IndexIVFFlat(quantizer, dimensions, nlist, faiss.METRIC_INNER_PRODUCT)
+    else:
+        pq_m = pq_m or largest_divisor(dimensions, 64)
+        index = faiss.IndexIVFPQ(quantizer, dimensions, nlist, pq_m, 8, faiss.METRIC_INNER_PRODUCT)
+    sample = vectors[np.random.default_rng(0).permutation(len(vectors))[:256 * nlist]]
+    index.train(sample)
+    # lets the index remove and reconstruct vectors by id
+    index.set_direct_map_type(faiss.DirectMap.Hashtable)
+    return index
+
+
+def largest_divisor(n, limit):
+    return max(m for m in range(1, limit + 1) if n % m == 0)
+
+
+def filter_values(value):
+    return value if isinstance(value, (list, tuple, set)) else [value]
+
+
+def filter_key(filters):
+    return tuple(sorted((field, tuple(sorted(map(str, filter_values(values))))) for field, values in filters.items()))
+
+
+class PolicyStore:
+    """Chunks of many policy documents in one faiss index, with metadata postings for filtering.
+
+    Thread-safe: searches and updates are serialized, a search over a few hundred thousand chunks
+    takes well under a millisecond.
+    """
+
+    def __init__(self, dimensions, embedding_model, index_type="hnsw", ann_min_chunks=ANN_MIN_CHUNKS,
+                 hnsw_m=32, ef_search=64, nprobe=16, pq_m=None):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"index_type must be one of {INDEX_TYPES}, not {index_type!r}")
+        self.settings = {
+            "dimensions": dimensions,
+            "embedding_model": embedding_model,
+            "index_type": index_type,
+            "ann_min_chunks": ann_min_chunks,
+            "hnsw_m": hnsw_m,
+            "pq_m": pq_m,
+        }
+        self.ef_search = ef_search
+        self.nprobe = nprobe
+        self.kind = "flat"
+        self.index = make_index("flat", dimensions, None)
+        self.chunks = {}
+        self.documents = {}
+        # field -> value -> chunk ids
+        self.postings = {}
+        # hnsw cannot delete, ids of removed chunks are masked until the next compaction
+        self.deleted = set()
+        self.next_id = 0
+        # filter key -> (ids, vectors) for an exact search or (ids, faiss selector) for an ANN search
+        self._selections = {}
+        # set by load(read_only=True): the index is mapped from its file and cannot change
+        self.read_only = False
+        # version() of the current documents, None until asked for after a change
+        self._version = None
+        self._lock = threading.RLock()
+
+    @property
+    def dimensions(self):
+        return self.settings["dimensions"]
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def version(self):
+        """Changes whenever a document is added, replaced or removed."""
+        version = self._version
+        if version is None:
+            with self._lock:
+                version = self._version = sha256_text(
+                    json.dumps(sorted((name, doc["sha256"]) for name, doc in self.documents.items()))
+                )
+        return version
+
+    def add_document(self, name, texts, vectors, metadatas=None, sha256=None, **document_metadata):
+        """Adds the chunks of one document, replacing the chunks of a document with the same name.
+
+        metadatas are per chunk (clause, page, ...), document_metadata applies to every chunk
+        (unit, kind, ...); both can be used as search filters.
+        """
+        self.add_document_batches(name, [(texts, metadatas, vectors)], sha256, **document_metadata)
+
+    def add_document_batches(self, name, batches, sha256=None, **document_metadata):
+        """add_document for a document arriving as (texts, metadatas, vectors) batches, see policy_ingest.py.
+
+        Each batch is searchable as soon as it is added; an older version of the document stays
+        searchable until the last batch is in, and is kept if the batches fail.
+        """
+        self._check_writable()
+        ids = []
+        digest = hashlib.sha256()
+        try:
+            for texts, metadatas, vectors in batches:
+                ids += self._add_chunks(name, texts, vectors, metadatas or [{} for _ in texts], document_metadata)
+                for text in texts:
+                    digest.update(text.encode("utf-8"))
+        except BaseException:
+            with self._lock:
+                self._selections.clear()
+                self._remove_chunks(ids)
+            raise
+        with self._lock:
+            self._selections.clear()
+            self._version = None
+            if name in self.documents:
+                self._remove_chunks(self.documents.pop(name)["ids"])
+            self.documents[name] = {
+                **document_metadata,
+                "sha256": sha256 or digest.hexdigest(),
+                "chunks": len(ids),
+                "added_at": datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+                "ids": ids,
+            }
+            if self.kind == "flat" and self.settings["index_type"] != "flat" \
+                    and len(self.chunks) >= self.settings["ann_min_chunks"]:
+                self.rebuild(self.settings["index_type"])
+
+    def _check_writable(self):
+        # faiss aborts the whole process on a write to a mapped index, fail before that
+        if self.read_only:
+            raise RuntimeError("this policy store was loaded read-only, change it with python policy_store.py")
+
+    def _add_chunks(self, name, texts, vectors, metadatas, document_metadata):
+        vectors = normalize(vectors, self.dimensions)
+        if len(vectors) != len(texts):
+            raise ValueError(f"{len(texts)} chunks but {len(vectors)} vectors")
+        with self._lock:
+            self._selections.clear()
+            ids = np.arange(self.next_id, self.next_id + len(texts), dtype=np.int64)
+            self.next_id += len(texts)
+            self.index.add_with_ids(vectors, ids)
+            for chunk_id, text, metadata in zip(ids.tolist(), texts, metadatas):
+                chunk = {**document_metadata, **metadata, "document": name, "text": text}
+                self.chunks[chunk_id] = chunk
+                for field, value in chunk.items():
+                    if field != "text" and isinstance(value, (str, int)):
+                        self.postings.setdefault(field, {}).setdefault(value, set()).add(chunk_id)
+            return ids.tolist()
+
+    def remove_document(self, name):
+        self._check_writable()
+        with self._lock:
+            document = self.documents.pop(name, None)
+            if document is None:
+                raise KeyError(f"No document {name!r} in the policy store")
+            self._selections.clear()
+            self._version = None
+            self._remove_chunks(document["ids"])
+
+    def _remove_chunks(self, ids):
+        if not ids:
+            return
+        for chunk_id in ids:
+            chunk = self.chunks.pop(chunk_id)
+            for field, value in chunk.items():
+                if field != "text" and isinstance(value, (str, int)):
+                    posting = self.postings[field][value]
+                    posting.discard(chunk_id)
+                    if not posting:
+                        del self.postings[field][value]
+        if self.kind == "hnsw":
+            self.deleted.update(ids)
+            if len(self.deleted) > HNSW_MAX_DELETED * self.index.ntotal:
+                self.rebuild("hnsw")
+        else:
+            self.index.remove_ids(faiss.IDSelectorArray(np.asarray(ids, dtype=np.int64)))
+
+    def rebuild(self, index_type=None):
+        """Re-creates the index from the stored vectors: converts it to index_type and drops masked chunks.
+
+        An ivfpq index only holds approximate vectors, rebuilding from it keeps their quantization error.
+        """
+        self._check_writable()
+        index_type = index_type or self.settings["index_type"]
+        with self._lock:
+            ids = np.fromiter(sorted(self.chunks), dtype=np.int64, count=len(self.chunks))
+            vectors = self.index.reconstruct_batch(ids) if len(ids) else np.zeros((0, self.dimensions), np.float32)
+            if index_type in ("ivf", "ivfpq") and len(ids) < MIN_TRAINING_CHUNKS:
+                print(f"Keeping the {self.kind} index, {index_type} needs at least {MIN_TRAINING_CHUNKS} chunks to train")
+                return
+            index = make_index(index_type, self.dimensions, vectors, self.settings["hnsw_m"], self.settings["pq_m"])
+            if len(ids):
+                index.add_with_ids(vectors, ids)
+            self.index, self.kind = index, index_type
+            self.deleted.clear()
+            self._selections.clear()
+
+    def allowed_ids(self, filters):
+        """Chunk ids matching every field of filters ({field: value or list of values}), None for no filter."""
+        if not filters:
+            return None
+        allowed = None
+        for field, values in filters.items():
+            postings = self.postings.get(field, {})
+            matching = set()
+            for value in filter_values(values):
+                matching.update(postings.get(value, ()))
+                if field in PREFIX_FIELDS:
+                    prefix = f"{value}."
+                    for key, ids in postings.items():
+                        if isinstance(key, str) and key.startswith(prefix):
+                            matching.update(ids)
+            allowed = matching if allowed is None else allowed & matching
+            if not allowed:
+                break
+        return np.fromiter(allowed, dtype=np.int64, count=len(allowed))
+
+    def search_params(self, k, selector):
+        if self.kind == "hnsw":
+            return faiss.SearchParametersHNSW(sel=selector, efSearch=max(self.ef_search, k))
+        if self.kind in ("ivf", "ivfpq"):
+            return faiss.SearchParametersIVF(sel=selector, nprobe=self.nprobe)
+        return faiss.SearchParameters(sel=selector) if selector is not None else None
+
+    def selection(self, filters):
+        """What a search with filters runs over; built once per filter until the store changes."""
+        key = filter_key(filters) if filters else None
+        selection = self._selections.get(key)
+        if selection is None:
+            if filters:
+                ids = self.allowed_ids(filters)
+                if len(ids) <= EXACT_SEARCH_MAX:
+                    selection = ("exact", ids, self.index.reconstruct_batch(ids) if len(ids) else None)
+                else:
+                    selection = ("ann", ids, faiss.IDSelectorBatch(ids))
+            elif self.deleted:
+                masked = np.fromiter(self.deleted, dtype=np.int64, count=len(self.deleted))
+                # the inner selector must live as long as the one wrapping it
+                selection = ("ann", masked, faiss.IDSelectorNot(faiss.IDSelectorBatch(masked)))
+            else:
+                selection = ("ann", None, None)
+            if len(self._selections) >= SELECTION_CACHE_SIZE:
+                self._selections.clear()
+            self._selections[key] = selection
+        return selection
+
+    def search(self, vectors, k=3, filters=None):
+        """For each query vector, up to k (score, chunk) pairs, best first."""
+        queries = normalize(vectors, self.dimensions)
+        with self._lock:
+            mode, ids, data = self.selection(filters)
+            if mode == "exact":
+                return self._exact_search(queries, k, ids, data)
+            params = self.search_params(k, data)
+            scores, ids = self.index.search(queries, k, params=params) if params else self.index.search(queries, k)
+            return [
+                [(float(score), self.chunks[chunk_id]) for score, chunk_id in zip(row_scores, row_ids) if chunk_id >= 0]
+                for row_scores, row_ids in zip(scores, ids.tolist())
+            ]
+
+    def _exact_search(self, queries, k, ids, vectors):
+        if not len(ids):
+            return [[] for _ in queries]
+        scores = queries @ vectors.T
+        results = []
+        for row in scores:
+            best = np.argpartition(-row, k - 1)[:k] if len(row) > k else np.arange(len(row))
+            best = best[np.argsort(-row[best])]
+            results.append([(float(row[i]), self.chunks[int(ids[i])]) for i in best])
+        return results
+
+    def save(self, index_dir):
+        """Writes the store to index_dir; processes that may save the same directory hold index_lock(index_dir)."""
+        with self._lock:
+            os.makedirs(index_dir, exist_ok=True)
+            manifest_path = os.path.join(index_dir, MANIFEST_FILE)
+            if os.path.exists(manifest_path):
+                os.remove(manifest_path)
+            # new files are renamed into place: an API process reading the old ones is not disturbed
+            replace_file(os.path.join(index_dir, INDEX_FILE), lambda path: faiss.write_index(self.index, path))
+            write_pickle(os.path.join(index_dir, CHUNKS_FILE), (self.chunks, self.documents, self.postings, self.deleted, self.next_id))
+            # The manifest is written last, so an interrupted save is never mistaken for a valid store
+            write_json(manifest_path, {
+                "settings": self.settings,
+                "kind": self.kind,
+                "version": self.version(),
+                "documents": {name: {k: v for k, v in doc.items() if k != "ids"} for name, doc in self.documents.items()},
+            })
+
+    @classmethod
+    def load(cls, index_dir, embedding_model=None, read_only=False, **search_settings):
+        """The store saved in index_dir, or None if there is none or its vectors come from another embedding model.
+
+        A read_only store (the API's) maps its vectors from the index file, see read_index_shared;
+        documents must not be added to or removed from it.
+        """
+        manifest = read_manifest(index_dir)
+        if manifest is None:
+            return None
+        settings = manifest["settings"]
+        if embedding_model is not None and settings["embedding_model"] != embedding_model:
+            return None
+        store = cls(**settings, **search_settings)
+        store.kind = manifest["kind"]
+        path = os.path.join(index_dir, INDEX_FILE)
+        store.index = read_index_shared(path) if read_only else faiss.read_index(path)
+        store.read_only = read_only
+        if store.kind in ("ivf", "ivfpq"):
+            store.index.set_direct_map_type(faiss.DirectMap.Hashtable)
+        with open(os.path.join(index_dir, CHUNKS_FILE), "rb") as f:
+            store.chunks, store.documents, store.postings, store.deleted, store.next_id = pickle.load(f)
+        return store
+
+
+def read_manifest(index_dir):
+    path = os.path.join(index_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def store_version(index_dir):
+    """Version of the saved store without loading it (for the explanation cache)."""
+    manifest = read_manifest(index_dir)
+    return manifest["version"] if manifest else ""
+
+
+class PolicyVectorStore(VectorStore):
+    """LangChain view of a PolicyStore, so it can stand in for the FAISS store in the RAG chain.
+
+    as_retriever(search_kwargs={"k": 3, "filter": {"document": "policy4.pdf"}}) restricts retrieval.
+    """
+
+    def __init__(self, store, embedding):
+        self.store = store
+        self.embedding = embedding
+
+    @property
+    def embeddings(self):
+        return self.embedding
+
+    def reload(self, index_dir):
+        """Swaps in the store saved in index_dir if it has changed since this one was loaded.
+
+        True if it did. Searches that already started finish on the old store.
+        """
+        if store_version(index_dir) in ("", self.store.version()):
+            return False
+        store = PolicyStore.load(index_dir, self.store.settings["embedding_model"], self.store.read_only)
+        if store is None:
+            return False
+        self.store = store
+        return True
+
+    def similarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        vector = self.embedding.embed_query(query)
+        return [
+            (Document(page_content=chunk["text"], metadata={key: v for key, v in chunk.items() if key != "text"}), score)
+            for score, chunk in self.store.search([vector], k, filter)[0]
+        ]
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def add_texts(self, texts, metadatas=None, **kwargs):
+        raise NotImplementedError("Add whole documents with PolicyStore.add_document or python policy_store.py add")
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, **kwargs):
+        raise NotImplementedError("Build the store with python policy_store.py add")
+
+
+def parse_meta(pairs):
+    meta = {}
+    for pair in pairs or []:
+        key, sep, value = pair.partition("=")
+        if not sep:
+            raise SystemExit(f"--meta expects key=value, got {pair!r}")
+        meta[key] = value
+    return meta
+
+
+def benchmark(chunks, dimensions, index_type, queries=1000, k=3, documents=50, seed=0):
+    """Build time, query latency and recall@k against exact search on clustered synthetic vectors."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((256, dimensions)).astype(np.float32)
+    vectors = centers[rng.integers(0, 256, chunks)] + 0.5 * rng.standard_normal((chunks, dimensions)).astype(np.float32)
+    store = PolicyStore(dimensions, "synthetic", index_type, ann_min_chunks=chunks)
+    start = time.perf_counter()
+    per_document = chunks // documents
+    for d in range(documents):
+        part = vectors[d * per_document:(d + 1) * per_document]
+        store.add_document(
+            f"doc-{d}", [f"chunk {i}" for i in range(len(part))], part,
+            [{"clause": f"{i % 9 + 1}.{i % 7 + 1}"} for i in range(len(part))], unit=f"unit-{d % 5}"
+        )
+    build_s = time.perf_counter() - start
+    exact = faiss.IndexFlatIP(dimensions)
+    exact.add(normalize(vectors[:per_document * documents], dimensions))
+
+    query_vectors = vectors[rng.integers(0, len(vectors), queries)] + 0.3 * rng.standard_normal((queries, dimensions)).astype(np.float32)
+    _, truth = exact.search(normalize(query_vectors, dimensions), k)
+    print(f"{index_type}: {len(store)} chunks x {dimensions} dims in {documents} documents, built in {build_s:.1f}s")
+    for label, filters in (("no filter", None), ("unit filter", {"unit": "unit-1"}), ("document+clause", {"document": "doc-3", "clause": "3"})):
+        latencies, hits = [], 0
+        for query, expected in zip(query_vectors, truth):
+            start = time.perf_counter()
+            results = store.search([query], k, filters)[0]
+            latencies.append(time.perf_counter() - start)
+            if filters is None:
+                found = {int(chunk["text"].split()[1]) + int(chunk["document"].split("-")[1]) * per_document for _, chunk in results}
+                hits += len(found & set(expected.tolist()))
+        latencies.sort()
+        recall = f", recall@{k} {hits / (k * queries):.3f}" if filters is None else ""
+        print(f"  {label:<16} p50 {latencies[len(latencies) // 2] * 1e3:.3f} ms  "
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1e3:.3f} ms{recall}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the multi-document policy vector store")
+    parser.add_argument("--store", default=os.getenv("POLICY_STORE_DIR", "policy_store"))
+    commands = parser.add_subparsers(dest="command", required=True)
+    add = commands.add_parser("add", help="add or replace a policy PDF")
+    add.add_argument("pdf")
+    add.add_argument("--name", help="document name (default: the file name)")
+    add.add_argument("--meta", nargs="*", help="key=value pairs stored on every chunk, usable as filters")
+    add.add_argument("--index", choices=INDEX_TYPES, default="hnsw", help="ANN index of a new store")
+    add.add_argument("--workers", type=int, default=os.cpu_count(), help="page extraction processes")
+    add.add_argument("--batch-size", type=int, default=64, help="chunks per embedding call")
+    remove = commands.add_parser("remove", help="remove a document")
+    remove.add_argument("name")
+    commands.add_parser("list", help="list the documents")
+    search = commands.add_parser("search", help="retrieve chunks for a question")
+    search.add_argument("query")
+    search.add_argument("-k", type=int, default=3)
+    search.add_argument("--document", nargs="*")
+    search.add_argument("--clause")
+    commands.add_parser("rebuild", help="convert to the configured ANN index now and drop removed chunks")
+    bench = commands.add_parser("bench", help="latency and recall on synthetic vectors")
+    bench.add_argument("--chunks", type=int, default=300000)
+    bench.add_argument("--dimensions", type=int, default=384)
+    bench.add_argument("--index", choices=INDEX_TYPES, nargs="*", default=["hnsw", "ivf", "ivfpq"])
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        for index_type in args.index:
+            benchmark(args.chunks, args.dimensions, index_type)
+        raise SystemExit(0)
+
+    from embeddings import embedding_name
+    from rag import load_embedding_model
+    # EMBEDDING_BACKEND picks the model; a hashing store uses the IDF fitted with python embeddings.py <pdfs>
+    embedding = load_embedding_model()
+    embedding_model = embedding_name(embedding)
+    if args.command in ("add", "remove", "rebuild"):
+        # held until exit: a concurrent add/remove would otherwise save over this one's changes
+        lock = ExitStack()
+        lock.enter_context(index_lock(args.store))
+    store = PolicyStore.load(args.store, embedding_model)
+    if store is None and read_manifest(args.store) is not None:
+        raise SystemExit(f"{args.store} was built with another embedding model, remove it or use another --store")
+
+    if args.command == "add":
+        from policy_ingest import ingest_pdf
+        if store is None:
+            store = PolicyStore(len(embedding.embed_query("policy")), embedding_model, args.index)
+        start = time.perf_counter()
+        name = ingest_pdf(store, args.pdf, embedding, args.name, args.workers, args.batch_size, **parse_meta(args.meta))
+        store.save(args.store)
+        print(f"Added {name}: {store.documents[name]['chunks']} chunks in {time.perf_counter() - start:.1f}s, "
+              f"{len(store)} chunks in {len(store.documents)} documents ({store.kind})")
+    elif store is None:
+        raise SystemExit(f"No policy store in {args.store}, add a document first")
+    elif args.command == "remove":
+        store.remove_document(args.name)
+        store.save(args.store)
+        print(f"Removed {args.name}, {len(store)} chunks in {len(store.documents)} documents left")
+    elif args.command == "list":
+        for name, doc in sorted(store.documents.items()):
+            meta = {k: v for k, v in doc.items() if k not in ("ids", "sha256", "chunks", "added_at")}
+            print(f"{name:<32} {doc['chunks']:>7} chunks  added {doc['added_at']}  {meta or ''}")
+    elif args.command == "search":
+        filters = {}
+        if args.document:
+            filters["document"] = args.document
+        if args.clause:
+            filters["clause"] = args.clause
+        for score, chunk in store.search([embedding.embed_query(args.query)], args.k, filters)[0]:
+            print(f"{score:.3f}  {chunk['document']}  clause {chunk.get('clause')}: {chunk['text'][:160]}")
+    elif args.command == "rebuild":
+        store.rebuild()
+        store.save(args.store)
+        print(f"Rebuilt as {store.kind}: {len(store)} chunks")
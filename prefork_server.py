@@ -0,0 +1,203 @@
+import os
+import gc
+import sys
+import time
+import signal
+import socket
+import argparse
+
+# Pre-fork serving: the NER model and the policy vector index are loaded once in this parent
+# process, then N uvicorn workers are forked on one listening socket. The workers share those
+# pages copy-on-write instead of each holding its own copy, so the worker count is bounded by
+# cores rather than memory.
+#
+#   python prefork_server.py --workers 8 --port 8000
+#
+# Only components that hold no threads, sockets or database handles are loaded before the fork:
+# none of those survive it. The audit log, explanation cache and LLM client are opened by each
+# worker's startup as usual. The ONNX engines start their thread pools when the session is
+# created, so with NER_ENGINE=onnx-* the model is loaded in each worker instead. The same goes for
+# the embedding backend of the vector store (an HTTP client for ollama, a session for onnx): it is
+# built on a worker's first query (embeddings.LazyEmbeddings), and if building the index needed it
+# in the parent, it is released before forking. No forward pass runs in the parent either, the
+# workers warm up after forking.
+FORK_SAFE_COMPONENTS = ["ner", "vector_store"]
+
+
+def preload(backend_api):
+    import components
+    # the replica pool starts processes and a reader thread, each worker starts its own
+    in_process_torch = backend_api.NER_ENGINE == "torch" and not backend_api.pool_config
+    names = [name for name in FORK_SAFE_COMPONENTS if not (name == "ner" and not in_process_torch)]
+    for name in names:
+        start = time.perf_counter()
+        try:
+            value = components.registry[name].get()
+            release = getattr(getattr(value, "embeddings", None), "release", None)
+            if release is not None:
+                release()
+        except Exception as e:
+            # the worker will retry on first use, same as without pre-forking
+            print(f"Preloading {name} failed, workers will load it themselves:", e)
+            continue
+        print(f"Preloaded {name} in {time.perf_counter() - start:.1f}s")
+    # Objects that exist now are never collected, so the collector doesn't write to (and unshare)
+    # their pages in the workers
+    gc.collect()
+    gc.freeze()
+
+
+def listen(host, port, backlog=2048):
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app, sock, torch_threads, log_level):
+    import uvicorn
+    if torch_threads:
+        try:
+            import torch
+            torch.set_num_threads(torch_threads)
+        except ImportError:
+            pass
+    config = uvicorn.Config(app, log_level=log_level, timeout_keep_alive=5)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def fork_worker(app, sock, torch_threads, log_level):
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            run_worker(app, sock, torch_threads, log_level)
+        except BaseException:
+            import traceback
+            traceback.print_exc()
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def read_smaps(pid):
+    """Memory of one process in bytes: rss, pss, shared and private, from /proc/<pid>/smaps_rollup."""
+    fields = {"Rss": 0, "Pss": 0, "Shared_Clean": 0, "Shared_Dirty": 0, "Private_Clean": 0, "Private_Dirty": 0}
+    path = f"/proc/{pid}/smaps_rollup"
+    if not os.path.exists(path):
+        # kernels before 4.14: sum the per-mapping entries
+        path = f"/proc/{pid}/smaps"
+    with open(path) as f:
+        for line in f:
+            name, _, rest = line.partition(":")
+            if name in fields:
+                fields[name] += int(rest.split()[0]) * 1024
+    return {
+        "rss": fields["Rss"],
+        "pss": fields["Pss"],
+        "shared": fields["Shared_Clean"] + fields["Shared_Dirty"],
+        "private": fields["Private_Clean"] + fields["Private_Dirty"],
+    }
+
+
+def memory_report(pids):
+    """Prints per-process memory and the total saved by sharing, which is sum(RSS) - sum(PSS):
+    RSS counts every shared page in full for every process, PSS splits it between them."""
+    mb = 1024 * 1024
+    rows = []
+    for role, pid in pids:
+        try:
+            rows.append((role, pid, read_smaps(pid)))
+        except (OSError, ValueError) as e:
+            print(f"Cannot read memory of {role} {pid}: {e}")
+    if not rows:
+        return None
+    print(f"\n{'process':<10} {'pid':>7} {'RSS MB':>9} {'PSS MB':>9} {'shared MB':>10} {'private MB':>11}")
+    for role, pid, mem in rows:
+        print(f"{role:<10} {pid:>7} {mem['rss'] / mb:>9.1f} {mem['pss'] / mb:>9.1f} {mem['shared'] / mb:>10.1f} {mem['private'] / mb:>11.1f}")
+    total_rss = sum(mem["rss"] for _, _, mem in rows)
+    total_pss = sum(mem["pss"] for _, _, mem in rows)
+    print(f"Sum of RSS (as if nothing were shared): {total_rss / mb:.1f} MB")
+    print(f"Sum of PSS (actual footprint):          {total_pss / mb:.1f} MB")
+    print(f"Saved by copy-on-write sharing:         {(total_rss - total_pss) / mb:.1f} MB\n")
+    return {"rss": total_rss, "pss": total_pss, "saved": total_rss - total_pss}
+
+
+def serve(workers, host, port, torch_threads=None, report_after=60.0, log_level="info"):
+    import backend_api
+    if backend_api.pool_config and workers > 1:
+        # every worker would start its own replicas, all pinned to the same cores
+        sys.exit(f"NER_POOL={backend_api.NER_POOL} already uses every core, run it with --workers 1 "
+                 "or set NER_POOL=off to pre-fork several workers")
+    preload(backend_api)
+    sock = listen(host, port)
+    if torch_threads is None:
+        # one worker per core by default, so each worker gets its share of the cores
+        torch_threads = max(1, (os.cpu_count() or 1) // workers)
+
+    children = {}
+    for _ in range(workers):
+        pid = fork_worker(backend_api.app, sock, torch_threads, log_level)
+        children[pid] = time.monotonic()
+    print(f"Serving on {host}:{port} with {workers} workers ({torch_threads} torch threads each), pids {list(children)}")
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def report(signum=None, frame=None):
+        memory_report([("parent", os.getpid())] + [("worker", pid) for pid in children])
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    # kill -USR1 <parent pid> prints the memory report again
+    signal.signal(signal.SIGUSR1, report)
+    report_at = time.monotonic() + report_after if report_after else None
+
+    while children:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            if report_at is not None and time.monotonic() >= report_at:
+                report_at = None
+                report()
+            time.sleep(0.5)
+            continue
+        started = children.pop(pid, None)
+        if started is None or stopping:
+            continue
+        code = os.waitstatus_to_exitcode(status)
+        print(f"Worker {pid} exited with {code}, starting a new one")
+        if time.monotonic() - started < 5:
+            # crashing right away, don't spin
+            time.sleep(5)
+        children[fork_worker(backend_api.app, sock, torch_threads, log_level)] = time.monotonic()
+    sock.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve backend_api with pre-forked workers sharing the loaded models")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--torch-threads", type=int, default=None, help="intra-op threads per worker (default: cores / workers)")
+    parser.add_argument("--report-after", type=float, default=60.0, help="seconds until the memory report (0 to disable)")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+    if not hasattr(os, "fork"):
+        sys.exit("prefork_server.py needs os.fork (Linux/macOS), use uvicorn directly on this platform")
+    serve(args.workers, args.host, args.port, args.torch_threads, args.report_after, args.log_level)
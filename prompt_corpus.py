@@ -0,0 +1,136 @@
+import json
+import random
+import argparse
+from collections import Counter
+import sg_dataset_full as sg
+
+# Synthetic /scan traffic for load_test.py, built from the sg_dataset_full value generators.
+# Prompts mix lengths (one line up to documents longer than one NER window), entity densities and
+# clean prompts without anything sensitive, in the proportions set in LENGTHS and DENSITIES:
+#
+#   python prompt_corpus.py --count 2000 --output prompts.jsonl
+#
+# Each line is {"id", "text", "labels", "length", "density"}: the same shape /scan/batch accepts,
+# plus the entity labels put into the prompt and its length and density class.
+
+# (label, value generator, sentence templates)
+ENTITY_SENTENCES = [
+    ("NRIC", sg.gen_nric, ["Client NRIC is {}.", "Please update the record for NRIC {} before Friday."]),
+    ("FIN", sg.gen_fin, ["The client's FIN is {}.", "Work pass holder FIN {} needs a new contract."]),
+    ("PASSPORT", sg.gen_passport, ["Passport number {} must be protected.", "Book the flight under passport {}."]),
+    ("API_KEY", sg.gen_api_key, ["Here is an API key: {}.", "Set OPENAI_KEY={} in the staging config."]),
+    ("ACCESS_TOKEN", sg.gen_access_token, ["Access token {} must not leave secure channels.", "Use bearer {} for the call."]),
+    ("SALARY", sg.gen_money, ["Salary is {}.", "Her new monthly salary will be {}."]),
+    ("COMMISSION_RATE", sg.gen_percent, ["Our commission rate is {}.", "Agents get {} on renewals."]),
+    ("BUDGET", sg.gen_money, ["Budget for FY25 is {}.", "Marketing asked for a budget of {} next quarter."]),
+    ("INVOICE_ID", sg.gen_invoice, ["Invoice {} should not leave the company.", "Can you chase payment for {}?"]),
+    ("PO_NUMBER", sg.gen_po, ["PO number: {}", "The supplier quoted {} on the delivery order."]),
+    ("FINANCIAL_REPORT", sg.gen_finreport, ["Please don't share the {}.", "Summarise the {} for the board."]),
+    ("PROJECT_CODE", sg.gen_project, ["The project codename is {}.", "{} launches in three weeks."]),
+    ("SOURCE_CODE", sg.gen_source_snip, ["Do not paste source code like: {}", "Why does this fail: {}"]),
+    ("EMAIL", sg.gen_email, ["Contact me at {}", "Forward the deck to {} today."]),
+    ("PHONE", sg.gen_phone, ["My phone number is {}", "Call the vendor on {} after lunch."]),
+    ("SSN", sg.gen_ssn, ["Employee SSN: {}", "The US hire's SSN is {}."]),
+    ("CREDIT_CARD", sg.gen_credit_card, ["Credit card: {}", "Charge the corporate card {} for the licence."]),
+    ("ACCOUNT_NUMBER", sg.gen_account_number, ["The client account number is {}.", "Transfer the refund to account {}."]),
+    ("PERSON", sg.gen_person, ["My name is {}.", "{} will take over the account from Monday."]),
+    ("KEY", sg.gen_key, ["Here is a key: {}", "The licence key {} expires soon."]),
+    ("FINANCIAL", sg.gen_financial, ["The Q2 revenue was {}.", "We closed the year at {} in sales."]),
+]
+
+CLEAN_SENTENCES = [
+    "Let's schedule a meeting tomorrow at 3pm.",
+    "The weather in Singapore is sunny.",
+    "Please review the public documentation.",
+    "Can we discuss the UI colors?",
+    "Reminder: submit your timesheet.",
+    "Our product is great.",
+    "This is a general statement.",
+    "Can you rewrite this paragraph so it sounds more formal?",
+    "Summarise the main points of the attached article in three bullet points.",
+    "What is the difference between a list and a tuple in Python?",
+    "Draft a friendly reply thanking the team for their help this week.",
+    "Suggest a title for a blog post about remote work.",
+    "The quarterly town hall will be held in the main auditorium.",
+    "Please translate the following sentence into Malay.",
+    "How do I set up a recurring reminder in my calendar?",
+    "Give me five ideas for a team building activity.",
+    "Explain how a hash map works to a new graduate.",
+    "The office will be closed on the public holiday.",
+]
+
+# name: (share of prompts, sentence count range)
+LENGTHS = {
+    "short": (0.55, (1, 2)),
+    "medium": (0.30, (3, 8)),
+    "long": (0.12, (10, 30)),
+    # longer than one 512-token NER window, scanned as overlapping windows
+    "document": (0.03, (60, 120)),
+}
+# name: (share of prompts, share of sentences that carry an entity)
+DENSITIES = {
+    "clean": (0.40, 0.0),
+    "sparse": (0.35, 0.15),
+    "dense": (0.25, 0.6),
+}
+
+
+def pick(rng, table):
+    names = list(table)
+    return rng.choices(names, weights=[table[name][0] for name in names])[0]
+
+
+def make_prompt(rng, length, density):
+    low, high = LENGTHS[length][1]
+    n_sentences = rng.randint(low, high)
+    entity_share = DENSITIES[density][1]
+    sentences, labels = [], []
+    for _ in range(n_sentences):
+        if entity_share and rng.random() < entity_share:
+            label, generate, templates = rng.choice(ENTITY_SENTENCES)
+            sentences.append(rng.choice(templates).format(generate()))
+            labels.append(label)
+        else:
+            sentences.append(rng.choice(CLEAN_SENTENCES))
+    if entity_share and not labels:
+        # a non-clean prompt has at least one entity
+        label, generate, templates = rng.choice(ENTITY_SENTENCES)
+        sentences[rng.randrange(len(sentences))] = rng.choice(templates).format(generate())
+        labels.append(label)
+    return " ".join(sentences), labels
+
+
+def make_corpus(count, seed=0):
+    rng = random.Random(seed)
+    # the generators use the global random module
+    sg.random.seed(seed)
+    corpus = []
+    for i in range(count):
+        length, density = pick(rng, LENGTHS), pick(rng, DENSITIES)
+        text, labels = make_prompt(rng, length, density)
+        corpus.append({"id": str(i), "text": text, "labels": labels, "length": length, "density": density})
+    return corpus
+
+
+def load_corpus(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic prompt corpus for load_test.py")
+    parser.add_argument("--count", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="prompts.jsonl")
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.count, args.seed)
+    with open(args.output, "w") as f:
+        for item in corpus:
+            f.write(json.dumps(item) + "\n")
+    lengths = Counter(item["length"] for item in corpus)
+    densities = Counter(item["density"] for item in corpus)
+    chars = sorted(len(item["text"]) for item in corpus)
+    print(f"Wrote {len(corpus)} prompts to {args.output}")
+    print("length:", dict(lengths), " density:", dict(densities))
+    print(f"characters: median {chars[len(chars) // 2]}, p95 {chars[int(len(chars) * 0.95)]}, max {chars[-1]}")
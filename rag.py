@@ -1,115 +1,166 @@
 import os
-import re
-import sqlite3
-from datetime import datetime
-from pypdf import PdfReader
+import time
+import asyncio
+import threading
+import httpx
 from langchain_community.vectorstores import FAISS
-from langchain_ollama import OllamaEmbeddings, OllamaLLM
+from langchain_ollama import OllamaLLM
 from langchain.schema import Document
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
+from langchain_core.runnables import RunnablePassthrough, RunnableLambda
+from langchain_core.callbacks import BaseCallbackHandler
 from dotenv import load_dotenv
+from audit_log import AuditLogger, prepare_audit_db, term_pattern
+from explanation_cache import ExplanationCache, normalize_question, policy_version
+from policy_index import load_vector_store, build_vector_store, sha256_file, index_lock
+from policy_store import PolicyStore, PolicyVectorStore, store_version
+from policy_ingest import extract_pages, clause_chunks
+from embeddings import load_embeddings, embedding_name
+from hybrid_retrieval import HybridRetriever, ContextCompressor, prompt_tokens
+from components import register
+from circuit_breaker import CircuitBreaker
+import metrics
+from functools import lru_cache
 
 load_dotenv()
 
+# Ollama connection settings. Each client keeps a pool of keep-alive connections
+# that every request reuses, and every call is bounded by a timeout.
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+OLLAMA_TIMEOUT_S = float(os.getenv("OLLAMA_TIMEOUT_S", "60"))
+OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "8"))
+# How many explanations may be generated at the same time
+RAG_MAX_CONCURRENCY = int(os.getenv("RAG_MAX_CONCURRENCY", "4"))
+# After this many consecutive failed or timed out generations the LLM gets no work for LLM_BREAKER_RESET_S
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET_S = float(os.getenv("LLM_BREAKER_RESET_S", "30"))
+llm_breaker = CircuitBreaker("llm", failure_threshold=LLM_BREAKER_FAILURES, reset_timeout_s=LLM_BREAKER_RESET_S)
+
+ollama_client_kwargs = {
+    "timeout": OLLAMA_TIMEOUT_S,
+    "limits": httpx.Limits(
+        max_connections=OLLAMA_MAX_CONNECTIONS,
+        max_keepalive_connections=OLLAMA_MAX_CONNECTIONS,
+    ),
+}
+
 DB_PATH = "sensitive_data_log.db"
-conn = sqlite3.connect(DB_PATH)
-cursor = conn.cursor()
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS flagged_data (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    data_type TEXT NOT NULL,
-    count INTEGER DEFAULT 1,
-    last_flagged TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-)
-""")
-conn.commit()
-conn.close()
-
-def log_flagged_data(data_type: str):
-    """Logs the sensitive data attempt in the database."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT count FROM flagged_data WHERE data_type = ?", (data_type,))
-    result = cursor.fetchone()
-    
-    if result:
-        new_count = result[0] + 1
-        cursor.execute("""
-            UPDATE flagged_data
-            SET count = ?, last_flagged = CURRENT_TIMESTAMP
-            WHERE data_type = ?
-        """, (new_count, data_type))
-    else:
-        cursor.execute("INSERT INTO flagged_data (data_type) VALUES (?)", (data_type,))
-    
-    conn.commit()
-    conn.close()
+# Flagged terms are counted in memory and written to flagged_data in batches by a background thread
+AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+AUDIT_FLUSH_INTERVAL_S = float(os.getenv("AUDIT_FLUSH_INTERVAL_S", "1.0"))
 
-#read pdf 
-PDF_PATH = "policy4.pdf"
-pdf_reader = PdfReader(PDF_PATH)
+def open_audit_log():
+    prepare_audit_db(DB_PATH)
+    return AuditLogger(DB_PATH, max_queue=AUDIT_QUEUE_SIZE, flush_interval_s=AUDIT_FLUSH_INTERVAL_S)
 
-raw_text = ""
-for page in pdf_reader.pages:
-    page_text = page.extract_text()
-    raw_text += page_text
+audit_db = register("audit_db", open_audit_log)
 
-#clean text
-def clean_extracted_text(text: str) -> str:
-    cleaned = re.sub(r'\s+', ' ', text)
-    cleaned = re.sub(r'[\x00-\x1F\x7F]', '', cleaned)
-    return cleaned.strip()
+def log_flagged_data(data_type: str, user: str = None):
+    """Logs the sensitive data attempt in the database (asynchronously, see audit_log.py)."""
+    audit_db.get().record(data_type, user)
 
-document_text = clean_extracted_text(raw_text)
+def close_audit_log():
+    if audit_db.ready:
+        audit_db.get().close()
 
-#split text into chunks
+#read pdf 
+PDF_PATH = "policy4.pdf"
+# The embedded chunks are persisted here and only rebuilt when the PDF, chunking or embedding model changes
+POLICY_INDEX_DIR = os.getenv("POLICY_INDEX_DIR", "policy_index")
+# When set, explanations are retrieved from the multi-document store built with policy_store.py
+# instead, optionally only from the comma-separated POLICY_STORE_DOCUMENTS
+POLICY_STORE_DIR = os.getenv("POLICY_STORE_DIR")
+POLICY_STORE_DOCUMENTS = [name for name in os.getenv("POLICY_STORE_DOCUMENTS", "").split(",") if name]
+# How often a running API checks whether policy_store.py add/remove changed the store (0 = never)
+POLICY_STORE_RELOAD_S = float(os.getenv("POLICY_STORE_RELOAD_S", "30"))
+
+#split text into chunks, one policy clause per chunk where it fits
 chunk_size = 1000
 chunk_overlap = 200
 
-text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=chunk_size,
-    chunk_overlap=chunk_overlap,
-    length_function=len,
-    separators=["\n\n", "\n", ". ", " ", ""]
-)
-text_chunks = text_splitter.split_text(document_text)
-
-#embedding
-embedding_model = OllamaEmbeddings(model="llama3.1")
-
-documents = []
-for i, chunk in enumerate(text_chunks):
-    doc = Document(
-        page_content=chunk,
-        metadata={
-            "chunk_id": i,
-            "chunk_length": len(chunk),
-            "source": "pdf_document"
-        }
+def load_policy_documents():
+    documents = []
+    for i, (chunk, metadata) in enumerate(clause_chunks(extract_pages(PDF_PATH), chunk_size, chunk_overlap)):
+        doc = Document(
+            page_content=chunk,
+            metadata={
+                "chunk_id": i,
+                "chunk_length": len(chunk),
+                "source": "pdf_document",
+                **metadata
+            }
+        )
+        documents.append(doc)
+    return documents
+
+LLM_MODEL = "llama3.1"
+# What embeds the chunks and every question: "ollama" (LLM_MODEL itself), "hashing" (hashed TF-IDF,
+# IDF fitted on the policy chunks and kept in EMBEDDING_IDF_PATH) or "onnx" (the sentence encoder
+# exported to EMBEDDING_MODEL_DIR), see embeddings.py
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "ollama")
+EMBEDDING_MODEL_DIR = os.getenv("EMBEDDING_MODEL_DIR", "minilm-onnx")
+EMBEDDING_IDF_PATH = os.getenv("EMBEDDING_IDF_PATH", "embedding_idf.npy")
+WARMUP_QUESTION = "Why is NRIC like 'S1234567A' sensitive?"
+
+@lru_cache(maxsize=1)
+def policy_pdf_hash():
+    return sha256_file(PDF_PATH)
+
+def policy_content_hash():
+    return store_version(POLICY_STORE_DIR) if POLICY_STORE_DIR else policy_pdf_hash()
+
+def load_embedding_model(fit_texts=None, corpus=None):
+    return load_embeddings(
+        EMBEDDING_BACKEND, ollama_model=LLM_MODEL, ollama_base_url=OLLAMA_BASE_URL, client_kwargs=ollama_client_kwargs,
+        model_dir=EMBEDDING_MODEL_DIR, idf_path=EMBEDDING_IDF_PATH, fit_texts=fit_texts, corpus=corpus
     )
-    documents.append(doc)
 
 #vector store
-vector_store = FAISS.from_documents(
-    documents=documents,
-    embedding=embedding_model
-)
+def load_policy_vector_store():
+    #embedding
+    if POLICY_STORE_DIR:
+        # the store's IDF must be fitted on all its documents: python embeddings.py <pdfs>
+        embedding_model = load_embedding_model()
+        store = PolicyStore.load(POLICY_STORE_DIR, embedding_name(embedding_model), read_only=True)
+        if store is None:
+            raise RuntimeError(
+                f"No policy store for {embedding_name(embedding_model)} in {POLICY_STORE_DIR}, "
+                "add documents with: python policy_store.py add <pdf>"
+            )
+        return PolicyVectorStore(store, embedding_model)
+    # the IDF is refitted when the PDF it was fitted on changed
+    embedding_model = load_embedding_model(
+        lambda: [doc.page_content for doc in load_policy_documents()], corpus=policy_pdf_hash()
+    )
+    index_settings = {
+        "pdf_sha256": policy_pdf_hash(),
+        "chunker": "clause",
+        "chunk_size": chunk_size,
+        "chunk_overlap": chunk_overlap,
+        "embedding_model": embedding_name(embedding_model),
+    }
+    vector_store = load_vector_store(POLICY_INDEX_DIR, embedding_model, index_settings)
+    if vector_store is None:
+        with index_lock(POLICY_INDEX_DIR):
+            # another worker may have rebuilt the index while this one waited for the lock
+            vector_store = load_vector_store(POLICY_INDEX_DIR, embedding_model, index_settings)
+            if vector_store is None:
+                vector_store = build_vector_store(POLICY_INDEX_DIR, load_policy_documents(), embedding_model, index_settings)
+    return vector_store
 
-#retriever
-retriever = vector_store.as_retriever(search_kwargs={"k": 3})
+def warm_up_vector_store(store):
+    # the first query makes Ollama (or onnxruntime) load the embedding model
+    store.similarity_search(WARMUP_QUESTION, k=3)
 
-def format_docs(docs):
-    return "\n\n".join(doc.page_content for doc in docs)
+vector_store = register("vector_store", load_policy_vector_store, warm_up_vector_store)
 
-#llm model 
-llm = OllamaLLM(
-    model="llama3.1",
-    temperature=0.0
-)
+# Retrieval blends BM25 (weight HYBRID_LEXICAL_WEIGHT, 0 = vector only) with vector scores over the
+# best RETRIEVAL_CANDIDATES chunks of each; the retrieved chunks are then cut down to their most
+# relevant sentences, about CONTEXT_TOKEN_BUDGET tokens in all (0 = whole chunks). See hybrid_retrieval.py
+HYBRID_LEXICAL_WEIGHT = float(os.getenv("HYBRID_LEXICAL_WEIGHT", "0.6"))
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "20"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "160"))
 
 system_prompt = """
 You are a compliance assistant for business employees handling sensitive company and customer data. Your job is to explain, using only the provided policy context, whether sharing a specific piece of information is allowed, and why.
@@ -133,15 +184,83 @@ Answer based on the context above:
 prompt_template = ChatPromptTemplate.from_template(system_prompt)
 
 
-rag_chain = (
-    {
-        "context": retriever | format_docs,
-        "input": RunnablePassthrough()
-    }
-    | prompt_template
-    | llm
-    | StrOutputParser()
-)
+class StageTimer(BaseCallbackHandler):
+    """Records retrieval and LLM generation time of every chain run in the stage histogram, and the
+    prompt size Ollama reports."""
+
+    # called directly from the chain, not via an executor
+    run_inline = True
+
+    def __init__(self):
+        self._started = {}
+
+    def _start(self, run_id):
+        self._started[run_id] = time.perf_counter()
+
+    def _end(self, run_id, stage):
+        start = self._started.pop(run_id, None)
+        if start is not None:
+            metrics.stage_seconds.observe(time.perf_counter() - start, stage=stage)
+
+    def on_retriever_start(self, serialized, query, *, run_id, **kwargs):
+        self._start(run_id)
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        self._end(run_id, "retrieval")
+
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        self._started.pop(run_id, None)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._end(run_id, "llm_generation")
+        for generations in response.generations:
+            for generation in generations:
+                count = (generation.generation_info or {}).get("prompt_eval_count")
+                if count is not None:
+                    prompt_tokens.observe(count)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._started.pop(run_id, None)
+
+def build_rag_chain():
+    #retriever
+    search_kwargs = {"k": 3}
+    if POLICY_STORE_DIR and POLICY_STORE_DOCUMENTS:
+        search_kwargs["filter"] = {"document": POLICY_STORE_DOCUMENTS}
+    retriever = HybridRetriever.from_vector_store(
+        vector_store.get(),
+        candidates=RETRIEVAL_CANDIDATES,
+        lexical_weight=HYBRID_LEXICAL_WEIGHT,
+        **search_kwargs
+    )
+    compressor = ContextCompressor(retriever, CONTEXT_TOKEN_BUDGET)
+
+    #llm model 
+    llm = OllamaLLM(
+        model=LLM_MODEL,
+        temperature=0.0,
+        base_url=OLLAMA_BASE_URL,
+        client_kwargs=ollama_client_kwargs
+    )
+
+    return (
+        {
+            "context": {"docs": retriever, "question": RunnablePassthrough()} | RunnableLambda(compressor),
+            "input": RunnablePassthrough()
+        }
+        | prompt_template
+        | llm
+        | StrOutputParser()
+    ).with_config(callbacks=[StageTimer()])
+
+def warm_up_rag_chain(chain):
+    # the first generation makes Ollama load llama3.1 into memory
+    chain.invoke(WARMUP_QUESTION)
+
+rag_chain = register("rag_chain", build_rag_chain, warm_up_rag_chain)
 
 sensitive_terms = [
     "NRIC", "FIN", "PASSPORT",  # Personal Identifiers
@@ -153,18 +272,160 @@ sensitive_terms = [
 ]
 
 
+# Explanations depend on the entity type far more than on the literal values, so they are cached
+# per normalized question. Changing the policy PDF, prompt or model invalidates every entry.
+EXPLANATION_CACHE_DB = os.getenv("EXPLANATION_CACHE_DB", "explanation_cache.db")
+EXPLANATION_CACHE_SIZE = int(os.getenv("EXPLANATION_CACHE_SIZE", "512"))
+EXPLANATION_CACHE_TTL_S = float(os.getenv("EXPLANATION_CACHE_TTL_S", str(7 * 24 * 3600)))
+
+def explanation_version():
+    return policy_version(
+        policy_content_hash(), system_prompt, LLM_MODEL,
+        f"{EMBEDDING_BACKEND}:{HYBRID_LEXICAL_WEIGHT}:{RETRIEVAL_CANDIDATES}:{CONTEXT_TOKEN_BUDGET}"
+    )
+
+def open_explanation_cache():
+    return ExplanationCache(
+        EXPLANATION_CACHE_DB,
+        explanation_version(),
+        max_entries=EXPLANATION_CACHE_SIZE,
+        ttl_s=EXPLANATION_CACHE_TTL_S
+    )
+
+explanation_cache = register("explanation_cache", open_explanation_cache)
+
+policy_store_checked_at = time.monotonic()
+policy_store_reload_lock = threading.Lock()
+
+def policy_store_due():
+    return bool(POLICY_STORE_DIR) and POLICY_STORE_RELOAD_S > 0 \
+        and time.monotonic() - policy_store_checked_at >= POLICY_STORE_RELOAD_S
+
+def reload_policy_store():
+    """Picks up documents added to or removed from POLICY_STORE_DIR since the store was loaded.
+
+    The new store replaces the old one for the following questions (the retriever rebuilds its
+    BM25 corpus on its own) and the explanations cached under the old version are dropped.
+    """
+    global policy_store_checked_at
+    # one thread checks, the others keep answering from the current store meanwhile
+    if not policy_store_due() or not policy_store_reload_lock.acquire(blocking=False):
+        return
+    try:
+        policy_store_checked_at = time.monotonic()
+        if not vector_store.ready or not vector_store.get().reload(POLICY_STORE_DIR):
+            return
+        print(f"Reloaded the policy store in {POLICY_STORE_DIR}: {len(vector_store.get().store)} chunks")
+        if explanation_cache.ready:
+            explanation_cache.get().set_version(explanation_version())
+    except Exception as e:
+        # a half-written store is picked up on the next check
+        print("Reloading the policy store failed:", e)
+    finally:
+        policy_store_reload_lock.release()
+
+
+sensitive_terms_pattern = term_pattern(sensitive_terms)
+sensitive_terms_by_name = {term.lower(): term for term in sensitive_terms}
+
+def log_question_terms(question: str, user: str = None, spans=None):
+    # Whole-word matches only and the values are ignored, each term is counted once per question
+    with metrics.stage("audit_log"):
+        found = {match.lower() for match in sensitive_terms_pattern.findall(normalize_question(question, spans))}
+        for term in found:
+            log_flagged_data(sensitive_terms_by_name[term], user)
+
 #query function 
-def ask_document_question(question: str):
-    for term in sensitive_terms:
-        if term.lower() in question.lower():
-            log_flagged_data(term)
+def ask_document_question(question: str, user: str = None, spans=None):
+    """Answers question; spans are the (start, end) offsets of the entity values in it, if known."""
+    reload_policy_store()
+    log_question_terms(question, user, spans)
     
-    # Get answer from RAG
-    response = rag_chain.invoke(question)
+    cache = explanation_cache.get()
+    key = normalize_question(question, spans)
+    response = cache.get(key)
+    if response is None:
+        # Get answer from RAG
+        chain = rag_chain.get()
+        with llm_breaker.call():
+            response = chain.invoke(question)
+        cache.put(key, response)
     return response
 
+def stream_document_question(question: str, user: str = None, spans=None):
+    """Same as ask_document_question, but yields the answer chunk by chunk as the LLM produces it."""
+    reload_policy_store()
+    log_question_terms(question, user, spans)
+
+    cache = explanation_cache.get()
+    key = normalize_question(question, spans)
+    cached = cache.get(key)
+    if cached is not None:
+        yield cached
+        return
+    chunks = []
+    chain = rag_chain.get()
+    with llm_breaker.call():
+        for chunk in chain.stream(question):
+            chunks.append(chunk)
+            yield chunk
+    cache.put(key, "".join(chunks))
+
+rag_semaphore = asyncio.Semaphore(RAG_MAX_CONCURRENCY)
+
+async def aask_document_question(question: str, timeout: float = OLLAMA_TIMEOUT_S, user: str = None, spans=None):
+    """Async ask_document_question: at most RAG_MAX_CONCURRENCY run at once, each bounded by timeout."""
+    if policy_store_due():
+        await asyncio.to_thread(reload_policy_store)
+    await asyncio.to_thread(log_question_terms, question, user, spans)
+
+    async def generate():
+        chain = await rag_chain.aget()
+        async with rag_semaphore:
+            with llm_breaker.call():
+                return await asyncio.wait_for(chain.ainvoke(question), timeout)
+
+    cache = await explanation_cache.aget()
+    return await cache.aget_or_compute(normalize_question(question, spans), generate)
+
+async def astream_document_question(question: str, timeout: float = OLLAMA_TIMEOUT_S, user: str = None, spans=None):
+    """Async stream_document_question; gives up if the LLM is silent for longer than timeout."""
+    if policy_store_due():
+        await asyncio.to_thread(reload_policy_store)
+    await asyncio.to_thread(log_question_terms, question, user, spans)
+
+    cache = await explanation_cache.aget()
+    key = normalize_question(question, spans)
+    cached = await cache.aget(key)
+    if cached is None and cache.inflight(key) is not None:
+        # Someone is already generating this explanation, wait for it instead of asking again
+        cached = await asyncio.shield(cache.inflight(key))
+    if cached is not None:
+        yield cached
+        return
+
+    cache.claim(key)
+    parts = []
+    try:
+        chain = await rag_chain.aget()
+        async with rag_semaphore:
+            with llm_breaker.call():
+                chunks = chain.astream(question).__aiter__()
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), timeout)
+                    except StopAsyncIteration:
+                        break
+                    parts.append(chunk)
+                    yield chunk
+    except BaseException as e:
+        cache.fail(key, e if isinstance(e, Exception) else RuntimeError("explanation was cancelled"))
+        raise
+    await cache.resolve(key, "".join(parts))
+
 
 if __name__ == "__main__":
+    rag_chain.get()
     print("PDF RAG system loaded. Ask your question about sensitive data!")
     while True:
         user_question = input("\nEnter your question (or type 'exit' to quit): ")
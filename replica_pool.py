@@ -0,0 +1,329 @@
+import os
+import time
+import queue
+import argparse
+import itertools
+import threading
+import multiprocessing as mp
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+# NER replica pool: N copies of the model, each in its own process pinned to its own cores with a
+# fixed number of intra-op threads. Without it every concurrent forward pass uses torch's default
+# thread count (all cores), so under load the passes fight over the same cores and latency jumps.
+# With the pool each core runs one model thread, and adding cores adds replicas.
+#
+# Two profiles, the product replicas x threads is the number of cores either way:
+#   latency     few replicas with several threads each, a single request finishes fastest
+#   throughput  one single-threaded replica per core, the most requests per second
+PROFILES = ("latency", "throughput")
+LATENCY_THREADS = 4
+# a replica that fails to load this many times in a row is not restarted again
+MAX_FAILED_STARTS = 3
+
+
+def available_cores():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def resolve_config(profile, replicas=None, threads=None):
+    """Returns {"replicas", "threads"} for the profile; explicit values win over the profile's defaults."""
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown replica pool profile {profile!r}, expected one of {', '.join(PROFILES)}")
+    cores = len(available_cores())
+    if replicas and not threads:
+        threads = max(1, cores // replicas)
+    elif threads and not replicas:
+        replicas = max(1, cores // threads)
+    elif not replicas and not threads:
+        threads = min(cores, LATENCY_THREADS) if profile == "latency" else 1
+        replicas = max(1, cores // threads)
+    return {"replicas": replicas, "threads": threads}
+
+
+def core_sets(replicas, threads):
+    """Consecutive cores for each replica; wraps around when replicas x threads exceeds the cores available."""
+    cores = available_cores()
+    return [sorted({cores[(i * threads + j) % len(cores)] for j in range(threads)}) for i in range(replicas)]
+
+
+def replica_main(index, engine_name, model_dir, onnx_dir, cores, threads, warmup_texts, requests, results, current):
+    # Thread counts are read when the runtimes initialize, so they are set before importing them
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["MKL_NUM_THREADS"] = str(threads)
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    try:
+        if engine_name == "torch":
+            import torch
+            torch.set_num_threads(threads)
+            torch.set_num_interop_threads(1)
+        from ner_engine import load_ner_engine
+        engine = load_ner_engine(engine_name, model_dir, onnx_dir, num_threads=threads)
+        if warmup_texts:
+            engine.spans(warmup_texts[:1])
+            engine.spans(warmup_texts)
+    except Exception as e:
+        results.put((None, index, "failed", repr(e)))
+        return
+    results.put((None, index, "ready", os.getpid()))
+
+    while True:
+        item = requests.get()
+        if item is None:
+            break
+        request_id, texts = item
+        # acknowledged in shared memory, not on the results queue: if this process dies, the pool
+        # knows which request it had taken even when the message would not have been flushed
+        current[index] = request_id
+        try:
+            results.put((request_id, index, "ok", engine.spans(texts)))
+        except Exception as e:
+            results.put((request_id, index, "error", repr(e)))
+
+
+class ReplicaPool:
+    """Runs NEREngine.spans in replica processes. Replicas take requests from one shared queue,
+    so a batch goes to whichever replica is free first.
+
+    spans() blocks until the batch is done, like the in-process engines, and the pool has the same
+    tokenizer attribute, so it can stand in for an engine behind NERBatcher. Run as many batches
+    at once as there are replicas (NERBatcher's max_concurrent_batches), more would only queue here.
+    A batch that gets no result within request_timeout_s fails with TimeoutError, so a request lost
+    with its replica never holds a batcher slot forever.
+    """
+
+    def __init__(self, engine, model_dir="modelv1", onnx_dir="modelv1-onnx", replicas=1, threads=1,
+                 warmup_texts=(), start_timeout_s=600.0, request_timeout_s=60.0):
+        from transformers import AutoTokenizer
+        self.engine = engine
+        self.model_dir = model_dir
+        self.onnx_dir = onnx_dir
+        self.replicas = replicas
+        self.threads = threads
+        self.warmup_texts = list(warmup_texts)
+        self.request_timeout_s = request_timeout_s
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir if engine == "torch" else onnx_dir)
+        # spawn, not fork: a forked child would inherit the parent's threads and runtime state
+        self._context = mp.get_context("spawn")
+        self._requests = self._context.Queue()
+        self._results = self._context.Queue()
+        self._cores = core_sets(replicas, threads)
+        self._processes = [None] * replicas
+        # id of the request each replica took last, -1 for none
+        self._current = self._context.Array("q", [-1] * replicas, lock=False)
+        self._futures = {}
+        # consecutive failed starts per replica, and the replicas given up on after MAX_FAILED_STARTS
+        self._failed_starts = [0] * replicas
+        self._given_up = set()
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._closed = False
+
+        for index in range(replicas):
+            self._start(index)
+        try:
+            self._wait_ready(range(replicas), start_timeout_s)
+        except Exception:
+            self.close()
+            raise
+        self._reader = threading.Thread(target=self._read_results, name="ner-replica-results", daemon=True)
+        self._reader.start()
+
+    def _start(self, index):
+        process = self._context.Process(
+            target=replica_main,
+            args=(index, self.engine, self.model_dir, self.onnx_dir, self._cores[index], self.threads,
+                  self.warmup_texts, self._requests, self._results, self._current),
+            name=f"ner-replica-{index}",
+            daemon=True
+        )
+        process.start()
+        self._processes[index] = process
+
+    def _wait_ready(self, indexes, timeout):
+        waiting = set(indexes)
+        deadline = time.monotonic() + timeout
+        while waiting:
+            try:
+                _, index, status, detail = self._results.get(timeout=max(deadline - time.monotonic(), 0.1))
+            except queue.Empty:
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(f"NER replicas {sorted(waiting)} did not start within {timeout:.0f}s")
+                continue
+            if status == "failed":
+                raise RuntimeError(f"NER replica {index} failed to load: {detail}")
+            waiting.discard(index)
+
+    def _read_results(self):
+        checked = time.monotonic()
+        while not self._closed:
+            if time.monotonic() - checked >= 1.0:
+                # also under load, when get() never times out
+                self._check_replicas()
+                checked = time.monotonic()
+            try:
+                result = self._results.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                return
+            self._deliver(*result)
+
+    def _deliver(self, request_id, index, status, value):
+        if request_id is None:
+            # a restarted replica reporting in
+            if status == "failed":
+                self._failed_starts[index] += 1
+                print(f"NER replica {index} failed to restart ({self._failed_starts[index]} in a row): {value}")
+            else:
+                self._failed_starts[index] = 0
+            return
+        with self._lock:
+            future = self._futures.pop(request_id, None)
+        if future is None:
+            return
+        if status == "ok":
+            future.set_result(value)
+        else:
+            future.set_exception(RuntimeError(f"NER replica {index}: {value}"))
+
+    def _check_replicas(self):
+        dead = [i for i, process in enumerate(self._processes) if not process.is_alive()]
+        if not dead or self._closed:
+            return
+        # a result the replica sent before exiting still counts
+        while True:
+            try:
+                self._deliver(*self._results.get_nowait())
+            except queue.Empty:
+                break
+        for index in dead:
+            # only the request the replica had taken is lost, the others are still queued or running elsewhere
+            request_id = self._current[index]
+            self._current[index] = -1
+            with self._lock:
+                future = self._futures.pop(request_id, None)
+            if future is not None:
+                future.set_exception(RuntimeError(f"NER replica {index} exited while the request was running"))
+            if index in self._given_up:
+                continue
+            if self._failed_starts[index] >= MAX_FAILED_STARTS:
+                print(f"NER replica {index} failed to start {MAX_FAILED_STARTS} times in a row, not restarting it")
+                self._given_up.add(index)
+                continue
+            print(f"NER replica {index} exited with {self._processes[index].exitcode}, starting a new one")
+            self._start(index)
+        if len(self._given_up) == self.replicas:
+            # nothing will ever take the queued requests
+            self._fail_pending("no NER replica is running")
+
+    def _fail_pending(self, reason):
+        with self._lock:
+            futures, self._futures = self._futures, {}
+        for future in futures.values():
+            future.set_exception(RuntimeError(reason))
+
+    def submit(self, texts):
+        if self._closed:
+            raise RuntimeError("the NER replica pool is closed")
+        if len(self._given_up) == self.replicas:
+            raise RuntimeError("no NER replica is running")
+        future = Future()
+        request_id = future.request_id = next(self._ids)
+        with self._lock:
+            self._futures[request_id] = future
+        self._requests.put((request_id, list(texts)))
+        return future
+
+    def spans(self, texts):
+        future = self.submit(texts)
+        try:
+            return future.result(timeout=self.request_timeout_s)
+        except FutureTimeout:
+            # a late result finds no future and is dropped
+            with self._lock:
+                self._futures.pop(future.request_id, None)
+            raise TimeoutError(f"no NER result within {self.request_timeout_s:.0f}s") from None
+
+    def alive(self):
+        return sum(process.is_alive() for process in self._processes if process is not None)
+
+    def close(self, timeout=10.0):
+        if self._closed:
+            return
+        self._closed = True
+        for process in self._processes:
+            if process is not None:
+                self._requests.put(None)
+        for process in self._processes:
+            if process is None:
+                continue
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self._fail_pending("the NER replica pool was closed")
+
+
+def benchmark(pool, texts, concurrency, batch_size):
+    """Sends batches from `concurrency` threads at once; returns requests/s and per-batch latencies."""
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    latencies = []
+    lock = threading.Lock()
+    pending = iter(batches)
+
+    def client():
+        while True:
+            with lock:
+                batch = next(pending, None)
+            if batch is None:
+                return
+            start = time.perf_counter()
+            pool.spans(batch)
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    clients = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "texts_per_s": len(texts) / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare replica pool profiles on the same load")
+    parser.add_argument("--engine", default="torch")
+    parser.add_argument("--model", default="modelv1")
+    parser.add_argument("--onnx-dir", default="modelv1-onnx")
+    parser.add_argument("--profiles", nargs="+", default=list(PROFILES))
+    parser.add_argument("--texts", type=int, default=512)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=None, help="client threads (default: 2 x replicas)")
+    args = parser.parse_args()
+
+    sample = [
+        "Client NRIC is S1234567A, please update the CRM record before Friday.",
+        "Send the Q3 forecast of S$2.4m for Project Orchid to finance@example.com.",
+        "Hi team, the offsite is moved to next Tuesday.",
+        "Card 4111 1111 1111 1111 was charged twice, call 9123 4567 to refund.",
+    ]
+    texts = [sample[i % len(sample)] for i in range(args.texts)]
+    print(f"{len(available_cores())} cores available")
+    for profile in args.profiles:
+        config = resolve_config(profile)
+        pool = ReplicaPool(args.engine, args.model, args.onnx_dir, warmup_texts=sample, **config)
+        try:
+            result = benchmark(pool, texts, args.concurrency or 2 * config["replicas"], args.batch_size)
+        finally:
+            pool.close()
+        print(f"{profile:<11} {config['replicas']:>3} replicas x {config['threads']} threads: "
+              f"{result['texts_per_s']:8.1f} texts/s  p50 {result['p50_ms']:7.1f} ms  p99 {result['p99_ms']:7.1f} ms")
@@ -0,0 +1,216 @@
+import re
+import json
+import base64
+import bisect
+from spans import Span
+
+# Single-pass detector for structured identifiers. All rules are alternatives of one compiled
+# pattern behind a shared lookbehind, so the text is scanned once and a match can only begin
+# where a token begins. No alternative nests quantifiers, so the scan stays linear even on long
+# digit runs or pasted logs. Matches are then checked by a validator (checksum, Luhn, ...) to
+# drop look-alikes; a rejected match gives the rules after it a try at the same position, so two
+# adjacent phone numbers read as one (invalid) card number are still found as phone numbers.
+
+TOKEN_START = r"(?<![\w.%+-])"
+
+RULES = [
+    ("EMAIL", r"[A-Za-z0-9._%+-]{1,64}@[A-Za-z0-9-]{1,63}(?:\.[A-Za-z0-9-]{1,63}){0,8}\.[A-Za-z]{2,24}(?![\w-])"),
+    ("API_KEY", r"sk-[A-Za-z0-9_-]{16,200}(?![\w-])"),
+    ("ACCESS_TOKEN", r"eyJ[A-Za-z0-9_-]{8,4096}(?:\.[A-Za-z0-9_-]{0,4096}){0,2}(?![\w-])"),
+    ("INVOICE_ID", r"INV-\d{4}-\d{4,8}(?![\w-])"),
+    ("PO_NUMBER", r"PO-\d{4,8}(?![\w-])"),
+    ("NRIC", r"[STFGM]\d{7}[A-Z](?!\w)"),
+    ("CREDIT_CARD", r"\d(?:[ -]?\d){12,18}(?![\d-])"),
+    ("PHONE", r"(?:\+65[ -]?)?[3689]\d{3}[ -]?\d{4}(?!\d)"),
+]
+
+PATTERN = re.compile(TOKEN_START + "(?:" + "|".join(f"(?P<{label}>{pattern})" for label, pattern in RULES) + ")")
+RULE_PATTERNS = [(label, re.compile(TOKEN_START + pattern)) for label, pattern in RULES]
+RULE_ORDER = {label: i for i, (label, _) in enumerate(RULES)}
+
+NRIC_WEIGHTS = (2, 7, 6, 5, 4, 3, 2)
+NRIC_CHECK_LETTERS = {
+    "S": "JZIHGFEDCBA",
+    "T": "JZIHGFEDCBA",
+    "F": "XWUTRQPNMLK",
+    "G": "XWUTRQPNMLK",
+    "M": "KLJNPQRTUWX",
+}
+NRIC_OFFSETS = {"S": 0, "T": 4, "F": 0, "G": 4, "M": 3}
+
+
+def valid_nric(value):
+    """Checks the NRIC/FIN check letter (S/T citizens, F/G/M foreigners)."""
+    prefix, digits, letter = value[0], value[1:8], value[8]
+    total = sum(int(d) * w for d, w in zip(digits, NRIC_WEIGHTS)) + NRIC_OFFSETS[prefix]
+    remainder = total % 11
+    if prefix == "M":
+        remainder = 10 - remainder
+    return NRIC_CHECK_LETTERS[prefix][remainder] == letter
+
+
+def valid_luhn(value):
+    digits = [int(c) for c in value if c.isdigit()]
+    if not 13 <= len(digits) <= 19:
+        return False
+    total = 0
+    for i, d in enumerate(reversed(digits)):
+        if i % 2 == 1:
+            d *= 2
+            if d > 9:
+                d -= 9
+        total += d
+    return total % 10 == 0
+
+
+def valid_card_grouping(value):
+    # Separators, if any, must be consistent ("4111 1111 1111 1111", not "41 1111-111 ...")
+    separators = {c for c in value if not c.isdigit()}
+    return len(separators) <= 1 and valid_luhn(value)
+
+
+def valid_api_key(value):
+    body = value[3:]
+    return any(c.isdigit() for c in body) and any(c.isalpha() for c in body)
+
+
+def valid_access_token(value):
+    parts = value.split(".")
+    if len(parts) != 3:
+        # bare token, only accept long ones
+        return len(value) >= 20
+    header = parts[0] + "=" * (-len(parts[0]) % 4)
+    try:
+        decoded = json.loads(base64.urlsafe_b64decode(header))
+    except (ValueError, UnicodeDecodeError):
+        return False
+    return isinstance(decoded, dict)
+
+
+def valid_phone(value):
+    digits = "".join(c for c in value if c.isdigit())
+    return len(digits) in (8, 10)
+
+
+VALIDATORS = {
+    "NRIC": valid_nric,
+    "CREDIT_CARD": valid_card_grouping,
+    "API_KEY": valid_api_key,
+    "ACCESS_TOKEN": valid_access_token,
+    "PHONE": valid_phone,
+}
+
+
+def validated(label, value):
+    validator = VALIDATORS.get(label)
+    return validator is None or validator(value)
+
+
+def retry_rules(text, start, rejected):
+    """(label, end) of the first rule after rejected that matches validly at start, or (None, start)."""
+    # the alternation tried the rules in order, so those before the rejected one do not match here
+    for label, pattern in RULE_PATTERNS[RULE_ORDER[rejected] + 1:]:
+        match = pattern.match(text, start)
+        if match is not None and validated(label, match.group()):
+            return label, match.end()
+    return None, start
+
+
+def scan_spans(text):
+    """Returns validated matches as Spans, ordered by position."""
+    spans = []
+    pos = 0
+    while True:
+        match = PATTERN.search(text, pos)
+        if match is None:
+            break
+        start, label, end = match.start(), match.lastgroup, match.end()
+        if not validated(label, match.group()):
+            label, end = retry_rules(text, start, label)
+            if label is None:
+                pos = start + 1
+                continue
+        if label == "NRIC" and text[start] in "FGM":
+            label = "FIN"
+        spans.append(Span(label, start, end, 1.0))
+        pos = end
+    return spans
+
+
+def scan(text):
+    """Returns validated matches in the same dict shape as the NER pipeline, ordered by position."""
+    return [span.to_entity(text) for span in scan_spans(text)]
+
+
+def merge_rule_matches(model_spans, rule_spans):
+    """Combines model and rule spans. Rule matches are exact, so model spans overlapping one are dropped."""
+    if not rule_spans:
+        return model_spans
+    # rule matches never overlap each other and come sorted by start, so they are sorted by end too
+    rule_ends = [rule.end for rule in rule_spans]
+    kept = []
+    for span in model_spans:
+        i = bisect.bisect_right(rule_ends, span.start)
+        if i < len(rule_spans) and rule_spans[i].start < span.end:
+            continue
+        kept.append(span)
+    return sorted(kept + rule_spans, key=lambda s: s.start)
+
+
+def legacy_regex_pii(text):
+    # The per-pattern loop this engine replaced, kept for the benchmark below
+    patterns = {
+        "EMAIL": r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b",
+        "PHONE": r"\b\d{3}[-.\s]??\d{3}[-.\s]??\d{4}\b",
+        "CREDIT_CARD": r"\b(?:\d[ -]*?){13,16}\b",
+    }
+    matches = []
+    for label, pattern in patterns.items():
+        for match in re.finditer(pattern, text):
+            matches.append((label, match.start(), match.end()))
+    return matches
+
+
+if __name__ == "__main__":
+    import time
+
+    samples = [
+        "Client NRIC is S1234567D, FIN F1234567N and card 4111 1111 1111 1111.",
+        "Contact alice.tan@company.sg or +65 9123 4567 about INV-2024-000123 / PO-123456.",
+        "Here is an API key: sk-abcdef1234567890abcdef12 and a token eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9.eyJzdWIiOiIxMjMifQ.sig",
+        "Not sensitive: S1234567A has a bad check letter, 4111 1111 1111 1112 fails Luhn.",
+    ]
+    for text in samples:
+        print(text)
+        for m in scan(text):
+            print(f"  {m['entity_group']:<13} {m['word']}")
+
+    # Regressions: adjacent phone numbers first match the card rule, fail Luhn and must still be found
+    regressions = [
+        ("91234567 81234567", [("PHONE", "91234567"), ("PHONE", "81234567")]),
+        ("call 9123 4567 8123 4567 now", [("PHONE", "9123 4567"), ("PHONE", "8123 4567")]),
+        ("card 4111 1111 1111 1111 or 9123 4567", [("CREDIT_CARD", "4111 1111 1111 1111"), ("PHONE", "9123 4567")]),
+        ("4111 1111 1111 1112", []),
+    ]
+    for text, expected in regressions:
+        found = [(m["entity_group"], m["word"]) for m in scan(text)]
+        assert found == expected, f"{text!r}: expected {expected}, got {found}"
+    print(f"\n{len(regressions)} regression cases passed")
+
+    # Benchmark on large inputs: a pasted log, a long digit run and a long email-like run
+    log_line = "2024-05-01T10:00:00Z INFO user=alice.tan@company.sg card=4111-1111-1111-1111 id=S1234567D req=8f3a9c 1234567890123\n"
+    inputs = {
+        "log (1 MB)": log_line * (1_000_000 // len(log_line)),
+        "digit run (100 KB)": "1234567890" * 10_000,
+        "spaced digits (100 KB)": "1 2 3 4 5 6 7 8 9 0 " * 5_000,
+        "dotted words (100 KB)": "a.b." * 25_000,
+    }
+    print(f"\n{'input':<24} {'rule engine (8 types)':>22} {'legacy regex_pii (3 types)':>27}")
+    for name, text in inputs.items():
+        start = time.perf_counter()
+        scan(text)
+        engine_s = time.perf_counter() - start
+        start = time.perf_counter()
+        legacy_regex_pii(text)
+        legacy_s = time.perf_counter() - start
+        print(f"{name:<24} {engine_s * 1000:>20.1f}ms {legacy_s * 1000:>25.1f}ms")
@@ -0,0 +1,29 @@
+class Span:
+    """A detected entity on the scan hot path: label, character offsets into the scanned text and score.
+
+    The matched text is not stored, it is always text[start:end] of the text that was scanned.
+    """
+
+    __slots__ = ("label", "start", "end", "score")
+
+    def __init__(self, label, start, end, score):
+        self.label = label
+        self.start = start
+        self.end = end
+        self.score = score
+
+    def __repr__(self):
+        return f"Span({self.label!r}, {self.start}, {self.end}, {self.score:.3f})"
+
+    def shifted(self, offset):
+        return Span(self.label, self.start + offset, self.end + offset, self.score)
+
+    def to_entity(self, text):
+        # Same dict shape as the HF pipeline, for callers outside the API
+        return {
+            "entity_group": self.label,
+            "score": self.score,
+            "word": text[self.start:self.end],
+            "start": self.start,
+            "end": self.end
+        }
@@ -0,0 +1,128 @@
+import time
+import asyncio
+import threading
+import pytest
+from ner_batcher import NERBatcher, Overloaded
+
+
+class FakeModel:
+    """infer_fn that records the texts of every batch and tags each text as its result."""
+
+    def __init__(self, gate=None):
+        self.batches = []
+        self.started = threading.Event()
+        self.gate = gate
+
+    def __call__(self, texts):
+        self.batches.append(list(texts))
+        self.started.set()
+        if self.gate is not None:
+            self.gate.wait(5)
+        return [[{"word": text}] for text in texts]
+
+
+def word_count(text):
+    return len(text.split())
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_full_batch_runs_without_waiting():
+    model = FakeModel()
+    batcher = NERBatcher(model, word_count, max_wait_ms=10_000, max_batch_size=4)
+
+    async def scan():
+        start = time.perf_counter()
+        await asyncio.gather(*(batcher.submit(f"text {i}") for i in range(8)))
+        return time.perf_counter() - start
+
+    assert run(scan()) < 5
+    assert [len(batch) for batch in model.batches] == [4, 4]
+
+
+def test_partial_batch_is_flushed_after_max_wait():
+    model = FakeModel()
+    batcher = NERBatcher(model, word_count, max_wait_ms=50, max_batch_size=16)
+
+    async def scan():
+        start = time.perf_counter()
+        await asyncio.gather(*(batcher.submit(f"text {i}") for i in range(3)))
+        return time.perf_counter() - start
+
+    assert run(scan()) >= 0.04
+    assert [len(batch) for batch in model.batches] == [3]
+
+
+def test_texts_are_batched_by_length_bucket():
+    model = FakeModel()
+    batcher = NERBatcher(model, word_count, max_wait_ms=20, max_batch_size=16, length_buckets=(4, 16))
+    texts = ["a b", " ".join(["long"] * 10), "c d e", " ".join(["longer"] * 12), "f"]
+
+    async def scan():
+        await asyncio.gather(*(batcher.submit(text) for text in texts))
+
+    run(scan())
+    assert sorted(model.batches, key=len) == [[texts[1], texts[3]], [texts[0], texts[2], texts[4]]]
+
+
+def test_length_overrides_length_fn():
+    model = FakeModel()
+    batcher = NERBatcher(model, word_count, max_wait_ms=20, length_buckets=(4, 16))
+
+    async def scan():
+        await asyncio.gather(batcher.submit("short", length=100), batcher.submit("a b c d e f g h i j", length=100))
+
+    run(scan())
+    assert model.batches == [["short", "a b c d e f g h i j"]]
+
+
+def test_results_come_back_in_request_order():
+    model = FakeModel()
+    batcher = NERBatcher(model, word_count, max_wait_ms=20, max_batch_size=3, length_buckets=(2, 4))
+    texts = [" ".join([f"w{i}"] * (1 + i % 5)) for i in range(20)]
+
+    async def scan():
+        return await asyncio.gather(*(batcher.submit(text) for text in texts))
+
+    assert run(scan()) == [[{"word": text}] for text in texts]
+    assert len(model.batches) > 1
+    # each batch keeps the order its texts were submitted in
+    for batch in model.batches:
+        assert batch == sorted(batch, key=texts.index)
+
+
+def test_failed_batch_fails_its_requests():
+    def infer(texts):
+        raise ValueError("model failed")
+
+    batcher = NERBatcher(infer, word_count, max_wait_ms=5)
+
+    async def scan():
+        return await asyncio.gather(batcher.submit("a"), batcher.submit("b"), return_exceptions=True)
+
+    assert [str(result) for result in run(scan())] == ["model failed", "model failed"]
+
+
+def test_submit_raises_overloaded_when_too_much_is_waiting():
+    gate = threading.Event()
+    model = FakeModel(gate)
+    batcher = NERBatcher(model, word_count, max_wait_ms=1, max_batch_size=16, max_pending=2)
+
+    async def scan():
+        running = asyncio.ensure_future(batcher.submit("running"))
+        while not model.started.is_set():
+            await asyncio.sleep(0.001)
+        # the only batch slot is busy, so these two wait
+        waiting = [asyncio.ensure_future(batcher.submit(f"waiting {i}")) for i in range(2)]
+        await asyncio.sleep(0.01)
+        assert batcher.depth() == 2
+        with pytest.raises(Overloaded):
+            await batcher.submit("rejected")
+        gate.set()
+        return await asyncio.gather(running, *waiting)
+
+    results = run(scan())
+    assert [result[0]["word"] for result in results] == ["running", "waiting 0", "waiting 1"]
+    assert model.batches == [["running"], ["waiting 0", "waiting 1"]]